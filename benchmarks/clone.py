@@ -0,0 +1,89 @@
+"""Compare the copy-on-write `Chunk.clone` with the former deepcopy-based clone
+
+Also profile `TOCHierarchyBuilder`, which clones every chunk of the document, to
+check how much of its time is spent in `deepcopy`.
+
+Usage: python benchmarks/clone.py [n_pages]
+"""
+
+import cProfile
+import pstats
+import sys
+import time
+from copy import deepcopy
+
+from chunking.base import Chunk, CType
+from chunking.mime import MimeType
+from chunking.split.toc_builder import TOCHierarchyBuilder
+
+
+def legacy_clone(chunk: Chunk, no_relation: bool = False) -> Chunk:
+    """The deepcopy-based `Chunk.clone` implementation, kept for comparison"""
+    d = chunk.asdict(relation_as_chunk=True)
+    if no_relation:
+        d.pop("parent")
+        d.pop("child")
+        d.pop("next")
+        d.pop("prev")
+    d.pop("id")
+    return Chunk(**deepcopy(d))
+
+
+def build_document(n_pages: int, n_paragraphs: int = 40) -> Chunk:
+    root = Chunk(mimetype=MimeType.pdf, ctype=CType.Root)
+    pages = []
+    for page_idx in range(n_pages):
+        page = Chunk(mimetype=MimeType.text, ctype=CType.Page)
+        paragraphs = [
+            Chunk(
+                mimetype=MimeType.text,
+                ctype=CType.Header if idx == 0 else CType.Para,
+                content=f"Paragraph {idx} of page {page_idx}. " * 10,
+                metadata={"idx": page_idx, "x1": 0.1, "x2": 0.9, "y1": 0.1, "y2": 0.2},
+            )
+            for idx in range(n_paragraphs)
+        ]
+        page.add_children(paragraphs)
+        pages.append(page)
+    root.add_children(pages)
+    return root
+
+
+def timeit(name, fn):
+    start = time.perf_counter()
+    try:
+        fn()
+    except RecursionError:
+        print(f"  {name:<36} RecursionError")
+        return
+    print(f"  {name:<36} {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    root = build_document(n_pages)
+    nodes = [node for _, node in root.walk()]
+    print(f"Document: {n_pages} pages, {len(nodes)} chunks")
+
+    print("Clone every chunk with no_relation=True")
+    timeit("legacy", lambda: [legacy_clone(n, no_relation=True) for n in nodes])
+    timeit("copy-on-write", lambda: [n.clone(no_relation=True) for n in nodes])
+
+    print("Clone a page with its relations")
+    page = root.child.next
+    timeit("legacy (copies the whole graph)", lambda: legacy_clone(page))
+    timeit("copy-on-write (shares relations)", lambda: page.clone())
+    timeit("copy-on-write, deep=True", lambda: page.clone(deep=True))
+
+    print("TOCHierarchyBuilder")
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.runcall(TOCHierarchyBuilder.run, root)
+    total = time.perf_counter() - start
+    stats = pstats.Stats(profiler)
+    deepcopy_time = sum(
+        value[3]
+        for (_, _, func), value in stats.stats.items()  # type: ignore[attr-defined]
+        if func == "deepcopy"
+    )
+    print(f"  total {total * 1000:.2f} ms, in deepcopy {deepcopy_time * 1000:.2f} ms")
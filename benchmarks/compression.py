@@ -0,0 +1,89 @@
+"""Compare the content compression codecs of the stores
+
+Save a text-heavy document with PNG figures to a `FileStore` with each codec, then
+report the size of the store and the write and read throughput of the content.
+
+Usage: python benchmarks/compression.py [n_chunks]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chunking.base import Chunk, ChunkGroup, CType
+from chunking.mime import MimeType
+from chunking.store.codec import Compression, available_codecs
+from chunking.store.fs import FileStore
+
+_WORDS = (
+    "the document parser splits each page into chunks of text tables and figures "
+    "which are stored with their relations metadata and history for later retrieval"
+).split()
+
+
+def build_document(n_chunks: int, n_per_page: int = 20, seed: int = 0) -> Chunk:
+    rng = random.Random(seed)
+    root = Chunk(mimetype=MimeType.pdf, ctype=CType.Root)
+    pages = []
+    for _ in range(max(n_chunks // n_per_page, 1)):
+        page = Chunk(mimetype=MimeType.text, ctype=CType.Page)
+        children = [
+            Chunk(
+                mimetype=MimeType.text,
+                ctype=CType.Para,
+                content=" ".join(rng.choices(_WORDS, k=300)),
+            )
+            for _ in range(n_per_page - 2)
+        ]
+        # incompressible bytes, as in a real PNG
+        children.append(
+            Chunk(
+                mimetype=MimeType.png,
+                ctype=CType.Figure,
+                content=b"\x89PNG" + os.urandom(8000),
+            )
+        )
+        page.add_children(children)
+        pages.append(page)
+    root.add_children(pages)
+    return root
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir())
+
+
+def run(name, compression, root, tmpdir):
+    chunks = [node for _, node in root.walk()][1:]
+    path = Path(tmpdir) / name
+    store = FileStore(path, compression=compression)
+
+    start = time.perf_counter()
+    store.save_group(ChunkGroup(chunks, root=root))
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for chunk in chunks:
+        store.get(chunk.id).content
+    read_time = time.perf_counter() - start
+
+    n = len(chunks)
+    print(
+        f"  {name:<6} size {dir_size(path) / 1e6:8.2f} MB"
+        f"  write {n / save_time:8.0f} chunks/s"
+        f"  read {n / read_time:8.0f} chunks/s"
+    )
+
+
+if __name__ == "__main__":
+    n_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    root = build_document(n_chunks)
+    print(f"Document: {len(root.get_ids())} chunks")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        run("raw", None, root, tmpdir)
+        for codec in available_codecs():
+            run(codec, Compression(codec=codec), root, tmpdir)
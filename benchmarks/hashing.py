@@ -0,0 +1,64 @@
+"""Measure the throughput and memory of file hashing
+
+Hash a large file with each available algorithm, compared to reading it whole,
+then hash it again with a hash cache.
+
+Usage: python benchmarks/hashing.py [size_mb]
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from chunking.util.hashing import HashCache, available_hashers, hash_file
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "large.bin"
+        with open(path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1 << 20))
+        os.utime(path, (time.time() - 10, time.time() - 10))
+        print(f"File: {size_mb} MB")
+
+        def read_whole():
+            with open(path, "rb") as f:
+                hashlib.sha256(f.read()).hexdigest()
+
+        elapsed, peak = measure(read_whole)
+        print(
+            f"  {'sha256 (read whole)':>20}  {size_mb / elapsed:8.0f} MB/s"
+            f"  peak {peak / 1e6:8.1f} MB"
+        )
+
+        algorithms = ["sha256", "blake2b", "sha1", "md5", "blake3", "xxh3_128"]
+        for algorithm in algorithms:
+            if algorithm not in available_hashers():
+                continue
+            elapsed, peak = measure(lambda: hash_file(path, algorithm))
+            print(
+                f"  {algorithm:>20}  {size_mb / elapsed:8.0f} MB/s"
+                f"  peak {peak / 1e6:8.1f} MB"
+            )
+
+        cache = HashCache(Path(tmpdir) / "hashes.db")
+        hash_file(path, cache=cache)
+        elapsed, _ = measure(lambda: hash_file(path, cache=cache))
+        print(f"  {'sha256 (cached)':>20}  {elapsed * 1000:8.3f} ms")
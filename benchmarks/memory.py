@@ -0,0 +1,63 @@
+"""Measure the memory cost per node of a large chunk tree
+
+Build a CSV-like tree (one table with one `CType.TableRow` chunk per row), then
+report the traced bytes per node for linked `Chunk` objects and for `ChunkArena`.
+
+Usage: python benchmarks/memory.py [n_rows]
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from chunking.arena import ChunkArena
+from chunking.base import Chunk, CType
+from chunking.mime import MimeType
+
+
+def build_table(n_rows: int) -> Chunk:
+    table = Chunk(mimetype=MimeType.text, ctype=CType.Table, content="")
+    rows = [
+        Chunk(
+            mimetype=MimeType.text,
+            ctype=CType.TableRow,
+            content=f"{i},cell,another cell",
+            metadata={"row_number": i},
+        )
+        for i in range(n_rows)
+    ]
+    table.add_children(rows)
+    for row in rows:
+        # ids are lazily generated, make sure they are counted
+        row.id
+    return table
+
+
+def build_arena(n_rows: int) -> ChunkArena:
+    # the intermediate chunk tree is released once packed
+    return ChunkArena.from_chunk(build_table(n_rows))
+
+
+def measure(fn, *args):
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    obj = fn(*args)
+    elapsed = time.time() - start
+    gc.collect()  # chunk trees have reference cycles
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size, elapsed
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    table, size, elapsed = measure(build_table, n_rows)
+    print(f"Chunk tree: {size / n_rows:.1f} bytes/node - build {elapsed:.2f}s")
+
+    del table
+
+    arena, size, elapsed = measure(build_arena, n_rows)
+    print(f"ChunkArena: {size / n_rows:.1f} bytes/node - build {elapsed:.2f}s")
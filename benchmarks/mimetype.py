@@ -0,0 +1,52 @@
+"""Measure the time to identify the files of a directory
+
+Generate a directory of common document types, then identify each file with
+magika alone, as before, and with `guess_mimetypes`, cold and cached.
+
+Usage: python benchmarks/mimetype.py [n_files]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chunking.mime import base as mime_base
+from chunking.mime import clear_mimetype_cache, guess_mimetypes
+
+FILES = {
+    ".md": b"# Title\n\nSome text.\n",
+    ".txt": b"Some text.\n",
+    ".csv": b"a,b\n1,2\n",
+    ".json": b'{"a": 1}',
+    ".pdf": b"%PDF-1.7\n",
+    ".png": b"\x89PNG\r\n\x1a\n" + bytes(100),
+    ".docx": b"PK\x03\x04" + bytes(100),
+    "": b"no extension\n",
+}
+
+
+if __name__ == "__main__":
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        extensions = list(FILES)
+        paths = []
+        for idx in range(n_files):
+            ext = extensions[idx % len(extensions)]
+            path = Path(tmpdir) / f"file_{idx}{ext}"
+            path.write_bytes(FILES[ext])
+            paths.append(path)
+        print(f"Directory: {n_files} files")
+
+        if mime_base._m is not None:
+            start = time.perf_counter()
+            for path in paths:
+                mime_base._m.identify_path(path)
+            print(f"  {'magika per file':>16}  {time.perf_counter() - start:8.3f}s")
+
+        clear_mimetype_cache()
+        for name in ("cold", "cached"):
+            start = time.perf_counter()
+            guess_mimetypes(paths)
+            print(f"  {name:>16}  {time.perf_counter() - start:8.3f}s")
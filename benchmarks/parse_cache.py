@@ -0,0 +1,50 @@
+"""Measure how much a parse cache saves when re-parsing an unchanged directory
+
+Generate a directory of markdown and text files, parse it once with an empty
+cache, then again with the cache filled, and again after changing a tenth of the
+files.
+
+Usage: python benchmarks/parse_cache.py [n_files]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chunking.auto import parse
+from chunking.store.parse_cache import ParseCache
+
+
+def build_directory(path: Path, n_files: int):
+    paragraph = "The parser splits each document into chunks of text. " * 20
+    for idx in range(n_files):
+        sections = "\n\n".join(
+            f"## Section {section}\n\n{paragraph}" for section in range(20)
+        )
+        (path / f"doc_{idx}.md").write_text(f"# Document {idx}\n\n{sections}")
+
+
+if __name__ == "__main__":
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        corpus = Path(tmpdir) / "corpus"
+        corpus.mkdir()
+        build_directory(corpus, n_files)
+        cache = ParseCache(Path(tmpdir) / "cache.db")
+
+        for name in ("cold", "warm", "10% changed"):
+            if name == "10% changed":
+                for idx in range(0, n_files, 10):
+                    path = corpus / f"doc_{idx}.md"
+                    path.write_text(path.read_text() + "\n\nUpdated.")
+            cache.reset_stats()
+            start = time.perf_counter()
+            parse(corpus, cache=cache)
+            elapsed = time.perf_counter() - start
+            stats = cache.stats()
+            print(
+                f"{name:>12}: {elapsed:6.2f}s  hits {stats['hits']:>5}"
+                f"  misses {stats['misses']:>5}  cache {stats['size'] / 1e6:.1f} MB"
+            )
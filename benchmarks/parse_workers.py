@@ -0,0 +1,62 @@
+"""Measure how parsing a directory scales with the number of worker processes
+
+Generate a directory of markdown and text files, then parse it with `parse` from
+1 worker (sequential) up to `max_workers` workers. Also report how long
+`iter_parse` takes to yield the first file, compared to `parse` returning all of
+them.
+
+Usage: python benchmarks/parse_workers.py [n_files] [max_workers]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chunking.auto import iter_parse, parse
+
+
+def build_directory(path: Path, n_files: int):
+    paragraph = "The parser splits each document into chunks of text. " * 20
+    for idx in range(n_files):
+        sub = path / f"folder_{idx % 10}"
+        sub.mkdir(exist_ok=True)
+        if idx % 2:
+            sections = "\n\n".join(
+                f"## Section {section}\n\n{paragraph}" for section in range(20)
+            )
+            (sub / f"doc_{idx}.md").write_text(f"# Document {idx}\n\n{sections}")
+        else:
+            (sub / f"doc_{idx}.txt").write_text("\n\n".join([paragraph] * 20))
+
+
+if __name__ == "__main__":
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        build_directory(Path(tmpdir), n_files)
+        print(f"Directory: {n_files} files")
+
+        baseline = None
+        workers = 1
+        while True:
+            start = time.perf_counter()
+            chunks = parse(tmpdir, workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+
+            start = time.perf_counter()
+            stream = iter_parse(tmpdir, workers=workers, ordered=False)
+            next(stream)
+            first = time.perf_counter() - start
+            stream.close()
+            print(
+                f"  workers {workers:>3}  {len(chunks) / elapsed:8.1f} files/s"
+                f"  speedup {baseline / elapsed:5.2f}x"
+                f"  first file {first * 1000:7.1f}ms / all {elapsed * 1000:7.1f}ms"
+            )
+            if workers >= max_workers:
+                break
+            workers = min(workers * 2, max_workers)
@@ -0,0 +1,123 @@
+"""Compare the binary flat-tree format with JSON and default pickling
+
+The JSON baseline serializes `Chunk.asdict()` for every chunk, as `FileStore` does,
+and relinks the chunks on load. The pickle baseline pickles the object graph
+attribute by attribute, as was done before `Chunk.__reduce_ex__`.
+
+Usage: python benchmarks/serialization.py [n_pages]
+"""
+
+import base64
+import io
+import json
+import pickle
+import sys
+import time
+
+from chunking.base import Chunk, CType
+from chunking.mime import MimeType
+
+
+class ObjectGraphPickler(pickle.Pickler):
+    """Pickle chunks with the default object reduction, kept for comparison"""
+
+    def reducer_override(self, obj):
+        if isinstance(obj, Chunk):
+            return object.__reduce_ex__(obj, 4)
+        return NotImplemented
+
+
+def legacy_pickle(chunk: Chunk) -> bytes:
+    buffer = io.BytesIO()
+    ObjectGraphPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(chunk)
+    return buffer.getvalue()
+
+
+def json_dumps(root: Chunk) -> bytes:
+    records = []
+    for _, node in root.walk():
+        record = node.asdict()
+        if isinstance(record["content"], bytes):
+            record["content"] = base64.b64encode(record["content"]).decode()
+            record["blob"] = True
+        records.append(record)
+    return json.dumps(records).encode()
+
+
+def json_loads(data: bytes) -> Chunk:
+    chunks = {}
+    relations = []
+    for record in json.loads(data):
+        if record.pop("blob", False):
+            record["content"] = base64.b64decode(record["content"])
+        id_ = record.pop("id")
+        relations.append(
+            (id_, [record.pop(key) for key in ("parent", "child", "next", "prev")])
+        )
+        record.pop("history")
+        chunk = Chunk(**record)
+        chunk.id = id_
+        chunks[id_] = chunk
+
+    for id_, (parent, child, next_, prev) in relations:
+        chunk = chunks[id_]
+        chunk._parent = chunks.get(parent)
+        chunk._child = chunks.get(child)
+        chunk._next = chunks.get(next_)
+        chunk._prev = chunks.get(prev)
+
+    return chunks[relations[0][0]]
+
+
+def build_document(n_pages: int, n_paragraphs: int = 40) -> Chunk:
+    root = Chunk(mimetype=MimeType.pdf, ctype=CType.Root)
+    pages = []
+    for page_idx in range(n_pages):
+        page = Chunk(mimetype=MimeType.text, ctype=CType.Page)
+        children = [
+            Chunk(
+                mimetype=MimeType.text,
+                ctype=CType.Header if idx == 0 else CType.Para,
+                content=f"Paragraph {idx} of page {page_idx}. " * 10,
+                metadata={"idx": page_idx, "x1": 0.1, "x2": 0.9, "y1": 0.1, "y2": 0.2},
+            )
+            for idx in range(n_paragraphs)
+        ]
+        children.append(
+            Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=b"\0" * 20_000)
+        )
+        page.add_children(children)
+        pages.append(page)
+    root.add_children(pages)
+    return root
+
+
+def timeit(name, dumps, loads, root):
+    try:
+        start = time.perf_counter()
+        data = dumps(root)
+        dump_time = time.perf_counter() - start
+        start = time.perf_counter()
+        loads(data)
+        load_time = time.perf_counter() - start
+    except RecursionError:
+        print(f"  {name:<12} RecursionError")
+        return
+    print(
+        f"  {name:<12} dump {dump_time * 1000:8.2f} ms  load {load_time * 1000:8.2f} ms"
+        f"  size {len(data) / 1e6:7.2f} MB"
+    )
+
+
+if __name__ == "__main__":
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    root = build_document(n_pages)
+    print(f"Document: {n_pages} pages, {len(root.get_ids())} chunks")
+
+    timeit("to_bytes", Chunk.to_bytes, Chunk.from_bytes, root)
+    timeit("pickle", pickle.dumps, pickle.loads, root)
+    timeit("json", json_dumps, json_loads, root)
+    timeit("pickle [old]", legacy_pickle, pickle.loads, root)
+
+    sys.setrecursionlimit(100_000)
+    timeit("pickle [old, recursionlimit=100000]", legacy_pickle, pickle.loads, root)
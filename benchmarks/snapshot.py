@@ -0,0 +1,56 @@
+"""Measure the export, open and lookup times of a snapshot store
+
+Export a corpus to a snapshot file, then open it and read random chunks, as a
+worker process would.
+
+Usage: python benchmarks/snapshot.py [n_chunks]
+"""
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chunking.base import Chunk, CType
+from chunking.mime import MimeType
+from chunking.store.snapshot import SnapshotStore
+
+
+def iter_chunks(n_chunks: int):
+    for idx in range(n_chunks):
+        if idx % 50 == 49:
+            yield Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=b"\0" * 2000)
+        else:
+            yield Chunk(
+                mimetype=MimeType.text,
+                ctype=CType.Para,
+                content=f"Paragraph {idx}. " * 10,
+                metadata={"page": idx // 50},
+            )
+
+
+if __name__ == "__main__":
+    n_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "corpus.snap"
+        start = time.perf_counter()
+        store = SnapshotStore.export(path, iter_chunks(n_chunks))
+        print(
+            f"Export {n_chunks} chunks: {time.perf_counter() - start:.2f}s, "
+            f"{path.stat().st_size / 1e6:.1f} MB"
+        )
+        ids = random.Random(0).sample(list(store.ids()), min(n_chunks, 100_000))
+        store.close()
+
+        start = time.perf_counter()
+        store = SnapshotStore(path)
+        print(f"Open: {(time.perf_counter() - start) * 1000:.3f}ms")
+
+        start = time.perf_counter()
+        for id_ in ids:
+            store.get(id_)
+        elapsed = time.perf_counter() - start
+        print(f"Random get: {len(ids) / elapsed:.0f} chunks/s")
+        store.close()
@@ -0,0 +1,88 @@
+"""Compare the throughput of the chunk stores
+
+Save a document with `save_group`, read every chunk back by id, then walk the
+stored tree without and with relation prefetching.
+
+Usage: python benchmarks/store.py [n_chunks]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from chunking.base import Chunk, ChunkGroup, CType
+from chunking.mime import MimeType
+from chunking.store.fs import FileStore
+from chunking.store.segment import SegmentStore
+from chunking.store.sqlite import SQLiteStore
+
+
+def build_document(n_chunks: int, n_per_page: int = 50) -> Chunk:
+    root = Chunk(mimetype=MimeType.pdf, ctype=CType.Root)
+    pages = []
+    for page_idx in range(max(n_chunks // n_per_page, 1)):
+        page = Chunk(mimetype=MimeType.text, ctype=CType.Page)
+        children = [
+            Chunk(
+                mimetype=MimeType.text,
+                ctype=CType.Para,
+                content=f"Paragraph {idx} of page {page_idx}. " * 10,
+                metadata={"page": page_idx},
+            )
+            for idx in range(n_per_page - 2)
+        ]
+        children.append(
+            Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=b"\0" * 2000)
+        )
+        page.add_children(children)
+        pages.append(page)
+    root.add_children(pages)
+    return root
+
+
+def run(name, store, root):
+    chunks = [node for _, node in root.walk()][1:]
+    ids = [ch.id for ch in chunks]
+
+    start = time.perf_counter()
+    store.save_group(ChunkGroup(chunks, root=root))
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for id_ in ids:
+        store.get(id_)
+    get_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.get_many(ids)
+    get_many_time = time.perf_counter() - start
+
+    walk_times = []
+    for depth, breadth in [(0, 0), (2, None)]:
+        store.prefetch_depth, store.prefetch_breadth = depth, breadth
+        start = time.perf_counter()
+        for _ in store.get(root.id).walk():
+            pass
+        walk_times.append(time.perf_counter() - start)
+    store.prefetch_depth, store.prefetch_breadth = 0, 0
+
+    n = len(ids)
+    print(
+        f"  {name:<12} save_group {n / save_time:9.0f} chunks/s"
+        f"  get {n / get_time:9.0f} chunks/s"
+        f"  get_many {n / get_many_time:9.0f} chunks/s"
+        f"  walk {n / walk_times[0]:9.0f} chunks/s"
+        f"  walk (prefetch) {n / walk_times[1]:9.0f} chunks/s"
+    )
+
+
+if __name__ == "__main__":
+    n_chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    root = build_document(n_chunks)
+    print(f"Document: {len(root.get_ids())} chunks")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        run("FileStore", FileStore(Path(tmpdir) / "files"), root)
+        run("SQLiteStore", SQLiteStore(Path(tmpdir) / "chunks.db"), root)
+        run("SegmentStore", SegmentStore(Path(tmpdir) / "segments"), root)
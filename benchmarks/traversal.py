@@ -0,0 +1,92 @@
+"""Compare the iterative tree traversal with the former recursive generators
+
+Usage: python benchmarks/traversal.py
+"""
+
+import sys
+import time
+
+from chunking.base import Chunk, CType
+from chunking.mime import MimeType
+
+
+def recursive_walk(chunk, depth=0, include_siblings=True):
+    """The recursive `Chunk.walk` implementation, kept for comparison"""
+    yield (depth, chunk)
+
+    child = chunk.child
+    while child:
+        yield from recursive_walk(child, depth=depth + 1, include_siblings=False)
+        child = child.next
+
+    if include_siblings:
+        sibling = chunk.next
+        while sibling:
+            yield from recursive_walk(sibling, depth=depth, include_siblings=False)
+            sibling = sibling.next
+
+
+def recursive_get_ids(chunk):
+    """The recursive `Chunk.get_ids` implementation, kept for comparison"""
+    ids = [chunk.id]
+    child = chunk.child
+    while child:
+        ids.extend(recursive_get_ids(child))
+        child = child.next
+    return ids
+
+
+def wide_tree(n_children: int, n_grandchildren: int) -> Chunk:
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    children = []
+    for _ in range(n_children):
+        child = Chunk(mimetype=MimeType.text, ctype=CType.Div)
+        child.add_children(
+            [
+                Chunk(mimetype=MimeType.text, ctype=CType.Para)
+                for _ in range(n_grandchildren)
+            ]
+        )
+        children.append(child)
+    root.add_children(children)
+    return root
+
+
+def deep_tree(depth: int) -> Chunk:
+    root = node = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    for _ in range(depth):
+        child = Chunk(mimetype=MimeType.text, ctype=CType.Div)
+        node.add_children(child)
+        node = child
+    return root
+
+
+def timeit(name, fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        except RecursionError:
+            print(f"  {name:<24} RecursionError")
+            return
+        best = min(best, time.perf_counter() - start)
+    print(f"  {name:<24} {best * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    trees = {
+        "wide (1000 x 200)": wide_tree(1000, 200),
+        f"deep ({sys.getrecursionlimit() // 2})": deep_tree(
+            sys.getrecursionlimit() // 2
+        ),
+        "deep (100000)": deep_tree(100_000),
+    }
+
+    for name, tree in trees.items():
+        print(f"Tree: {name}")
+        timeit("walk [recursive]", lambda t: sum(1 for _ in recursive_walk(t)), tree)
+        timeit("walk [iterative]", lambda t: sum(1 for _ in t.walk()), tree)
+        timeit("get_ids [recursive]", recursive_get_ids, tree)
+        timeit("get_ids [iterative]", Chunk.get_ids, tree)
+        timeit("find_all [iterative]", lambda t: t.find_all(ctype=CType.Para), tree)
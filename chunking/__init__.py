@@ -1,7 +1,7 @@
 import logging
 import os
 
-from .auto import parse
+from .auto import iter_parse, parse
 
 logger = logging.getLogger(__name__)
 logger.propagate = False
@@ -26,4 +26,4 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
-__all__ = ["parse"]
+__all__ = ["iter_parse", "parse"]
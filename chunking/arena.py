@@ -0,0 +1,323 @@
+"""Arena representation of a chunk tree
+
+A document tree can be packed into a `ChunkArena`, where each node is a row in a
+set of parallel arrays, and the parent / child / next / prev relations are integer
+indices into those arrays. This avoids the per-object overhead of `Chunk` when a
+document has hundreds of thousands of nodes (e.g. one `CType.TableRow` per CSV row),
+and the nodes can be materialized back into `Chunk` objects on demand.
+"""
+
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Generator
+
+from chunking.base import Chunk, Origin, _copy_value
+
+# Sentinel index for a missing relation
+NIL = -1
+
+# Binary format: header, 4 relation arrays of int32, JSON section, blob section
+_MAGIC = b"CHNK"
+_VERSION = 1
+_HEADER = struct.Struct("<4sB3xIQQ")  # magic, version, n_nodes, json_len, blob_len
+
+
+class ChunkArena:
+    """Store the nodes of a chunk tree in parallel arrays
+
+    Nodes are stored in pre-order (reading order), so the node at index 0 is the
+    root of the tree, and the descendants of a node directly follow it.
+
+    Args:
+        store: the store to attach to the materialized chunks
+    """
+
+    __slots__ = (
+        "ids",
+        "mimetypes",
+        "ctypes",
+        "contents",
+        "texts",
+        "summaries",
+        "origins",
+        "metadata",
+        "histories",
+        "parent",
+        "child",
+        "next",
+        "prev",
+        "store",
+    )
+
+    def __init__(self, store=None):
+        self.ids: list[str] = []
+        self.mimetypes: list[str | None] = []
+        self.ctypes: list[str] = []
+        self.contents: list[Any] = []
+        self.texts: list[str] = []
+        self.summaries: list[str] = []
+        self.origins: list[Origin | None] = []
+        self.metadata: list[dict | None] = []
+        self.histories: list[list | None] = []
+        self.parent = array("i")
+        self.child = array("i")
+        self.next = array("i")
+        self.prev = array("i")
+        self.store = store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(
+        self,
+        id: str,
+        mimetype: str | None = None,
+        ctype: str = "inline",
+        content: Any = None,
+        text: str = "",
+        summary: str = "",
+        origin: Origin | None = None,
+        metadata: dict | None = None,
+        history: list | None = None,
+        parent: int = NIL,
+        child: int = NIL,
+        next: int = NIL,
+        prev: int = NIL,
+    ) -> int:
+        """Append a node to the arena
+
+        Returns:
+            int: the index of the added node
+        """
+        self.ids.append(id)
+        self.mimetypes.append(
+            sys.intern(mimetype) if type(mimetype) is str else mimetype
+        )
+        self.ctypes.append(sys.intern(ctype) if type(ctype) is str else ctype)
+        self.contents.append(content)
+        self.texts.append(text)
+        self.summaries.append(summary)
+        self.origins.append(origin)
+        self.metadata.append(metadata or None)
+        self.histories.append(history or None)
+        self.parent.append(parent)
+        self.child.append(child)
+        self.next.append(next)
+        self.prev.append(prev)
+        return len(self.ids) - 1
+
+    @classmethod
+    def from_chunk(
+        cls,
+        chunk: Chunk,
+        include_siblings: bool = False,
+        load_content: bool = False,
+        copy: bool = True,
+    ) -> "ChunkArena":
+        """Pack the chunk and its descendants into an arena
+
+        Relations pointing outside of the packed chunks (e.g. the parent of `chunk`)
+        are not kept.
+
+        Args:
+            chunk: the chunk to pack
+            include_siblings: if True, also pack the next siblings of the chunk
+            load_content: if True, load the content of store-backed chunks, instead
+                of leaving it to be fetched from the store
+            copy: if True, copy the metadata and history of the chunks. Set it to
+                False when the arena is serialized right away, the arena then refers
+                to the dicts and lists of the chunks
+        """
+        arena = cls(store=chunk.store)
+        nodes = [node for _, node in chunk.walk(include_siblings=include_siblings)]
+        index = {node.id: idx for idx, node in enumerate(nodes)}
+
+        def lookup(relation) -> int:
+            # relations are either loaded chunks or ids of chunks in the store
+            if relation is None:
+                return NIL
+            if isinstance(relation, Chunk):
+                relation = relation._id
+            return index.get(relation, NIL)
+
+        for node in nodes:
+            content = node._content
+            if content is None and load_content and node.store is not None:
+                content = node.content
+
+            arena.add(
+                id=node.id,
+                mimetype=node.mimetype,
+                ctype=node.ctype,
+                content=content,
+                text=node.text,
+                summary=node.summary,
+                origin=node.origin,
+                metadata=_copy_value(node._metadata) if copy else node._metadata,
+                history=_copy_value(node._history) if copy else node._history,
+                parent=lookup(node._parent),
+                child=lookup(node._child),
+                next=lookup(node._next),
+                prev=lookup(node._prev),
+            )
+
+        # The root doesn't link to its siblings and parent outside of the subtree
+        if len(arena):
+            arena.parent[0] = arena.prev[0] = NIL
+            if not include_siblings:
+                arena.next[0] = NIL
+
+        return arena
+
+    def to_bytes(self) -> bytes:
+        """Serialize the arena into a compact binary format
+
+        The layout is a fixed header, the parent / child / next / prev relations as
+        little-endian int32 arrays, a JSON section with the other fields as columns,
+        and a blob section holding the bytes content back to back.
+
+        Content must either be bytes, or JSON serializable.
+        """
+        contents, blobs, blob_parts, offset = [], [], [], 0
+        for idx, content in enumerate(self.contents):
+            if isinstance(content, (bytes, bytearray, memoryview)):
+                blobs.append((idx, offset, len(content)))
+                blob_parts.append(content)
+                offset += len(content)
+                contents.append(None)
+            else:
+                contents.append(content)
+
+        columns = {
+            "ids": self.ids,
+            "mimetypes": self.mimetypes,
+            "ctypes": self.ctypes,
+            "contents": contents,
+            "texts": self.texts,
+            "summaries": self.summaries,
+            "origins": [o.asdict() if o else None for o in self.origins],
+            "metadata": self.metadata,
+            "histories": self.histories,
+            "blobs": blobs,
+        }
+        json_bytes = json.dumps(columns, separators=(",", ":")).encode("utf-8")
+
+        parts = [_HEADER.pack(_MAGIC, _VERSION, len(self), len(json_bytes), offset)]
+        for relation in (self.parent, self.child, self.next, self.prev):
+            if sys.byteorder == "big":
+                relation = array("i", relation)
+                relation.byteswap()
+            parts.append(relation.tobytes())
+        parts.append(json_bytes)
+        parts.extend(blob_parts)
+
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes | memoryview, store=None) -> "ChunkArena":
+        """Deserialize an arena from the output of `.to_bytes`"""
+        view = memoryview(data)
+        magic, version, n_nodes, json_len, blob_len = _HEADER.unpack_from(view)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized chunk tree")
+        if version != _VERSION:
+            raise ValueError(f"Unsupported serialization version: {version}")
+
+        arena = cls(store=store)
+        offset = _HEADER.size
+        relations = []
+        for _ in range(4):
+            relation = array("i")
+            relation.frombytes(view[offset : offset + 4 * n_nodes])
+            if sys.byteorder == "big":
+                relation.byteswap()
+            relations.append(relation)
+            offset += 4 * n_nodes
+        arena.parent, arena.child, arena.next, arena.prev = relations
+
+        columns = json.loads(bytes(view[offset : offset + json_len]))
+        offset += json_len
+
+        arena.ids = columns["ids"]
+        arena.mimetypes = [
+            sys.intern(m) if type(m) is str else m for m in columns["mimetypes"]
+        ]
+        arena.ctypes = [
+            sys.intern(c) if type(c) is str else c for c in columns["ctypes"]
+        ]
+        arena.contents = columns["contents"]
+        arena.texts = columns["texts"]
+        arena.summaries = columns["summaries"]
+        arena.origins = [Origin(**o) if o else None for o in columns["origins"]]
+        arena.metadata = columns["metadata"]
+        arena.histories = columns["histories"]
+        for idx, blob_offset, length in columns["blobs"]:
+            start = offset + blob_offset
+            arena.contents[idx] = bytes(view[start : start + length])
+
+        return arena
+
+    def walk(self, idx: int = 0) -> Generator[tuple[int, int], None, None]:
+        """Iterate depth and node index of the subtree at `idx` in reading order"""
+        if not len(self):
+            return
+
+        stack = [(idx, 0)]
+        child, next_ = self.child, self.next
+        while stack:
+            node, depth = stack.pop()
+            yield depth, node
+
+            if next_[node] != NIL and node != idx:
+                stack.append((next_[node], depth))
+            if child[node] != NIL:
+                stack.append((child[node], depth + 1))
+
+    def to_chunk(self, idx: int = 0) -> Chunk | None:
+        """Materialize the arena into linked `Chunk` objects
+
+        Returns:
+            the chunk at index `idx`, with all relations materialized
+        """
+        if not len(self):
+            return None
+        return self.to_chunks()[idx]
+
+    def to_chunks(self) -> list[Chunk]:
+        """Materialize the arena into linked `Chunk` objects
+
+        Returns:
+            the chunks, in the order of the arena
+        """
+        chunks = []
+        for i in range(len(self)):
+            ch = Chunk(
+                mimetype=self.mimetypes[i],
+                ctype=self.ctypes[i],
+                content=self.contents[i],
+                text=self.texts[i],
+                summary=self.summaries[i],
+                origin=self.origins[i],
+                metadata=self.metadata[i],
+                history=self.histories[i],
+            )
+            ch.id = self.ids[i]
+            if ch._metadata is not None or ch._history is not None:
+                ch._shared = True
+            if self.store is not None:
+                ch.store = self.store
+            chunks.append(ch)
+
+        for i, ch in enumerate(chunks):
+            if self.parent[i] != NIL:
+                ch._parent = chunks[self.parent[i]]
+            if self.child[i] != NIL:
+                ch._child = chunks[self.child[i]]
+            if self.next[i] != NIL:
+                ch._next = chunks[self.next[i]]
+            if self.prev[i] != NIL:
+                ch._prev = chunks[self.prev[i]]
+
+        return chunks
@@ -1,19 +1,98 @@
 import logging
 import os
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Generator, NamedTuple
 
 from chunking.base import Chunk
 from chunking.controller import get_controller
 from chunking.mime import MimeType
+from chunking.store.parse_cache import ParseCache
 
 logger = logging.getLogger(__name__)
 
+# Number of files of a directory whose mimetypes are guessed at once
+_MIMETYPE_BATCH = 256
+
+
+class ParseRecord(NamedTuple):
+    """The outcome of parsing a file or directory
+
+    Attributes:
+        path: the parsed path
+        chunk: the root chunk, unparsed if all the parsers failed, None if the
+            path couldn't be read
+        error: the error of the last failed parser if no parser succeeded, or the
+            error that prevented parsing the path
+    """
+
+    path: str
+    chunk: Chunk | None
+    error: Exception | None
+
+
+def _parse_path(
+    ctrl,
+    path: str | Path,
+    content_ids: bool,
+    cache: ParseCache | None = None,
+    mimetype: str | None = None,
+) -> ParseRecord:
+    """Parse the path with the first parser of the controller that succeeds"""
+    # Parse the path into chunk
+    chunk = ctrl.as_root_chunk(path, mimetype)
+    mimetype = chunk.mimetype
+
+    # Attempt to parse the chunk
+    attempted, error = 0, None
+    for parser in ctrl.iter_parser(path, mimetype=mimetype):
+        attempted += 1
+        key = None
+        if cache is not None and mimetype != MimeType.directory:
+            key = cache.key(chunk.id, parser)
+            cached = cache.get(key)
+            if cached is not None:
+                # the same content might have been cached from another path
+                cached.origin = chunk.origin
+                chunk, error = cached, None
+                break
+        try:
+            parser.run(chunk)
+            error = None
+            if key is not None:
+                cache.put(key, chunk)
+            break
+        except Exception as e:
+            chunk = ctrl.as_root_chunk(path, mimetype)
+            logger.warning(f"Parser {parser} failed for {path}: {e}")
+            error = e
+            continue
+    else:
+        if attempted == 0:
+            # No parser found
+            logger.warning(f"No parser found for {path}. Skipping.")
+
+    if content_ids:
+        chunk.assign_content_ids()
+
+    return ParseRecord(str(path), chunk, error)
+
 
 def parse_as_graph(
     path: str | Path,
     extras: dict[str, list] | None = None,
     callbacks: list[Callable] | None = None,
+    content_ids: bool = False,
+    cache: ParseCache | None = None,
 ) -> Chunk:
     """Parse a file or directory into chunks
 
@@ -24,65 +103,163 @@ def parse_as_graph(
         callbacks: a list of callback functions, where each function takes in a
             path and a mimetype, and returns a single parser to use, or return None
             if no parser is found
+        content_ids: if True, derive the chunk ids from the file and the chunk
+            content, so that parsing the same file again gives the same ids
+        cache: reuse the trees of the files that were already parsed with the
+            same parser, and cache the new ones
     """
     ctrl = get_controller()
     with ctrl.temporary(extras=extras, callbacks=callbacks):
-        # Parse the path into chunk
-        chunk = ctrl.as_root_chunk(path)
+        return _parse_path(ctrl, path, content_ids, cache).chunk
+
+
+def _parse_file(
+    path: str,
+    extras: dict[str, list] | None,
+    callbacks: list[Callable] | None,
+    content_ids: bool,
+    cache: ParseCache | None = None,
+    mimetype: str | None = None,
+) -> ParseRecord:
+    """Parse a file, catching the errors, in the calling process or in a worker"""
+    ctrl = get_controller()
+    try:
+        with ctrl.temporary(extras=extras, callbacks=callbacks):
+            return _parse_path(ctrl, path, content_ids, cache, mimetype)
+    except Exception as e:
+        return ParseRecord(path, None, e)
 
-        # Attempt to parse the chunk
-        attempted = 0
-        for parser in ctrl.iter_parser(path):
-            attempted += 1
+
+class _WorkerPool:
+    """Submit `_parse_file` jobs to an executor
+
+    A crashed worker breaks a process pool, and fails all of its pending jobs. The
+    pool is then replaced if it is owned, and the files of the failed jobs are
+    parsed again one by one, each in its own process, so that only the file that
+    crashed the worker is lost.
+    """
+
+    def __init__(self, executor: Executor | None, workers: int):
+        self._owned = executor is None
+        self._workers = workers
+        self._executor = executor or ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, *args) -> Future:
+        try:
+            return self._executor.submit(_parse_file, *args)
+        except BrokenProcessPool as e:
+            if not self._owned:
+                future = Future()
+                future.set_exception(e)
+                return future
+            self._executor.shutdown(wait=False)
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+            return self._executor.submit(_parse_file, *args)
+
+    def record(self, future: Future, args: tuple) -> ParseRecord:
+        """The record of a job, with the unparsed file chunk if the job failed"""
+        file_path, mimetype = args[0], args[-1]
+        try:
+            return future.result()
+        except BrokenProcessPool:
             try:
-                parser.run(chunk)
-                break
+                with ProcessPoolExecutor(max_workers=1) as isolated:
+                    return isolated.submit(_parse_file, *args).result()
             except Exception as e:
-                chunk = ctrl.as_root_chunk(path)
-                logger.warning(f"Parser {parser} failed for {path}: {e}")
-                continue
-        else:
-            if attempted == 0:
-                # No parser found
-                logger.warning(f"No parser found for {path}. Skipping.")
+                error = e
+        except Exception as e:
+            error = e
 
-    return chunk
+        logger.warning(f"Failed to parse {file_path} in a worker: {error}")
+        try:
+            chunk = get_controller().as_root_chunk(file_path, mimetype)
+        except Exception:
+            chunk = None
+        return ParseRecord(file_path, chunk, error)
 
+    def shutdown(self):
+        if self._owned:
+            self._executor.shutdown()
 
-def parse(
-    path: str | Path,
-    skip_hidden: bool = True,
-    extras: dict[str, list] | None = None,
-    callbacks: list[Callable] | None = None,
-) -> Chunk | list[Chunk]:
-    """Parse a directory or a file into chunks,
-    where each file is a chunk with its content as children.
 
-    Args:
-        path: the path to the directory
-        skip_hidden: whether to skip hidden files and directories
-        extras: a dictionary mapping mimetype to list of parsers to use for that
-        callbacks: a list of callback functions, where each function takes in a
-            path and a mimetype, and returns a single parser to use, or return None
-            if no parser is found
+def _drain(
+    queue: deque, pool: _WorkerPool | None, ordered: bool, block: bool = False
+) -> Generator[ParseRecord, None, None]:
+    """Pop and yield the records of the queue that are ready
 
-    Returns:
-        A list of chunks, where each chunk is a file in the directory
+    Args:
+        queue: records, and jobs as (future, args), in the walk order
+        ordered: only yield from the front of the queue, to keep the walk order
+        block: wait until at least one record is yielded
     """
-    path = Path(path)
+    while queue:
+        if ordered:
+            item = queue[0]
+            if not isinstance(item, ParseRecord) and not item[0].done():
+                if not block:
+                    return
+                wait([item[0]])
+            queue.popleft()
+            yield item if isinstance(item, ParseRecord) else pool.record(*item)
+        else:
+            ready = [
+                item
+                for item in queue
+                if isinstance(item, ParseRecord) or item[0].done()
+            ]
+            if not ready:
+                if not block:
+                    return
+                wait([item[0] for item in queue], return_when=FIRST_COMPLETED)
+                continue
+            ready_ids = {id(item) for item in ready}
+            remaining = [item for item in queue if id(item) not in ready_ids]
+            queue.clear()
+            queue.extend(remaining)
+            for item in ready:
+                yield item if isinstance(item, ParseRecord) else pool.record(*item)
+        block = False
+
+
+def _iter_records(
+    path: Path,
+    skip_hidden: bool,
+    extras: dict[str, list] | None,
+    callbacks: list[Callable] | None,
+    content_ids: bool,
+    workers: int | None,
+    executor: Executor | None,
+    max_in_flight: int | None,
+    ordered: bool,
+    cache: ParseCache | None,
+) -> Generator[ParseRecord, None, None]:
     if skip_hidden and path.name.startswith("."):
         logger.debug(f"Skipping hidden file/directory: {path}")
-        return []
+        return
 
     if path.is_file():
-        return parse_as_graph(path, extras=extras, callbacks=callbacks)
+        yield _parse_file(str(path), extras, callbacks, content_ids, cache)
+        return
 
     # Don't process directories
     ctrl = get_controller()
     ctrl._parsers.pop(MimeType.directory, None)
 
-    result = []
-    with ctrl.temporary(extras=extras, callbacks=callbacks):
+    pool = None
+    if executor is not None or (workers is not None and workers > 1):
+        pool = _WorkerPool(executor, workers or os.cpu_count() or 1)
+    if max_in_flight is None:
+        max_in_flight = 2 * (workers or os.cpu_count() or 1)
+
+    # the records and the jobs of the pool that are not yielded yet, in walk order.
+    # The extras are only added to the controller while a path is parsed in this
+    # process, so that they are not in effect between the yields, or copied to
+    # the forked workers
+    queue: deque[ParseRecord | tuple[Future, tuple]] = deque()
+    with ExitStack() as stack:
+        if pool is not None:
+            stack.callback(pool.shutdown)
+
         # Parse the path into chunk
         for root, dirs, files in os.walk(path):
             for each_dir in list(sorted(dirs)):
@@ -93,45 +270,181 @@ def parse(
                     continue
 
                 dir_path = os.path.join(root, each_dir)
-                parser = list(ctrl.iter_parser(dir_path))
-                if not parser:
-                    continue
-
-                # A directory might be processed in case `extras` and/or `callbacks`
-                # decide to process it
-                chunk = ctrl.as_root_chunk(dir_path)
-                for p in parser:
-                    try:
-                        p.run(chunk)
-                        result.append(chunk)
-                        dirs.remove(each_dir)  # Don't process this directory again
-                        break
-                    except Exception as e:
-                        chunk = ctrl.as_root_chunk(dir_path)
-                        logger.warning(f"Parser {p} failed for {dir_path}: {e}")
+                with ctrl.temporary(extras=extras, callbacks=callbacks):
+                    parser = list(ctrl.iter_parser(dir_path))
+                    if not parser:
                         continue
 
+                    # A directory might be processed in case `extras` and/or
+                    # `callbacks` decide to process it
+                    chunk = ctrl.as_root_chunk(dir_path)
+                    for p in parser:
+                        try:
+                            p.run(chunk)
+                            if content_ids:
+                                chunk.assign_content_ids()
+                            queue.append(ParseRecord(dir_path, chunk, None))
+                            dirs.remove(each_dir)  # Don't process this directory again
+                            break
+                        except Exception as e:
+                            chunk = ctrl.as_root_chunk(dir_path)
+                            logger.warning(f"Parser {p} failed for {dir_path}: {e}")
+                            continue
+
             # Parse each file in the directory
+            file_paths = []
             for each_file in sorted(files):
                 if skip_hidden and each_file.startswith("."):
                     # Don't process hidden files
                     logger.debug(f"Skipping hidden file: {each_file}")
                     continue
+                file_paths.append(os.path.join(root, each_file))
 
-                file_path = os.path.join(root, each_file)
-                chunk = ctrl.as_root_chunk(file_path)
-
-                # Attempt to parse the chunk
-                for parser in ctrl.iter_parser(file_path):
-                    try:
-                        parser.run(chunk)
-                        break
-                    except Exception as e:
-                        chunk = ctrl.as_root_chunk(file_path)
-                        logger.warning(f"Parser {parser} failed for {file_path}: {e}")
-                        continue
+            for start in range(0, len(file_paths), _MIMETYPE_BATCH):
+                # identify the files in batches, once for the whole parse
+                batch = file_paths[start : start + _MIMETYPE_BATCH]
+                for file_path, mimetype in zip(batch, ctrl.guess_mimetypes(batch)):
+                    args = (file_path, extras, callbacks, content_ids, cache, mimetype)
+                    if pool is None:
+                        queue.append(_parse_file(*args))
+                    else:
+                        while len(queue) >= max_in_flight:
+                            yield from _drain(queue, pool, ordered, block=True)
+                        queue.append((pool.submit(*args), args))
+                    yield from _drain(queue, pool, ordered)
+
+        while queue:
+            yield from _drain(queue, pool, ordered, block=True)
+
+
+def iter_parse(
+    path: str | Path,
+    skip_hidden: bool = True,
+    extras: dict[str, list] | None = None,
+    callbacks: list[Callable] | None = None,
+    content_ids: bool = False,
+    workers: int | None = None,
+    executor: Executor | None = None,
+    max_in_flight: int | None = None,
+    ordered: bool = True,
+    records: bool = False,
+    cache: ParseCache | None = None,
+) -> Generator[Chunk | ParseRecord, None, None]:
+    """Parse a directory or a file, and yield each file chunk as soon as it is
+    parsed
+
+    Unlike `parse`, the chunks of the files are not kept, so that the memory stays
+    bounded on large directories, and the chunks can be processed while the next
+    files are parsed.
 
-                # Add the chunk to the result
-                result.append(chunk)
+    Args:
+        path: the path to the directory or file
+        skip_hidden: whether to skip hidden files and directories
+        extras: a dictionary mapping mimetype to list of parsers to use for that
+        callbacks: a list of callback functions, where each function takes in a
+            path and a mimetype, and returns a single parser to use, or return None
+            if no parser is found
+        content_ids: if True, derive the chunk ids from the file and the chunk
+            content, so that parsing the same files again gives the same ids
+        workers: parse the files in a pool of this many processes. The `extras`
+            and `callbacks` must then be picklable
+        executor: parse the files with this executor instead, it is not shut down
+        max_in_flight: maximum number of files that are parsed or wait to be
+            yielded, defaults to twice the number of workers
+        ordered: with workers, yield the files in the walk order. If False, yield
+            each file as soon as it is parsed
+        records: yield a `ParseRecord` (path, chunk, error) for each file, including
+            the files that couldn't be read, instead of the chunks
+        cache: reuse the trees of the files that were already parsed with the
+            same parser, and cache the new ones
+
+    Yields:
+        the root chunk of each file, or its `ParseRecord`
+    """
+    for record in _iter_records(
+        Path(path),
+        skip_hidden,
+        extras,
+        callbacks,
+        content_ids,
+        workers,
+        executor,
+        max_in_flight,
+        ordered,
+        cache,
+    ):
+        if records:
+            yield record
+        elif record.chunk is not None:
+            yield record.chunk
+        else:
+            logger.error(f"Skipping {record.path}: {record.error}")
+
+
+def parse(
+    path: str | Path,
+    skip_hidden: bool = True,
+    extras: dict[str, list] | None = None,
+    callbacks: list[Callable] | None = None,
+    content_ids: bool = False,
+    workers: int | None = None,
+    executor: Executor | None = None,
+    max_in_flight: int | None = None,
+    cache: ParseCache | None = None,
+) -> Chunk | list[Chunk]:
+    """Parse a directory or a file into chunks,
+    where each file is a chunk with its content as children.
+
+    The files of a directory can be parsed in parallel, each file in a worker
+    process. The result keeps the order of the sequential parse. A file whose job
+    fails (e.g. the worker crashed) is returned unparsed, as when all of its
+    parsers fail. See `iter_parse` to process the files as they are parsed.
+
+    Args:
+        path: the path to the directory
+        skip_hidden: whether to skip hidden files and directories
+        extras: a dictionary mapping mimetype to list of parsers to use for that
+        callbacks: a list of callback functions, where each function takes in a
+            path and a mimetype, and returns a single parser to use, or return None
+            if no parser is found
+        content_ids: if True, derive the chunk ids from the file and the chunk
+            content, so that parsing the same files again gives the same ids
+        workers: parse the files of a directory in a pool of this many processes.
+            The `extras` and `callbacks` must then be picklable
+        executor: parse the files of a directory with this executor instead, it is
+            not shut down
+        max_in_flight: maximum number of files that are parsed or wait to be
+            collected, defaults to twice the number of workers
+        cache: reuse the trees of the files that were already parsed with the
+            same parser, and cache the new ones
+
+    Returns:
+        A list of chunks, where each chunk is a file in the directory
+    """
+    path = Path(path)
+    if skip_hidden and path.name.startswith("."):
+        logger.debug(f"Skipping hidden file/directory: {path}")
+        return []
+
+    if path.is_file():
+        return parse_as_graph(
+            path,
+            extras=extras,
+            callbacks=callbacks,
+            content_ids=content_ids,
+            cache=cache,
+        )
 
-    return result
+    return list(
+        iter_parse(
+            path,
+            skip_hidden=skip_hidden,
+            extras=extras,
+            callbacks=callbacks,
+            content_ids=content_ids,
+            workers=workers,
+            executor=executor,
+            max_in_flight=max_in_flight,
+            cache=cache,
+        )
+    )
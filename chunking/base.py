@@ -1,13 +1,31 @@
+import hashlib
 import inspect
+import json
 import logging
 import re
+import sys
 import uuid
+import weakref
+from bisect import bisect_right
 from collections import defaultdict, deque
 from copy import deepcopy
-from typing import Any, Callable, Generator, Literal, get_type_hints, overload
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Generator,
+    Iterable,
+    Literal,
+    get_type_hints,
+    overload,
+)
 
 from chunking.mime import get_mime_manager
 
+if TYPE_CHECKING:
+    from chunking.diff import TreeDiff
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +43,8 @@ class Origin:
             contains the page number and the position of the object.
     """
 
+    __slots__ = ("source_id", "location", "protocol", "metadata")
+
     def __init__(
         self,
         source_id: str = "",
@@ -128,6 +148,258 @@ class CType:
         return text
 
 
+def _separator(ctype: str, has_content: bool) -> str:
+    """The separator before a child in the plain and markdown renders"""
+    if ctype == "inline":
+        return " "
+    if ctype in ("list", "tablerow"):
+        return "\n"
+    return "\n\n" if has_content else ""
+
+
+class _StrippedFragments:
+    """Join the fragments of nested chunks, each chunk stripped as a whole
+
+    Stream version of `"".join(fragments).lstrip(lchars).rstrip()` applied to the
+    render of each nested chunk, where a chunk that renders to nothing is dropped
+    with its separator. Whitespace is held back until content follows, tagged
+    with the depth of its chunk, so a fragment costs O(1) amortized whatever the
+    depth of its chunk.
+
+    Args:
+        lchars: the characters stripped at the start of a chunk, None for
+            whitespace
+    """
+
+    def __init__(self, lchars: str | None = None):
+        self.lchars = lchars
+        # depth and fragment of the whitespace held back
+        self._pending: list[tuple[int, str]] = []
+        # length of `_pending` when each open chunk started
+        self._marks: list[int] = []
+        # the filters of the open chunks, see `.open`
+        self._filters: list["_BlankLinesRemoved | None"] = []
+        # the number of outermost open chunks that already have content
+        self._started = 0
+
+    def open(self, separator: str = "", filter: "_BlankLinesRemoved | None" = None):
+        """Start a nested chunk
+
+        Args:
+            separator: preceding the chunk, if the chunk has content
+            filter: applied to the stripped fragments of the chunk, only used for
+                the chunks of depth 1
+        """
+        self._marks.append(len(self._pending))
+        if separator:
+            self._pending.append((len(self._marks) - 1, separator))
+        self._filters.append(filter)
+
+    def close(self) -> bool:
+        """End the current chunk, dropping its trailing whitespace
+
+        Returns:
+            whether the chunk had content
+        """
+        depth = len(self._marks)
+        del self._pending[self._marks.pop() :]
+        self._filters.pop()
+        started = self._started >= depth
+        self._started = min(self._started, depth - 1)
+        return started
+
+    def add(self, fragment: str) -> str:
+        """Add a fragment to the current chunk
+
+        Returns:
+            the output so far, empty if the fragment is held back
+        """
+        stripped = fragment.rstrip()
+        depth = len(self._marks)
+        if not stripped:
+            if fragment:
+                self._pending.append((depth, fragment))
+            return ""
+
+        # the chunks without content yet strip their leading characters
+        lead = self._started + 1
+        outer, inner, leading = [], [], []
+        for pending_depth, pending in self._pending:
+            if pending_depth == 0:
+                outer.append(pending)
+            elif pending_depth < lead:
+                inner.append(pending)
+            else:
+                leading.append(pending)
+        leading.append(stripped)
+        text = "".join(leading)
+        if lead <= depth:
+            text = text.lstrip(self.lchars)
+
+        if depth:
+            inner.append(text)
+            text = "".join(inner)
+            if self._filters[0] is not None:
+                text = self._filters[0].feed(text)
+        outer.append(text)
+
+        trailing = fragment[len(stripped) :]
+        self._pending = [(depth, trailing)] if trailing else []
+        self._marks = [0] * depth
+        self._started = depth
+        return "".join(outer)
+
+    def finish(self) -> str:
+        """The whitespace left after the last content, outside of any chunk"""
+        rest = "".join(fragment for _, fragment in self._pending)
+        self._pending = []
+        return rest
+
+
+class _BlankLinesRemoved:
+    """Stream version of `textwrap.dedent` normalization of whitespace-only lines
+
+    Lines that only consist of spaces and tabs are emptied.
+    """
+
+    def __init__(self):
+        self._pending = ""  # spaces and tabs starting the current line
+        self._in_content = False  # whether the current line has content
+
+    def feed(self, fragment: str) -> str:
+        out = []
+        for idx, line in enumerate(fragment.split("\n")):
+            if idx > 0:
+                self._pending = ""
+                self._in_content = False
+                out.append("\n")
+
+            if self._in_content:
+                out.append(line)
+            elif line.strip(" \t"):
+                out.append(self._pending)
+                out.append(line)
+                self._pending = ""
+                self._in_content = True
+            else:
+                self._pending += line
+        return "".join(out)
+
+
+def _raw_content(chunk: "Chunk") -> Any:
+    """Content of the chunk, without loading the original file of a Root chunk"""
+    if chunk._content is None and chunk._store is not None:
+        return chunk.content
+    return chunk._content
+
+
+def _str_length(chunk: "Chunk", length_fn: Callable[[str], int] = len) -> int:
+    content = _raw_content(chunk)
+    return length_fn(content) if isinstance(content, str) else 0
+
+
+def _bytes_length(chunk: "Chunk") -> int:
+    content = _raw_content(chunk)
+    return len(content) if isinstance(content, bytes) else 0
+
+
+def _one(chunk: "Chunk") -> int:
+    return 1
+
+
+def _word_len(text: str) -> int:
+    return len(text.split())
+
+
+def _copy_value(value: Any) -> Any:
+    """Deep copy of a JSON-like value, immutable values are returned as is"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return deepcopy(value)
+
+
+def _chunk_from_bytes(data: bytes, idx: int = 0) -> "Chunk":
+    """Deserialize the chunk at `idx` of the output of `Chunk.to_bytes`"""
+    from chunking.arena import ChunkArena
+
+    return ChunkArena.from_bytes(data).to_chunk(idx)
+
+
+def _chunks_from_bytes(data: bytes) -> list["Chunk"]:
+    """Unpickle the tree of a `_PickledTree`"""
+    from chunking.arena import ChunkArena
+
+    return ChunkArena.from_bytes(data).to_chunks()
+
+
+def _chunk_from_tree(chunks: list["Chunk"], idx: int) -> "Chunk":
+    """Unpickle a chunk serialized by `Chunk.__reduce_ex__`"""
+    return chunks[idx]
+
+
+class _PickledTree:
+    """A chunk tree serialized once for all the chunks of the tree
+
+    The chunks of the tree reduce to this object and their index in it, so that
+    pickling many chunks of a tree writes the tree once, and the unpickled chunks
+    share their relations. The trees being pickled are found by `id` of their chunks
+    in `_PICKLED_TREES`, as long as the pickler holds them.
+
+    Args:
+        top: the first chunk of the tree, without parent and previous sibling
+        include_siblings: if True, also serialize the next siblings of `top`
+    """
+
+    __slots__ = ("chunks", "index", "data", "__weakref__")
+
+    def __init__(self, top: "Chunk", include_siblings: bool):
+        from chunking.arena import ChunkArena
+
+        # the chunks are kept alive, so their `id` isn't reused meanwhile
+        self.chunks = [node for _, node in top.walk(include_siblings=include_siblings)]
+        self.index = {id(node): idx for idx, node in enumerate(self.chunks)}
+        try:
+            self.data = ChunkArena.from_chunk(
+                top, include_siblings=include_siblings, load_content=True, copy=False
+            ).to_bytes()
+        except TypeError:
+            self.data = None
+
+        for node in self.chunks:
+            _PICKLED_TREES.setdefault(id(node), self)
+
+    def __reduce__(self):
+        return _chunks_from_bytes, (self.data,)
+
+
+_PICKLED_TREES: "weakref.WeakValueDictionary[int, _PickledTree]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+# Render method of each format of `Chunk.render`
+_RENDERERS = {
+    "plain": "_render_plain",
+    "markdown": "_render_markdown",
+    "multi": "_render_multi",
+}
+
+_CLONE_FIELDS = {
+    "mimetype",
+    "ctype",
+    "content",
+    "text",
+    "summary",
+    "parent",
+    "child",
+    "next",
+    "prev",
+    "origin",
+    "metadata",
+    "history",
+}
+
+
 class Chunk:
     """Mandatory fields for an object represented in `chunking`.
 
@@ -150,8 +422,33 @@ class Chunk:
         prev: previous object id. Default to None.
         origin: the location of this object in relative to the parent.
         metadata: metadata of the object, a free-style dictionary.
+
+    Parsers can emit hundreds of thousands of chunks per document, so the object is
+    kept compact: attributes live in `__slots__`, `ctype` and `mimetype` strings are
+    interned, and `id`, `metadata` and `history` are only allocated on first access.
     """
 
+    __slots__ = (
+        "_id",
+        "_mimetype",
+        "_ctype",
+        "_content",
+        "_text",
+        "_summary",
+        "_parent",
+        "_child",
+        "_next",
+        "_prev",
+        "origin",
+        "_metadata",
+        "_aggregates",
+        "_history",
+        "_store",
+        "_render_cache",
+        "_shared",
+        "__weakref__",
+    )
+
     ctype_class = CType
 
     def __init__(
@@ -169,7 +466,10 @@ class Chunk:
         metadata: None | dict = None,
         history: None | list = None,
     ):
-        self.id: str = uuid.uuid4().hex
+        self._id: str | None = None
+        self._render_cache: dict | None = None
+        self._aggregates: dict | None = None
+        self._shared: bool = False
         self.mimetype = mimetype
         self.ctype = ctype
         self._content = content
@@ -180,11 +480,10 @@ class Chunk:
         self._next = next
         self._prev = prev
         self.origin = origin
-        self.metadata = metadata or {}
 
-        # internal use
-        self._content_length: int | None = None
-        self._history: list = history or []
+        # internal use, empty metadata and history are allocated on first access
+        self._metadata: dict | None = metadata or None
+        self._history: list | None = history or None
         self._store: "BaseStore | None" = None
 
         # convert origin to Origin object if it is a dict
@@ -218,6 +517,67 @@ class Chunk:
         for _, ch in self.walk():
             yield ch
 
+    def traverse(
+        self,
+        depth: int = 0,
+        include_siblings: bool = False,
+        order: Literal["pre", "post"] = "pre",
+        ctype: str | list[str] | None = None,
+    ) -> Generator[tuple[int, "Chunk"], None, None]:
+        """Iterate depth and chunk of the tree, depth first, breadth second
+
+        The traversal uses an explicit stack of ancestors rather than recursion, so
+        it handles arbitrarily deep trees, and each node costs O(1) regardless of its
+        depth. Stop iterating the generator to exit early. The relations of a node
+        are only read after it is yielded (pre-order) or after its subtree has been
+        visited (post-order), so it is safe to modify a chunk when it is yielded.
+
+        Args:
+            depth: the depth assigned to the current chunk
+            include_siblings: if True, also traverse the next siblings of the current
+                chunk, and their subtrees
+            order: "pre" yields a chunk before its children, "post" yields a chunk
+                after its children
+            ctype: if given, only yield the chunks of this ctype (or these ctypes),
+                the other chunks are still traversed
+
+        Yields:
+            tuple[int, Chunk]: the depth and the chunk object
+        """
+        if isinstance(ctype, str):
+            ctype = (ctype,)
+        pre, post = order == "pre", order == "post"
+        if not pre and not post:
+            raise ValueError(f"Unknown traversal order: {order}")
+
+        ancestors: list[Chunk] = []
+        node: Chunk | None = self
+        while node is not None:
+            if pre and (ctype is None or node._ctype in ctype):
+                yield depth, node
+
+            child = node.child
+            if child is not None:
+                ancestors.append(node)
+                node, depth = child, depth + 1
+                continue
+
+            # Leaf, climb up until a node with a next sibling is found
+            while node is not None:
+                if post and (ctype is None or node._ctype in ctype):
+                    yield depth, node
+
+                if not ancestors:
+                    node = node.next if include_siblings else None
+                    break
+
+                next_ = node.next
+                if next_ is not None:
+                    node = next_
+                    break
+
+                node, depth = ancestors.pop(), depth - 1
+
     def walk(
         self, depth: int = 0, include_siblings: bool = True
     ) -> Generator[tuple[int, "Chunk"], None, None]:
@@ -230,21 +590,7 @@ class Chunk:
         Yields:
             tuple[int, Chunk]: the depth and the chunk object
         """
-        # Yield current chunk first
-        yield (depth, self)
-
-        # Then yield all the children
-        child = self.child
-        while child:
-            yield from child.walk(depth=depth + 1, include_siblings=False)
-            child = child.next
-
-        if include_siblings:
-            # Finally yield all the siblings
-            sibling = self.next
-            while sibling:
-                yield from sibling.walk(depth=depth, include_siblings=False)
-                sibling = sibling.next
+        return self.traverse(depth=depth, include_siblings=include_siblings)
 
     def nav(
         self, next: int = 0, prev: int = 0, parent: int = 0, child: int = 0
@@ -290,6 +636,28 @@ class Chunk:
                     return None
             return ch
 
+    @property
+    def id(self) -> str:
+        """Get the id of the object, generated on first access if not set"""
+        if self._id is None:
+            self._id = uuid.uuid4().hex
+        return self._id
+
+    @id.setter
+    def id(self, value: str):
+        self._id = value
+
+    @property
+    def mimetype(self) -> str | None:
+        """Get the mimetype of the object"""
+        return self._mimetype
+
+    @mimetype.setter
+    def mimetype(self, value):
+        """Set the mimetype of the object, interned to share the string"""
+        self._mimetype = sys.intern(value) if type(value) is str else value
+        self.invalidate()
+
     @property
     def ctype(self):
         """Get the chunk type of the object"""
@@ -297,8 +665,36 @@ class Chunk:
 
     @ctype.setter
     def ctype(self, value):
-        """Set the chunk type of the object"""
-        self._ctype = value
+        """Set the chunk type of the object, interned to share the string"""
+        self._ctype = sys.intern(value) if type(value) is str else value
+        self.invalidate()
+
+    @property
+    def metadata(self) -> dict:
+        """Get the metadata of the object
+
+        The returned dict can be modified, so metadata shared by `.clone` is copied
+        first. Read-only internal paths (e.g. `.page`, store indexes) read
+        `_metadata` instead, to keep it shared.
+        """
+        if self._shared:
+            self._unshare()
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: dict | None):
+        if self._shared:
+            self._unshare()
+        self._metadata = value
+
+    def _unshare(self):
+        """Copy the metadata and history shared with other chunks by `.clone`"""
+        self._metadata = deepcopy(self._metadata)
+        if self._history is not None:
+            self._history = list(self._history)
+        self._shared = False
 
     @property
     def content(self):
@@ -307,8 +703,10 @@ class Chunk:
             return self._content
 
         if self._store is not None:
-            self._content = self._store.fetch_content(self)
-            return self._content
+            content = self._store.fetch_content(self)
+            if self._store.keep_content:
+                self._content = content
+            return content
 
         if self.origin is not None and self.ctype == CType.Root:
             # load content from the origin location if is Root chunk
@@ -321,33 +719,123 @@ class Chunk:
     def content(self, value):
         """Set the content of the object"""
         self._content = value
-        if isinstance(value, str):
-            self._content_length = len(value)
+        self.invalidate()
+
+    @property
+    def text(self) -> str:
+        """Get the text representation of the object"""
+        return self._text
+
+    @text.setter
+    def text(self, value: str):
+        self._text = value
+        self.invalidate()
+
+    @property
+    def summary(self) -> str:
+        """Get the text summary of the object"""
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: str):
+        self._summary = value
+        self.invalidate()
+
+    @property
+    def page(self) -> Any:
+        """Get the page of the object, from the origin location (e.g. PDF) or the
+        "page" metadata, None if unknown"""
+        if self.origin is not None and isinstance(self.origin.location, dict):
+            page = self.origin.location.get("page")
+            if page is not None:
+                return page
+        # read without `.metadata`, which copies the metadata shared by `.clone`
+        return (self._metadata or {}).get("page")
 
     @property
     def content_length(self) -> int:
-        """Get the length of the content of the object"""
-        if self._content_length is not None:
-            return self._content_length
+        """Get the total length of the text content of the object and its
+        descendants"""
+        return self._aggregate("content_length", _str_length)
 
-        content_length = 0
-        child = self.child
-        while child := self.child:
-            content_length += child.content_length
-            child = child.next
+    @property
+    def content_bytes(self) -> int:
+        """Get the total size of the binary content of the object and its
+        descendants"""
+        return self._aggregate("content_bytes", _bytes_length)
+
+    @property
+    def node_count(self) -> int:
+        """Get the number of chunks in the subtree of the object, itself included"""
+        return self._aggregate("node_count", _one)
+
+    def token_count(self, length_fn: Callable[[str], int] | None = None) -> int:
+        """Get the total token count of the text content of the object and its
+        descendants
+
+        Args:
+            length_fn: function to measure text length, default to word count. The
+                result is cached per function, so reuse the same function object.
+        """
+        length_fn = length_fn or _word_len
+        return self._aggregate(length_fn, lambda ch: _str_length(ch, length_fn))
 
-        if isinstance(self.content, str):
-            content_length += len(self.content)
+    def _aggregate(self, key, value_fn: Callable[["Chunk"], int]) -> int:
+        """Sum `value_fn` over the subtree, cached on each chunk of the subtree
 
-        self._content_length = content_length
-        return self._content_length
+        Modifying a chunk invalidates the cached sums of its ancestors, so only the
+        chunks along the modified paths are recomputed.
+        """
+        if self._aggregates is not None and key in self._aggregates:
+            return self._aggregates[key]
+
+        def cached(chunk: Chunk) -> bool:
+            return chunk._aggregates is not None and key in chunk._aggregates
+
+        # Post-order, skipping the subtrees whose sum is still cached. The sums
+        # that can't be cached, see `._links_children`, are kept by chunk id
+        uncached: dict[int, int] = {}
+        stack: list[tuple[Chunk, bool]] = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                total = value_fn(node)
+                child = node.child
+                while child:
+                    if id(child) in uncached:
+                        total += uncached[id(child)]
+                    else:
+                        total += child._aggregates[key]
+                    child = child.next
+                if node._links_children(cached):
+                    if node._aggregates is None:
+                        node._aggregates = {}
+                    node._aggregates[key] = total
+                else:
+                    uncached[id(node)] = total
+                continue
+
+            stack.append((node, True))
+            child = node.child
+            while child:
+                if not cached(child):
+                    stack.append((child, False))
+                child = child.next
+
+        return total
 
     @property
     def history(self) -> list:
+        if self._shared:
+            self._unshare()
+        if self._history is None:
+            self._history = []
         return self._history
 
     @history.setter
     def history(self, value: list):
+        if self._shared:
+            self._unshare()
         self._history = value
 
     @property
@@ -366,12 +854,14 @@ class Chunk:
         if isinstance(self._parent, str):
             if not self._store:
                 raise ValueError("Must provide `store` to load the parent")
-            self._parent = self._store.get(self._parent)
+            self._parent = self._store.load_relation(self._parent)
+            self._parent._link_back("_child", self)
             return self._parent
 
     @parent.setter
     def parent(self, value):
         if value is None or isinstance(value, (Chunk, str)):
+            self.invalidate()
             self._parent = value
         else:
             raise ValueError("`.parent` must be a Chunk or a id of a chunk")
@@ -391,7 +881,10 @@ class Chunk:
         if isinstance(self._next, str):
             if not self._store:
                 raise ValueError("Must provide `store` to load the next")
-            self._next = self._store.get(self._next)
+            self._next = self._store.load_relation(self._next)
+            self._next._link_back("_prev", self)
+            if isinstance(self._parent, Chunk):
+                self._next._link_back("_parent", self._parent)
             return self._next
         if self._next is not None:
             raise ValueError("`.next` must be a Chunk or a id of a chunk")
@@ -400,6 +893,7 @@ class Chunk:
     def next(self, value):
         if value is None or isinstance(value, (Chunk, str)):
             self._next = value
+            self.invalidate()
         else:
             raise ValueError("`.next` must be a Chunk or a id of a chunk")
 
@@ -418,7 +912,10 @@ class Chunk:
         if isinstance(self._prev, str):
             if not self._store:
                 raise ValueError("Must provide `store` to load the prev")
-            self._prev = self._store.get(self._prev)
+            self._prev = self._store.load_relation(self._prev)
+            self._prev._link_back("_next", self)
+            if isinstance(self._parent, Chunk):
+                self._prev._link_back("_parent", self._parent)
             return self._prev
         if self._prev is not None:
             raise ValueError("`.prev` must be a Chunk or a id of a chunk")
@@ -427,6 +924,7 @@ class Chunk:
     def prev(self, value):
         if value is None or isinstance(value, (Chunk, str)):
             self._prev = value
+            self.invalidate()
         else:
             raise ValueError("`.prev` must be a Chunk or a id of a chunk")
 
@@ -445,7 +943,8 @@ class Chunk:
         if isinstance(self._child, str):
             if not self._store:
                 raise ValueError("Must provide `store` to load the child")
-            self._child = self._store.get(self._child)
+            self._child = self._store.load_relation(self._child)
+            self._child._link_back("_parent", self)
             return self._child
         if self._child is not None:
             raise ValueError("`.child` must be a Chunk or a id of a chunk")
@@ -454,9 +953,20 @@ class Chunk:
     def child(self, value):
         if value is None or isinstance(value, (Chunk, str)):
             self._child = value
+            self.invalidate()
         else:
             raise ValueError("`.child` must be a Chunk or a id of a chunk")
 
+    def _link_back(self, attr: str, chunk: "Chunk"):
+        """Replace the relation `attr` by `chunk` if it is the id of `chunk`
+
+        Chunks loaded from a store refer to each other by id. Linking the loaded
+        chunks both ways lets `.invalidate` reach the ancestors that cache renders.
+        """
+        related = getattr(self, attr)
+        if isinstance(related, str) and related == chunk.id:
+            setattr(self, attr, chunk)
+
     @property
     def last_child(self) -> "Chunk | None":
         """Get the last child object"""
@@ -518,6 +1028,10 @@ class Chunk:
     ) -> str | list[str | dict]:
         """Select the executor type to render the object
 
+        The rendered output is cached on the chunk, keyed by the format and kwargs.
+        The cache is invalidated when the content, text, or relations of the chunk or
+        any of its descendants change.
+
         Args:
             format: the format of the output. Defaults to "plain".
                 - plain: plain text, no formatting
@@ -529,160 +1043,520 @@ class Chunk:
             str if format is "plain", "markdown" or 2d; list of dict if format
                 is "multi".
         """
-        if format == "plain":
-            current = self.text
+        if format == "markdown" and not kwargs:
+            # header_level, list_level
+            parent = self.parent
+            kwargs = {"header_level": 0}
+            while parent:
+                if parent.ctype == "header":
+                    kwargs["header_level"] += 1
+                parent = parent.parent
+
+        if format not in _RENDERERS:
+            raise NotImplementedError(
+                f"Render as `format={format}` is not yet supported"
+            )
 
-            if current:
-                return current
+        key = self._render_key(format, kwargs)
+        if key is None:
+            # not cacheable, render recursively
+            rendered = getattr(self, _RENDERERS[format])(**kwargs)
+        else:
+            if self._render_cache and key in self._render_cache:
+                rendered = self._render_cache[key]
+            else:
+                rendered = self._fill_render_cache(format, kwargs)
 
-            current = self.content if isinstance(self.content, str) else ""
-            child = self.child
-            while child:
-                rendered_child = child.render(format=format, **kwargs).strip()
-                if not rendered_child:
-                    child = child.next
-                    continue
+        if isinstance(rendered, list):
+            return list(rendered)
+        return rendered
 
-                if child.ctype == "inline":
-                    separator = " "
-                elif child.ctype == "list":
-                    separator = "\n"
-                elif child.ctype == "tablerow":
-                    separator = "\n"
-                elif not current:
-                    separator = ""
-                else:
-                    separator = "\n\n"
+    @overload
+    def render_iter(
+        self, format: Literal["plain", "markdown"] = "plain"
+    ) -> Generator[str, None, None]: ...
 
-                current += separator + rendered_child
-                child = child.next
+    @overload
+    def render_iter(
+        self, format: Literal["multi"]
+    ) -> Generator[str | dict, None, None]: ...
 
-            return current
-        elif format == "markdown":
-            import textwrap
+    def render_iter(
+        self,
+        format: Literal["plain", "markdown", "multi"] = "plain",
+        **kwargs,
+    ) -> Generator[str | dict, None, None]:
+        """Render the object as a stream of fragments in reading order
+
+        The fragments follow the same separator rules as `.render`, so joining them
+        gives the same result, without building the whole output in memory. Stop
+        iterating to exit early, e.g. once a token budget is reached.
 
+        Args:
+            format: the format of the output. Defaults to "plain".
+                - plain: plain text, no formatting
+                - markdown: plain text with markdown formatting
+                - multi: multi-modal representation, text fragments interleaved
+                    with dictionaries for non-text content
+
+        Yields:
+            str fragments if format is "plain" or "markdown"; str fragments or dict
+                items if format is "multi", joining consecutive strings gives
+                the items of `.render(format="multi")`
+        """
+        if format == "plain":
+            yield from self._iter_plain(kwargs)
+        elif format == "markdown":
             if not kwargs:
-                # header_level, list_level
                 parent = self.parent
                 kwargs = {"header_level": 0}
                 while parent:
                     if parent.ctype == "header":
                         kwargs["header_level"] += 1
                     parent = parent.parent
+            yield from self._iter_markdown(kwargs)
+        elif format == "multi":
+            for item in self._iter_multi(kwargs):
+                if item != "":
+                    yield item
+        else:
+            raise NotImplementedError(
+                f"Render as `format={format}` is not yet supported"
+            )
 
-            # Keep track of header to correctly render the header tag
-            if self.ctype == "header":
-                kwargs["header_level"] += 1
+    def _fill_render_cache(self, format: str, kwargs: dict) -> str | list:
+        """Render the chunk and the descendants it depends on, children first
 
-            if self.text:
-                # It means the chunk is pre-rendered, and don't need to render again
-                current = self.text
-            else:
-                current = self.content if isinstance(self.content, str) else ""
-                if (
-                    self.ctype == "header"
-                    and kwargs.get("header_level", 0) > 0
-                    and not current.startswith("#")
+        Each chunk then renders from the cached renders of its children, without
+        recursing, so deep trees don't hit the recursion limit. The subtrees whose
+        render is still cached, and the children of pre-rendered chunks, are
+        skipped. A chunk is only cached if `.invalidate` on its children reaches
+        it, see `._links_children`.
+
+        Returns:
+            the render of the chunk
+        """
+        render_name = _RENDERERS[format]
+
+        # Post-order, the kwargs of a chunk are the ones its parent renders it with.
+        # The children key is None for the chunks that don't render their children
+        stack: list[tuple[Chunk, dict, bool, Any]] = [(self, kwargs, False, None)]
+        while stack:
+            node, node_kwargs, expanded, children_key = stack.pop()
+            key = self._render_key(format, node_kwargs)
+            if expanded:
+                rendered = getattr(node, render_name)(**node_kwargs)
+                if children_key is None or node._links_children(
+                    lambda child: bool(child._render_cache)
+                    and children_key in child._render_cache
                 ):
-                    current = f"{'#' * kwargs['header_level']} {current}"
-                child = self.child
-                while child:
-                    # Don't strip left whitespace because of list indentation
-                    rendered_child = (
-                        child.render(format=format, **kwargs).rstrip().lstrip("\n")
-                    )
-                    rendered_child = textwrap.dedent(rendered_child)
-                    if not rendered_child:
-                        child = child.next
-                        continue
-                    if child.ctype == "inline":
-                        separator = " "
-                    elif child.ctype == "list":
-                        rendered_child = textwrap.indent(rendered_child, "  ")
-                        separator = "\n"
-                    elif child.ctype == "tablerow":
-                        separator = "\n"
-                    elif not current:
-                        separator = ""
-                    else:
-                        separator = "\n\n"
+                    if node._render_cache is None:
+                        node._render_cache = {}
+                    node._render_cache[key] = rendered
+                continue
 
-                    current += separator + rendered_child
-                    child = child.next
+            if node._render_cache and key in node._render_cache:
+                rendered = node._render_cache[key]
+                continue
+            if node.text and format != "multi":
+                stack.append((node, node_kwargs, True, None))
+                continue
 
-            if self.ctype == CType.Code:
-                # Add code block
-                current = current.strip()
-                if current:
-                    current = f"```\n{current}\n```"
+            child_kwargs = node_kwargs
+            if format == "markdown" and node.ctype == "header":
+                child_kwargs = {
+                    **node_kwargs,
+                    "header_level": node_kwargs.get("header_level", 0) + 1,
+                }
+            stack.append(
+                (node, node_kwargs, True, self._render_key(format, child_kwargs))
+            )
+            child = node.child
+            while child:
+                stack.append((child, child_kwargs, False, None))
+                child = child.next
 
-            return current
-        elif format == "multi":
-            current_content = ""
-            if self.ctype != CType.Root and self.content is not None:
-                # if None, just ignore and go to child chunk
-                if isinstance(self.content, str):
-                    current_content = self.content
-                elif isinstance(self.content, bytes):
-                    current_content = {
-                        "mimetype": self.mimetype,
-                        "text": self.summary or self.text,
-                    }
-                    try:
-                        mime_manager = get_mime_manager()
-                        obj = mime_manager.to_python(self)
-                        if obj is None:
-                            raise ValueError("Cannot convert to python object")
-                        current_content["content"] = obj
-                        current_content["processed"] = True
-                    except Exception as e:
-                        current_content["content"] = self.content
-                        current_content["processed"] = False
-                        logger.warning(
-                            f"Cannot convert content to python object: {e}\n"
-                            f"Mimetype: {self.mimetype}, Id: {self.id}"
-                        )
+        return rendered
+
+    def _links_children(self, cached: Callable[["Chunk"], bool]) -> bool:
+        """Whether the chunk can cache what it computes from its children
+
+        The children must be `cached`, and `.invalidate` on each of them must reach
+        the chunk. It doesn't for a shallow clone, whose children still link to the
+        original.
+        """
+        child = self._child
+        first = True
+        while isinstance(child, Chunk):
+            parent = child._parent
+            if parent is not self and (first or parent is not None):
+                return False
+            if not cached(child):
+                return False
+            first = False
+            child = child._next
+        return True
+
+    @staticmethod
+    def _render_key(format: str, kwargs: dict):
+        """Get the render cache key, None if the kwargs aren't hashable"""
+        try:
+            key = (format, tuple(sorted(kwargs.items()))) if kwargs else format
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _cached_render(self, format: str, kwargs: dict):
+        if not self._render_cache:
+            return None
+        key = self._render_key(format, kwargs)
+        if key is None:
+            return None
+        return self._render_cache.get(key)
+
+    def _iter_plain(self, kwargs: dict) -> Generator[str, None, None]:
+        cached = self._cached_render("plain", kwargs)
+        if cached is not None:
+            if cached:
+                yield cached
+            return
+
+        if self.text:
+            yield self.text
+            return
+
+        current = self.content if isinstance(self.content, str) else ""
+        if current:
+            yield current
+
+        # Depth first from an explicit stack of [chunk, child, has_content], where
+        # child is the child being rendered
+        fragments = _StrippedFragments()
+        stack: list[list] = [[self, self.child, bool(current)]]
+        while stack:
+            frame = stack[-1]
+            child = frame[1]
+            if child is None:
+                stack.pop()
+                if stack:
+                    if fragments.close():
+                        stack[-1][2] = True
+                    stack[-1][1] = stack[-1][1].next
+                continue
+
+            fragments.open(_separator(child.ctype, frame[2]))
+            cached = child._cached_render("plain", kwargs)
+            if cached is not None or child.text:
+                if out := fragments.add(child.text if cached is None else cached):
+                    yield out
+                if fragments.close():
+                    frame[2] = True
+                frame[1] = child.next
+                continue
+
+            current = child.content if isinstance(child.content, str) else ""
+            if out := fragments.add(current):
+                yield out
+            stack.append([child, child.child, bool(current)])
+
+        if out := fragments.finish():
+            yield out
+
+    def _iter_markdown(self, kwargs: dict) -> Generator[str, None, None]:
+        import textwrap
+
+        if self.text or self.ctype == CType.Code:
+            # Pre-rendered or code block, rendered at once
+            if rendered := self.render(format="markdown", **kwargs):
+                yield rendered
+            return
+
+        kwargs = dict(kwargs)
+        if self.ctype == "header":
+            kwargs["header_level"] = kwargs.get("header_level", 0) + 1
+
+        current = self._markdown_current(kwargs)
+        if current:
+            yield current
+
+        # Depth first from an explicit stack of [chunk, child, has_content, kwargs],
+        # where child is the child being rendered
+        fragments = _StrippedFragments("\n")
+        stack: list[list] = [[self, self.child, bool(current), kwargs]]
+        while stack:
+            frame = stack[-1]
+            child = frame[1]
+            if child is None:
+                stack.pop()
+                if stack:
+                    if fragments.close():
+                        stack[-1][2] = True
+                    stack[-1][1] = stack[-1][1].next
+                continue
+
+            kwargs = frame[3]
+            child_kwargs = dict(kwargs)
+            if child.ctype == "header":
+                child_kwargs["header_level"] = kwargs.get("header_level", 0) + 1
+            child_current = child._markdown_current(child_kwargs)
+            separator = _separator(child.ctype, frame[2])
+            if (
+                child.text
+                or child.ctype in (CType.List, CType.Code)
+                or not child_current.lstrip("\n")
+                or child_current.lstrip("\n")[0].isspace()
+                or child._cached_render("markdown", kwargs) is not None
+            ):
+                # Render at once, same as `.render`
+                rendered_child = (
+                    child.render(format="markdown", **kwargs).rstrip().lstrip("\n")
+                )
+                rendered_child = textwrap.dedent(rendered_child)
+                if child.ctype == "list":
+                    rendered_child = textwrap.indent(rendered_child, "  ")
+                if rendered_child:
+                    # already stripped, part of the fragments of the chunk
+                    fragments.add(separator)
+                    if out := fragments.add(rendered_child):
+                        yield out
+                    frame[2] = True
+                frame[1] = child.next
+                continue
+
+            # The first line isn't indented, so dedent only normalizes the
+            # whitespace-only lines, which is done once per child of the top chunk
+            fragments.open(separator, _BlankLinesRemoved() if len(stack) == 1 else None)
+            if out := fragments.add(child_current):
+                yield out
+            stack.append([child, child.child, bool(child_current), child_kwargs])
+
+        if out := fragments.finish():
+            yield out
+
+    def _iter_multi(self, kwargs: dict) -> Generator[str | dict, None, None]:
+        cached = self._cached_render("multi", kwargs)
+        if cached is not None:
+            yield from cached
+            return
+
+        current_content = self._multi_current()
+        yield current_content
+
+        # Depth first from an explicit stack of [child, current content of its
+        # parent], where child is the child being rendered
+        stack: list[list] = [[self.child, current_content]]
+        while stack:
+            frame = stack[-1]
+            child = frame[0]
+            if child is None:
+                stack.pop()
+                if stack:
+                    stack[-1][0] = stack[-1][0].next
+                continue
+
+            if child.ctype == CType.Inline:
+                separator = " "
+            elif child.ctype == CType.List:
+                separator = "\n"
+            elif not frame[1]:
+                separator = ""
+            else:
+                separator = "\n\n"
+            yield separator
+
+            cached = child._cached_render("multi", kwargs)
+            if cached is not None:
+                yield from cached
+                frame[0] = child.next
+                continue
+
+            child_content = child._multi_current()
+            yield child_content
+            stack.append([child.child, child_content])
+
+    def _render_plain(self, **kwargs) -> str:
+        if self.text:
+            return self.text
+
+        current = self.content if isinstance(self.content, str) else ""
+        parts = [current]
+        has_content = bool(current)
+        child = self.child
+        while child:
+            rendered_child = child.render(format="plain", **kwargs).strip()
+            if not rendered_child:
+                child = child.next
+                continue
+
+            if child.ctype == "inline":
+                separator = " "
+            elif child.ctype == "list":
+                separator = "\n"
+            elif child.ctype == "tablerow":
+                separator = "\n"
+            elif not has_content:
+                separator = ""
+            else:
+                separator = "\n\n"
+
+            parts.append(separator)
+            parts.append(rendered_child)
+            has_content = True
+            child = child.next
+
+        return "".join(parts)
 
-            mixed_list = [current_content]
+    def _render_markdown(self, **kwargs) -> str:
+        import textwrap
+
+        # Keep track of header to correctly render the header tag
+        if self.ctype == "header":
+            kwargs["header_level"] = kwargs.get("header_level", 0) + 1
+
+        if self.text:
+            # It means the chunk is pre-rendered, and don't need to render again
+            current = self.text
+        else:
+            current = self._markdown_current(kwargs)
+            parts = [current]
+            has_content = bool(current)
             child = self.child
             while child:
-                child_content: list = child.render(format=format, **kwargs)
-                if child.ctype == CType.Inline:
+                # Don't strip left whitespace because of list indentation
+                rendered_child = (
+                    child.render(format="markdown", **kwargs).rstrip().lstrip("\n")
+                )
+                rendered_child = textwrap.dedent(rendered_child)
+                if not rendered_child:
+                    child = child.next
+                    continue
+                if child.ctype == "inline":
                     separator = " "
-                elif child.ctype == CType.List:
+                elif child.ctype == "list":
+                    rendered_child = textwrap.indent(rendered_child, "  ")
                     separator = "\n"
-                elif not current_content:
+                elif child.ctype == "tablerow":
+                    separator = "\n"
+                elif not has_content:
                     separator = ""
                 else:
                     separator = "\n\n"
 
-                mixed_list.append(separator)
-                mixed_list.extend(child_content)
+                parts.append(separator)
+                parts.append(rendered_child)
+                has_content = True
                 child = child.next
 
-            if not mixed_list:
-                return []
+            current = "".join(parts)
 
-            # Collapse consecutive strings into one
-            result = []
-            current_strings = []
-            for item in mixed_list:
-                if isinstance(item, str):
-                    current_strings.append(item)
-                else:
-                    if current_strings:
-                        result.append("".join(current_strings))
-                        current_strings = []
-                    result.append(item)
+        if self.ctype == CType.Code:
+            # Add code block
+            current = current.strip()
+            if current:
+                current = f"```\n{current}\n```"
+
+        return current
+
+    def _markdown_current(self, kwargs: dict) -> str:
+        """Markdown of the chunk itself, without its children"""
+        current = self.content if isinstance(self.content, str) else ""
+        if (
+            self.ctype == "header"
+            and kwargs.get("header_level", 0) > 0
+            and not current.startswith("#")
+        ):
+            current = f"{'#' * kwargs['header_level']} {current}"
+        return current
+
+    def _multi_current(self) -> str | dict:
+        """Multi-modal representation of the chunk itself, without its children"""
+        current_content = ""
+        if self.ctype != CType.Root and self.content is not None:
+            # if None, just ignore and go to child chunk
+            if isinstance(self.content, str):
+                current_content = self.content
+            elif isinstance(self.content, bytes):
+                current_content = {
+                    "mimetype": self.mimetype,
+                    "text": self.summary or self.text,
+                }
+                try:
+                    mime_manager = get_mime_manager()
+                    obj = mime_manager.to_python(self)
+                    if obj is None:
+                        raise ValueError("Cannot convert to python object")
+                    current_content["content"] = obj
+                    current_content["processed"] = True
+                except Exception as e:
+                    current_content["content"] = self.content
+                    current_content["processed"] = False
+                    logger.warning(
+                        f"Cannot convert content to python object: {e}\n"
+                        f"Mimetype: {self.mimetype}, Id: {self.id}"
+                    )
 
-            if current_strings:
-                result.append("".join(current_strings))
+        return current_content
 
-            return result
-        else:
-            raise NotImplementedError(
-                f"Render as `format={format}` is not yet supported"
-            )
+    def _render_multi(self, **kwargs) -> list[str | dict]:
+        current_content = self._multi_current()
+        mixed_list = [current_content]
+        child = self.child
+        while child:
+            child_content: list = child.render(format="multi", **kwargs)
+            if child.ctype == CType.Inline:
+                separator = " "
+            elif child.ctype == CType.List:
+                separator = "\n"
+            elif not current_content:
+                separator = ""
+            else:
+                separator = "\n\n"
+
+            mixed_list.append(separator)
+            mixed_list.extend(child_content)
+            child = child.next
+
+        if not mixed_list:
+            return []
+
+        # Collapse consecutive strings into one
+        result = []
+        current_strings = []
+        for item in mixed_list:
+            if isinstance(item, str):
+                current_strings.append(item)
+            else:
+                if current_strings:
+                    result.append("".join(current_strings))
+                    current_strings = []
+                result.append(item)
+
+        if current_strings:
+            result.append("".join(current_strings))
+
+        return result
+
+    def invalidate(self):
+        """Drop the cached renders and subtree sums of the chunk and its ancestors
+
+        Called automatically when the content, text or relations of the chunk are
+        modified. Call it manually after modifying the chunk in other ways that
+        affect rendering.
+        """
+        node = self
+        while node is not None and (node._render_cache or node._aggregates is not None):
+            # A chunk is only cached if its descendants are cached, so stop at the
+            # first ancestor without cache
+            node._render_cache = None
+            node._aggregates = None
+            if isinstance(node._parent, Chunk):
+                node = node._parent
+            elif isinstance(node._prev, Chunk):
+                # Sibling without parent link, reach the parent through the chain
+                node = node._prev
+            else:
+                node = None
 
     def asdict(self, relation_as_chunk: bool = False):
         """Return dictionary representation of the chunk
@@ -703,8 +1577,8 @@ class Chunk:
                 "next": self.next,
                 "prev": self.prev,
                 "origin": self.origin.asdict() if self.origin else None,
-                "metadata": self.metadata,
-                "history": self._history,
+                "metadata": self._metadata if self._metadata is not None else {},
+                "history": self._history if self._history is not None else [],
             }
 
         return {
@@ -718,10 +1592,80 @@ class Chunk:
             "next": self.next_id,
             "prev": self.prev_id,
             "origin": self.origin.asdict() if self.origin else None,
-            "metadata": self.metadata,
-            "history": self._history,
+            "metadata": self._metadata if self._metadata is not None else {},
+            "history": self._history if self._history is not None else [],
         }
 
+    def to_bytes(self, include_siblings: bool = False) -> bytes:
+        """Serialize the chunk and its descendants into a compact binary format
+
+        The tree is flattened in reading order, with the relations stored as integer
+        offsets and the bytes content in a separate blob section, see
+        `ChunkArena.to_bytes`. Relations to chunks outside of the serialized tree and
+        the store are not kept.
+
+        Args:
+            include_siblings: if True, also serialize the next siblings of the chunk
+        """
+        from chunking.arena import ChunkArena
+
+        return ChunkArena.from_chunk(
+            self, include_siblings=include_siblings, load_content=True, copy=False
+        ).to_bytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Chunk":
+        """Deserialize the output of `.to_bytes` into linked chunks
+
+        Returns:
+            the first serialized chunk
+        """
+        return _chunk_from_bytes(data)
+
+    def __reduce_ex__(self, protocol):
+        # Pickle the tree as a flat buffer, which avoids recursing through the
+        # relations (and hitting the recursion limit on long sibling chains). The
+        # chunks of a tree share the buffer, so the pickle memo writes it once
+        tree = _PICKLED_TREES.get(id(self))
+        if tree is None:
+            top = self
+            while True:
+                if isinstance(top._parent, Chunk):
+                    top = top._parent
+                elif isinstance(top._prev, Chunk):
+                    top = top._prev
+                else:
+                    break
+                tree = _PICKLED_TREES.get(id(top))
+                if tree is not None:
+                    break
+            if tree is None:
+                tree = _PickledTree(top, include_siblings=True)
+
+        idx = tree.index.get(id(self))
+        if idx is None:
+            # one-way relations (e.g. a clone), the parent doesn't link to the chunk
+            tree, idx = _PickledTree(self, include_siblings=False), 0
+
+        if tree.data is None:
+            # content that isn't bytes or JSON serializable
+            return super().__reduce_ex__(protocol)
+
+        return _chunk_from_tree, (tree, idx)
+
+    def __copy__(self):
+        # a shallow copy with the same id and relations, not the whole tree that
+        # `__reduce_ex__` pickles
+        copied = object.__new__(type(self))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if name != "__weakref__" and hasattr(self, name):
+                    setattr(copied, name, getattr(self, name))
+        if hasattr(self, "__dict__"):
+            copied.__dict__.update(self.__dict__)
+        copied._id = self.id
+        return copied
+
     def save(self, relations: bool = True):
         """Save the chunk into the directory
 
@@ -731,11 +1675,11 @@ class Chunk:
         """
         if self._store is None:
             raise ValueError("Must provide `store` to save the chunk")
-        self._store.save(self)
 
         if relations:
-            for _, child in self.walk():
-                self._store.save(child)
+            self._store.save_group(ChunkGroup([child for _, child in self.walk()]))
+        else:
+            self._store.save(self)
 
     def merge(self, chunk: "Chunk"):
         """Merge the content, metadata, and child of other chunk to this chunk
@@ -772,6 +1716,50 @@ class Chunk:
             self.child = their_child
             their_child.parent = self
 
+    def content_hash(self) -> str:
+        """Hash the content of the chunk
+
+        Returns:
+            str: hex digest of the content, identical content has identical digest
+        """
+        content = _raw_content(self)
+        if isinstance(content, str):
+            data = b"s" + content.encode("utf-8")
+        elif isinstance(content, (bytes, bytearray, memoryview)):
+            data = b"b" + bytes(content)
+        elif content is None:
+            data = b"n"
+        else:
+            data = b"o" + json.dumps(content, sort_keys=True, default=repr).encode()
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def assign_content_ids(self):
+        """Replace the ids of the descendants with content-addressed ids
+
+        The id of each descendant is derived from the id of this chunk, the position
+        of the descendant in the tree and its content, so parsing the same file again
+        gives the same ids. The id of this chunk is kept (root chunks are identified
+        by the hash of their file).
+
+        Call this before the chunks are saved to a store, as the saved relations
+        refer to the previous ids.
+        """
+        prefix = self.id + "/"
+        path: list[int] = []
+        for depth, node in self.traverse():
+            if depth == 0:
+                continue
+
+            # index of the node among its siblings, at each level
+            del path[depth:]
+            if len(path) == depth:
+                path[-1] += 1
+            else:
+                path.append(0)
+
+            key = prefix + "/".join(map(str, path)) + ":" + node.content_hash()
+            node.id = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
     def clean(self, unwrap_single_child: bool = True):
         """Clean the chunk tree recursivly
 
@@ -780,70 +1768,51 @@ class Chunk:
                 has a single child chunk, then the child chunk will replace the
                 parent chunk in the hierarchy
         """
-        child = self.child
-        while child:
-            child.clean(unwrap_single_child=unwrap_single_child)
-            child = child.next
+        if not unwrap_single_child:
+            return
 
-        if unwrap_single_child:
+        # Children are cleaned before their parent
+        for _, node in self.traverse(order="post"):
             # Assume the child content information if it is the single child, and
             # our content is empty
             if (
-                not self.content  # doesn't have content
-                and isinstance(self.child, Chunk)  # has child
-                and self.child.next is None  # has only one child
+                not node.content  # doesn't have content
+                and isinstance(node.child, Chunk)  # has child
+                and node.child.next is None  # has only one child
             ):
                 # Get mimetype, ctype and content
-                self.mimetype = self.child.mimetype
-                if self.child.ctype != CType.Inline:
-                    self.ctype = self.child.ctype
-                self.content = self.child.content
+                node.mimetype = node.child.mimetype
+                if node.child.ctype != CType.Inline:
+                    node.ctype = node.child.ctype
+                node.content = node.child.content
 
                 # Combine metadata
-                if self.metadata is not None:
-                    if self.child.metadata is not None:
-                        self.metadata.update(self.child.metadata)
+                if node.metadata is not None:
+                    if node.child.metadata is not None:
+                        node.metadata.update(node.child.metadata)
                 else:
-                    self.metadata = self.child.metadata
+                    node.metadata = node.child.metadata
 
                 # Remove child
-                self.child = self.child.child
+                node.child = node.child.child
 
     def apply(self, fn: Callable[["Chunk", int], None], depth: int = 0):
         """Apply a function to the chunk and all its children"""
-        fn(self, depth)
-        child = self.child
-        while child:
-            child.apply(fn, depth=depth + 1)
-            child = child.next
+        for d, node in self.traverse(depth=depth):
+            fn(node, d)
 
     def print_graph(
         self, ctype: str | None | list = None, include_siblings: bool = True
     ):
         """Print the chunk graph"""
-        if isinstance(ctype, str):
-            ctype = [ctype]
-
-        def print_node(node, depth=0):
-            if not ctype or node.ctype in ctype:
-                print("    " * depth, node)
-
-        self.apply(print_node)
-
-        if include_siblings:
-            sibling = self.next
-            while sibling:
-                sibling.print_graph(ctype=ctype, include_siblings=False)
-                sibling = sibling.next
+        for depth, node in self.traverse(
+            include_siblings=include_siblings, ctype=ctype or None
+        ):
+            print("    " * depth, node)
 
     def get_ids(self) -> list[str]:
         """Get all the ids of the chunk and its children"""
-        ids = [self.id]
-        child = self.child
-        while child:
-            ids.extend(child.get_ids())
-            child = child.next
-        return ids
+        return [node.id for _, node in self.traverse()]
 
     def find(
         self,
@@ -857,26 +1826,14 @@ class Chunk:
             id: the id of the chunk to find
             ctype: the ctype of the chunk to find
         """
-        if id is not None and self.id.startswith(id):
-            return self
-
-        if ctype is not None and self.ctype == ctype:
-            return self
+        if id is None and ctype is None:
+            return None
 
-        child = self.child
-        while child:
-            found = child.find(id=id, ctype=ctype)
-            if found:
-                return found
-            child = child.next
-
-        if include_siblings:
-            sibling = self.next
-            while sibling:
-                found = sibling.find(id=id, ctype=ctype, include_siblings=False)
-                if found:
-                    return found
-                sibling = sibling.next
+        for _, node in self.traverse(include_siblings=include_siblings):
+            if id is not None and node.id.startswith(id):
+                return node
+            if ctype is not None and node._ctype == ctype:
+                return node
 
         return None
 
@@ -888,44 +1845,98 @@ class Chunk:
         Args:
             ctype: the ctype of the chunk to find
         """
-        result = []
-        if ctype is not None and self.ctype == ctype:
-            result.append(self)
+        if ctype is None:
+            return []
 
-        child = self.child
-        while child:
-            result.extend(child.find_all(ctype=ctype, include_siblings=False))
-            child = child.next
-
-        if include_siblings:
-            sibling = self.next
-            while sibling:
-                result.extend(sibling.find_all(ctype=ctype, include_siblings=False))
-                sibling = sibling.next
+        return [
+            node
+            for _, node in self.traverse(include_siblings=include_siblings, ctype=ctype)
+        ]
 
-        return result
+    def clone(self, no_relation: bool = False, deep: bool = False, **kwargs) -> "Chunk":
+        """Create a copy, replace info with what supplied inside **kwargs
 
-    def clone(self, no_relation: bool = False, **kwargs) -> "Chunk":
-        """Create a deepcopy, replace infor with what supplied inside **kwargs"""
+        The copy is cheap: the content is shared, and the metadata and history are
+        only copied when either chunk accesses them (copy-on-write). The parent,
+        child, next and prev of the copy are the same chunks as the original.
 
-        d = self.asdict(relation_as_chunk=True)
+        Args:
+            no_relation: if True, the copy doesn't have parent, next and prev, and
+                doesn't have child unless `deep` is True
+            deep: if True, also clone the descendants, and link them to the copy
+            **kwargs: the fields to replace in the copy, e.g. `text`, `next`
+        """
         for key in kwargs.keys():
-            if key not in d:
+            if key not in _CLONE_FIELDS:
                 raise ValueError(f"Invalid key: {key}")
 
-        if no_relation:
-            d.pop("parent")
-            d.pop("child")
-            d.pop("next")
-            d.pop("prev")
+        if not deep:
+            ch = self._copy()
+            if not no_relation:
+                ch._parent, ch._child = self._parent, self._child
+                ch._next, ch._prev = self._next, self._prev
+        else:
+            # path[d] is the copy of the last visited chunk at depth d
+            path: list[Chunk] = []
+            for depth, node in self.traverse():
+                node_copy = node._copy()
+                if depth == 0:
+                    ch = node_copy
+                    if not no_relation:
+                        ch._parent, ch._next, ch._prev = (
+                            self._parent,
+                            self._next,
+                            self._prev,
+                        )
+                else:
+                    parent_copy = path[depth - 1]
+                    node_copy._parent = parent_copy
+                    if len(path) > depth:
+                        node_copy._prev = path[depth]
+                        path[depth]._next = node_copy
+                    else:
+                        parent_copy._child = node_copy
+                    del path[depth:]
+                path.append(node_copy)
+
+        for key, value in kwargs.items():
+            if key == "origin" and isinstance(value, dict):
+                value = Origin(**value)
+            setattr(ch, key, value)
 
-        d.pop("id")
-        d = deepcopy(d)
-        d.update(kwargs)
-        ch = Chunk(**d)
+        return ch
+
+    def _copy(self) -> "Chunk":
+        """Copy the chunk fields, without relations"""
+        content = self._content
+        if content is None and self._store is not None:
+            # the copy has a different id, so it can't load the content itself
+            content = self.content
+        elif content is not None and not isinstance(content, (str, bytes)):
+            content = deepcopy(content)
+
+        ch = Chunk(
+            mimetype=self._mimetype,
+            ctype=self._ctype,
+            content=content,
+            text=self._text,
+            summary=self._summary,
+        )
+        if self.origin is not None:
+            ch.origin = Origin(
+                source_id=self.origin.source_id,
+                location=_copy_value(self.origin.location),
+                protocol=self.origin.protocol,
+                metadata=_copy_value(self.origin.metadata),
+            )
 
-        if self.store:
-            ch.store = self.store
+        # share the metadata and history until either chunk accesses them
+        if self._metadata is not None or self._history is not None:
+            ch._metadata, ch._history = self._metadata, self._history
+            ch._shared = self._shared = True
+
+        if self._store is not None:
+            ch._store = self._store
 
         return ch
 
@@ -1000,12 +2011,60 @@ class Chunk:
             )
 
 
+class _GroupChunks(list):
+    """The chunks of one root in a `ChunkGroup`
+
+    Changes to the list reset the index of the owning group.
+    """
+
+    __slots__ = ("_group",)
+
+    def __init__(self, chunks: Iterable = (), group: "ChunkGroup | None" = None):
+        super().__init__(chunks)
+        self._group = group
+
+
+def _resets_index(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        # unpickling appends the chunks before `_group` is set
+        group = getattr(self, "_group", None)
+        if group is not None:
+            group._index = None
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in (
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+):
+    setattr(_GroupChunks, _name, _resets_index(_name))
+
+
 class ChunkGroup:
-    """An interface for a group of related chunk"""
+    """An interface for a group of related chunk
+
+    Chunks are grouped by root. Indexing, slicing and `len` go through a prefix sum
+    of the group sizes, which is rebuilt lazily after the groups change.
+    """
 
     def __init__(self, chunks: list | None = None, root: Chunk | None = None):
         self._roots: dict[str, Chunk] = {}
-        self._chunks: dict[str | None, list] = {}
+        self._chunks: dict[str | None, _GroupChunks] = {}
+        self._index: tuple[list[_GroupChunks], list[int], int] | None = None
 
         self._root_id = None
         if root is not None:
@@ -1013,7 +2072,7 @@ class ChunkGroup:
             self._root_id = root.id
 
         if chunks is not None or self._root_id is not None:
-            self._chunks[self._root_id] = chunks or []
+            self._group_chunks(self._root_id).extend(chunks or [])
 
         self._store: "BaseStore | None" = None
 
@@ -1022,27 +2081,78 @@ class ChunkGroup:
         return self._store
 
     @property
-    def groups(self):
-        return self._chunks
+    def groups(self) -> MappingProxyType:
+        """Read-only mapping of root id to the list of chunks of that root"""
+        return MappingProxyType(self._chunks)
+
+    def _group_chunks(self, root_id: str | None) -> _GroupChunks:
+        """Get the chunks of `root_id`, create the group if it doesn't exist"""
+        if root_id not in self._chunks:
+            self._chunks[root_id] = _GroupChunks(group=self)
+            self._index = None
+        return self._chunks[root_id]
+
+    def _get_index(self) -> tuple[list[_GroupChunks], list[int], int]:
+        """Return the groups, the offset of each group, and the total chunk count"""
+        if self._index is None:
+            groups, offsets, total = [], [], 0
+            for chunks in self._chunks.values():
+                groups.append(chunks)
+                offsets.append(total)
+                total += len(chunks)
+            self._index = (groups, offsets, total)
+        return self._index
 
     def __bool__(self):
         return bool(len(self))
 
+    @overload
+    def __getitem__(self, idx: int) -> Chunk: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> "ChunkGroup": ...
+
     def __getitem__(self, idx):
-        for chunks in self._chunks.values():
-            if idx < len(chunks):
-                return chunks[idx]
-            idx -= len(chunks)
+        if isinstance(idx, slice):
+            return self._slice(idx)
+
+        groups, offsets, total = self._get_index()
+        if idx < 0:
+            idx += total
+        if not 0 <= idx < total:
+            raise IndexError("Index out of range")
+
+        group_idx = bisect_right(offsets, idx) - 1
+        return groups[group_idx][idx - offsets[group_idx]]
+
+    def _slice(self, idx: slice) -> "ChunkGroup":
+        """Slice the chunks into a new ChunkGroup, keeping their roots"""
+        groups, offsets, total = self._get_index()
+        start, stop, step = idx.indices(total)
+        roots = [self._roots.get(root_id) for root_id in self._chunks]
+
+        output = ChunkGroup()
+        output._store = self._store
+        if step == 1:
+            for root, chunks, offset in zip(roots, groups, offsets):
+                lo, hi = max(start - offset, 0), min(stop - offset, len(chunks))
+                if lo < hi:
+                    output._add_chunks(root, chunks[lo:hi])
+        else:
+            for i in range(start, stop, step):
+                group_idx = bisect_right(offsets, i) - 1
+                output._add_chunks(
+                    roots[group_idx], [groups[group_idx][i - offsets[group_idx]]]
+                )
 
-        raise IndexError("Index out of range")
+        return output
 
     def __iter__(self):
         for chunks in self._chunks.values():
             yield from chunks
 
     def __len__(self):
-        count = sum(len(chunks) for chunks in self._chunks.values())
-        return count
+        return self._get_index()[2]
 
     def append(self, chunk: Chunk):
         if len(self._chunks) > 1:
@@ -1052,7 +2162,7 @@ class ChunkGroup:
                 "`.groups[root_id_str].append(chunk)`"
             )
         elif len(self._chunks) == 0:
-            self._chunks[self._root_id] = []
+            self._group_chunks(self._root_id)
 
         if self._root_id not in self._chunks:
             self._root_id = list(self._chunks.keys())[0]
@@ -1067,7 +2177,7 @@ class ChunkGroup:
                 "`.groups[root_id_str].extend(chunks)`"
             )
         elif len(self._chunks) == 0:
-            self._chunks[self._root_id] = []
+            self._group_chunks(self._root_id)
 
         if self._root_id not in self._chunks:
             self._root_id = list(self._chunks.keys())[0]
@@ -1082,18 +2192,19 @@ class ChunkGroup:
                 root_node = self._roots[root_id]
                 yield root_node, chunks
 
+    def _add_chunks(self, root: Chunk | None, chunks: list[Chunk]):
+        if isinstance(root, Chunk):
+            self._roots[root.id] = root
+            root_id = root.id
+        else:
+            root_id = None
+
+        self._group_chunks(root_id).extend(chunks)
+
     def add_group(self, group: "ChunkGroup"):
         """Add another ChunkGroup to the current chunk group"""
         for root, chunks in group.iter_groups():
-            if isinstance(root, Chunk):
-                self._roots[root.id] = root
-                root_id = root.id
-            else:
-                root_id = None
-
-            if root_id not in self._chunks:
-                self._chunks[root_id] = []
-            self._chunks[root_id].extend(chunks)
+            self._add_chunks(root, chunks)
 
     def attach_store(self, store):
         self._store = store
@@ -1102,9 +2213,146 @@ class ChunkGroup:
                 chunk.store = store
 
 
+class LazyChunkGroup(ChunkGroup):
+    """A chunk group that pulls its chunks from an iterable on demand
+
+    Chunks are pulled when the group is iterated or indexed, so that operations can
+    stream over inputs that don't fit in memory. `len`, negative indices and
+    `.iter_groups` pull every remaining chunk.
+
+    Args:
+        source: iterable of chunks, or of chunk ids to load from `store`
+        root: the root of the pulled chunks
+        store: the store to load the chunks from, and to attach to the chunks
+        cache: if True, keep the pulled chunks so the group can be iterated and
+            indexed again. If False, the chunks are dropped once iterated, and the
+            group can only be iterated once.
+    """
+
+    def __init__(
+        self,
+        source: Iterable["Chunk | str"],
+        root: Chunk | None = None,
+        store: "BaseStore | None" = None,
+        cache: bool = True,
+    ):
+        super().__init__(chunks=[], root=root)
+        self._source = iter(source)
+        self._store = store
+        self._cache = cache
+
+    def __getstate__(self):
+        # the source can be a generator, which can't be pickled: the chunks left
+        # are pulled into a list, which the group and its copy both iterate
+        if self._source is not None:
+            self._source = iter(list(self._source))
+        return self.__dict__
+
+    @property
+    def cache(self) -> bool:
+        return self._cache
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether all the chunks have been pulled from the source"""
+        return self._source is None
+
+    def _pull(self) -> Chunk | None:
+        """Pull the next chunk from the source, None if the source is exhausted"""
+        if self._source is None:
+            return None
+
+        try:
+            item = next(self._source)
+        except StopIteration:
+            self._source = None
+            return None
+
+        if isinstance(item, str):
+            if self._store is None:
+                raise ValueError("Must provide `store` to load chunks by id")
+            return self._store.get(item)
+
+        if self._store is not None:
+            item.store = self._store
+        return item
+
+    def _fill(self, count: int | None = None):
+        """Pull chunks until `count` chunks are materialized, or the source ends"""
+        pulled = self._chunks[self._root_id]
+        while count is None or ChunkGroup.__len__(self) < count:
+            chunk = self._pull()
+            if chunk is None:
+                break
+            pulled.append(chunk)
+
+    def __bool__(self):
+        if not ChunkGroup.__len__(self):
+            self._fill(1)
+        return bool(ChunkGroup.__len__(self))
+
+    def __getitem__(self, idx):
+        if not self._cache:
+            raise TypeError("Cannot index a LazyChunkGroup with cache=False")
+
+        if isinstance(idx, slice) or idx < 0:
+            self._fill()
+        else:
+            self._fill(idx + 1)
+        return super().__getitem__(idx)
+
+    def __iter__(self):
+        for root_id, chunks in list(self._chunks.items()):
+            if root_id != self._root_id:
+                yield from chunks
+                continue
+
+            idx = 0
+            while True:
+                if idx < len(chunks):
+                    if self._cache:
+                        yield chunks[idx]
+                        idx += 1
+                    else:
+                        yield chunks.pop(0)
+                    continue
+
+                chunk = self._pull()
+                if chunk is None:
+                    break
+                if self._cache:
+                    chunks.append(chunk)
+                else:
+                    yield chunk
+
+    def __len__(self):
+        if not self._cache:
+            raise TypeError(
+                "Cannot take the length of a LazyChunkGroup with cache=False"
+            )
+
+        self._fill()
+        return super().__len__()
+
+    def iter_groups(self):
+        self._fill()
+        yield from super().iter_groups()
+
+
 class BaseStore:
     """Base class for organizing and persisting chunk"""
 
+    # whether the chunks keep the content fetched from the store, if False, the
+    # content is fetched again on each access
+    keep_content: bool = True
+
+    # when a relation of a stored chunk is loaded, also load the descendants of the
+    # related chunk down to `prefetch_depth` levels, and up to `prefetch_breadth`
+    # next siblings at each level (None for all), with one `get_many` per round.
+    # Both 0 disables the prefetching
+    prefetch_depth: int = 0
+    prefetch_breadth: int | None = 0
+
     def __contains__(self, id: str) -> bool:
         """Check if the chunk exists in the store"""
         raise NotImplementedError
@@ -1113,10 +2361,69 @@ class BaseStore:
         """Get the chunk by id"""
         raise NotImplementedError
 
+    def get_many(self, ids: Iterable[str]) -> list[Chunk]:
+        """Get the chunks by ids, missing ids are skipped"""
+        return [self.get(id) for id in ids if id in self]
+
     def fetch_content(self, chunk: Chunk):
         """Fetch the content of the chunk"""
         raise NotImplementedError
 
+    def load_relation(self, id: str) -> Chunk:
+        """Load the parent, child, next or prev chunk of a stored chunk
+
+        With prefetching, the nearby chunks are loaded in bulk and linked to each
+        other as objects, so navigating them doesn't go through the store again.
+        """
+        if not self.prefetch_depth and self.prefetch_breadth == 0:
+            return self.get(id)
+        return self.prefetch(id, self.prefetch_depth, self.prefetch_breadth)[id]
+
+    def prefetch(
+        self, id: str, depth: int = 1, breadth: int | None = None
+    ) -> dict[str, Chunk]:
+        """Load a chunk with its descendants and next siblings in bulk
+
+        Args:
+            id: the id of the chunk
+            depth: the number of levels of descendants to load
+            breadth: the number of next siblings of the chunk, and of the first
+                child at each level, to load. None to load all the siblings
+
+        Returns:
+            the loaded chunks by id, linked to each other
+        """
+        if breadth is None:
+            breadth = sys.maxsize
+        loaded: dict[str, Chunk] = {}
+        # id -> (remaining depth, remaining next siblings)
+        pending = {id: (depth, breadth)}
+        while pending:
+            budgets, pending = pending, {}
+            for chunk in self.get_many(list(budgets)):
+                loaded[chunk.id] = chunk
+                chunk_depth, chunk_breadth = budgets[chunk.id]
+                child_id, next_id = chunk.child_id, chunk.next_id
+                if chunk_depth > 0 and child_id is not None and child_id not in loaded:
+                    pending[child_id] = (chunk_depth - 1, breadth)
+                if chunk_breadth > 0 and next_id is not None and next_id not in loaded:
+                    pending[next_id] = (chunk_depth, chunk_breadth - 1)
+
+        if id not in loaded:
+            raise KeyError(id)
+
+        self._link(loaded)
+        return loaded
+
+    @staticmethod
+    def _link(loaded: dict[str, Chunk]):
+        """Replace the relations given as ids by the loaded chunks"""
+        for chunk in loaded.values():
+            for attr in ("_parent", "_child", "_next", "_prev"):
+                related = getattr(chunk, attr)
+                if isinstance(related, str) and related in loaded:
+                    setattr(chunk, attr, loaded[related])
+
     def save(self, chunk: Chunk):
         """Save the chunk to the store"""
         raise NotImplementedError
@@ -1129,10 +2436,214 @@ class BaseStore:
             for chunk in chunks:
                 self.save(chunk)
 
-    def delete(self, chunk: Chunk):
-        """Delete the chunk from the store"""
+    def ids(self) -> Iterable[str]:
+        """Iterate the ids of all the stored chunks"""
         raise NotImplementedError
 
+    def delete_many(self, ids: Iterable[str]):
+        """Remove the chunks by ids, without updating the relations of the other
+        chunks. Missing ids are skipped"""
+        raise NotImplementedError
+
+    def delete(self, chunk: Chunk, recursive: bool = False):
+        """Delete the chunk from the store
+
+        The previous and next siblings of the chunk are linked to each other, and
+        the parent links to the next sibling if the chunk was its first child.
+
+        Args:
+            chunk: the chunk to delete
+            recursive: delete the descendants of the chunk as well, otherwise they
+                are left unreachable until `gc(sweep=True)` is called
+        """
+        if chunk.id not in self:
+            return
+        stored = self.get(chunk.id)
+        ids = [stored.id]
+        if recursive:
+            ids.extend(self._descendant_ids(stored))
+
+        relinked = self._unlink(stored)
+        self.delete_many(ids)
+        for neighbour in relinked:
+            self.save(neighbour)
+
+    def _unlink(self, chunk: Chunk) -> list[Chunk]:
+        """Link the siblings and parent of the stored chunk around it
+
+        Returns:
+            the neighbours whose relations changed
+        """
+        neighbours = {
+            neighbour.id: neighbour
+            for neighbour in self.get_many(
+                [
+                    id
+                    for id in (chunk.parent_id, chunk.prev_id, chunk.next_id)
+                    if id is not None
+                ]
+            )
+        }
+        parent = neighbours.get(chunk.parent_id)
+        prev = neighbours.get(chunk.prev_id)
+        next_ = neighbours.get(chunk.next_id)
+
+        relinked = []
+        if prev is not None and prev.next_id == chunk.id:
+            prev.next = next_
+            relinked.append(prev)
+        if next_ is not None and next_.prev_id == chunk.id:
+            next_.prev = prev
+            relinked.append(next_)
+        if parent is not None and parent.child_id == chunk.id:
+            parent.child = next_
+            relinked.append(parent)
+        return relinked
+
+    def _descendant_ids(self, chunk: Chunk) -> list[str]:
+        """The ids of the stored descendants of the chunk, loaded level by level"""
+        ids, seen = [], {chunk.id}
+        frontier = [chunk.child_id] if chunk.child_id else []
+        while frontier:
+            frontier_ids, frontier = frontier, []
+            for node in self.get_many(frontier_ids):
+                if node.id in seen:
+                    continue
+                seen.add(node.id)
+                ids.append(node.id)
+                frontier.extend(
+                    id
+                    for id in (node.child_id, node.next_id)
+                    if id is not None and id not in seen
+                )
+        return ids
+
+    def _relations(self) -> Iterable[tuple[str, str | None, str | None, str | None]]:
+        """Iterate the id, parent id, child id and next id of all the stored
+        chunks"""
+        ids = list(self.ids())
+        for start in range(0, len(ids), 1000):
+            for chunk in self.get_many(ids[start : start + 1000]):
+                yield chunk.id, chunk.parent_id, chunk.child_id, chunk.next_id
+
+    def query(
+        self,
+        root_id: str | None = None,
+        ctype: str | None = None,
+        page: Any = None,
+        **metadata,
+    ) -> LazyChunkGroup:
+        """Find the stored chunks that match all the filters
+
+        Stores with indexes answer from them, other stores scan their chunks.
+
+        Args:
+            root_id: only the chunks of the tree of this root, the root included
+            ctype: only the chunks of this ctype
+            page: only the chunks of this page, see `Chunk.page`
+            **metadata: only the chunks whose metadata have these values
+
+        Returns:
+            the matching chunks, loaded on demand
+        """
+        return LazyChunkGroup(self._query(root_id, ctype, page, metadata), store=self)
+
+    @staticmethod
+    def _matches(chunk: Chunk, ctype: str | None, page: Any, metadata: dict) -> bool:
+        if ctype is not None and chunk.ctype != ctype:
+            return False
+        if page is not None and chunk.page != page:
+            return False
+        if metadata:
+            chunk_metadata = chunk._metadata or {}
+            return all(
+                key in chunk_metadata and chunk_metadata[key] == value
+                for key, value in metadata.items()
+            )
+        return True
+
+    def _iter_many(self, ids: list[str], batch_size: int = 500) -> Iterable[Chunk]:
+        """Load the chunks of `ids` with one `get_many` per batch"""
+        for start in range(0, len(ids), batch_size):
+            yield from self.get_many(ids[start : start + batch_size])
+
+    def _query(
+        self, root_id: str | None, ctype: str | None, page: Any, metadata: dict
+    ) -> Iterable[Chunk | str]:
+        """The matching chunks or ids, scanning the stored chunks"""
+        if root_id is not None:
+            if root_id not in self:
+                return
+            ids = [root_id, *self._descendant_ids(self.get(root_id))]
+        else:
+            ids = list(self.ids())
+
+        for chunk in self._iter_many(ids):
+            if self._matches(chunk, ctype, page, metadata):
+                yield chunk
+
+    def gc(self, roots: Iterable[str] = (), sweep: bool = False) -> list[str]:
+        """Remove the chunks that can't be reached from a root
+
+        Roots are the chunks without parent, the chunks whose parent isn't stored
+        (e.g. a subtree saved without its parent), and the chunks of `roots`. A
+        chunk is reachable if it can be reached from a root by following the child
+        and next relations.
+
+        Args:
+            roots: ids of other chunks to keep with their descendants and next
+                siblings
+            sweep: if True, the chunks whose parent isn't stored aren't roots, so
+                that the descendants left by a non-recursive `delete` are removed.
+                A subtree saved without its parent is then only kept if its first
+                chunk is in `roots`
+
+        Returns:
+            the ids of the removed chunks
+        """
+        relations = {
+            id: (parent, child, next_) for id, parent, child, next_ in self._relations()
+        }
+        stack = [
+            id
+            for id, (parent, _, _) in relations.items()
+            if parent is None or (not sweep and parent not in relations)
+        ]
+        stack.extend(id for id in set(roots) if id in relations)
+        reachable = set(stack)
+        while stack:
+            _, child, next_ = relations[stack.pop()]
+            for id in (child, next_):
+                if id is not None and id in relations and id not in reachable:
+                    reachable.add(id)
+                    stack.append(id)
+
+        unreachable = [id for id in relations if id not in reachable]
+        if unreachable:
+            self.delete_many(unreachable)
+        return unreachable
+
+    def apply_diff(self, diff: "TreeDiff"):
+        """Update a stored chunk tree to its new version
+
+        The matched chunks of the new tree take the ids of the stored chunks, then
+        only the inserted, modified, moved and relinked chunks are saved, and the
+        deleted chunks are removed.
+
+        Args:
+            diff: the output of `chunking.diff.diff(stored_root, new_root)`
+        """
+        diff.adopt_ids()
+        # the relations of the remaining chunks are saved below
+        self.delete_many([chunk.id for chunk in diff.deleted])
+
+        saved = set()
+        for chunk in diff.inserted + diff.modified + diff.moved + diff.relinked:
+            if chunk.id not in saved:
+                saved.add(chunk.id)
+                chunk.store = self
+                self.save(chunk)
+
 
 class BaseOperation:
     """Almost all operations on Chunk should eventually subclass from this. This class
@@ -1,11 +1,11 @@
-import hashlib
 import logging
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Generator
 
 from chunking.base import BaseOperation, Chunk, CType, Origin
-from chunking.mime import MimeType, guess_mimetype
+from chunking.mime import MimeType, guess_mimetype, guess_mimetypes
+from chunking.util.hashing import HashCache, hash_file
 
 logger = logging.getLogger(__name__)
 
@@ -16,13 +16,26 @@ class Controller:
     Functions:
         - Lazily load all the possible parsers
         - Iterate over the parsers
+
+    Args:
+        extras: a dictionary mapping mimetype to list of parsers
+        callbacks: a list of callback functions, returning the parser of a path
+        hash_algorithm: the algorithm of the file hash used as root chunk id
+        hash_cache: reuse the hash of the files that didn't change, defaults to an
+            in-memory cache. Pass `HashCache(path)` to keep it across runs
     """
 
     def __init__(
-        self, extras: dict[str, list] | None = None, callbacks: list | None = None
+        self,
+        extras: dict[str, list] | None = None,
+        callbacks: list | None = None,
+        hash_algorithm: str = "sha256",
+        hash_cache: HashCache | None = None,
     ):
         self._extras = extras or {}
         self._callbacks = callbacks or []
+        self.hash_algorithm = hash_algorithm
+        self.hash_cache = hash_cache if hash_cache is not None else HashCache()
         self._parsers: dict[str, list] = self._load_parsers()
 
         self._temp_extras = []
@@ -131,7 +144,7 @@ class Controller:
             logger.warning(message)
 
     def guess_mimetype(self, path, default: str = "application/octet-stream") -> str:
-        """Guess mimetype based on file path, prioritize magika > magic > mimetypes.
+        """Guess mimetype based on file path, see `chunking.mime.guess_mimetypes`.
 
         Args:
             path: the path to the file
@@ -142,6 +155,20 @@ class Controller:
         """
         return guess_mimetype(path, default)
 
+    def guess_mimetypes(
+        self, paths: list, default: str = "application/octet-stream"
+    ) -> list[str]:
+        """Guess the mimetypes of many files at once, e.g. the files of a directory
+
+        Args:
+            paths: the paths to the files
+            default: the mimetype to return if the mimetype cannot be guessed
+
+        Returns:
+            The mimetypes of the files, in the same order.
+        """
+        return guess_mimetypes(paths, default)
+
     def as_root_chunk(self, path: str | Path, mimetype: str | None = None) -> Chunk:
         """Convert a file or directory to a chunk."""
         path_str = str(path)
@@ -153,8 +180,9 @@ class Controller:
             if mimetype is None:
                 mimetype = self.guess_mimetype(path)
 
-            with open(path, "rb") as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
+            file_hash = hash_file(
+                path, algorithm=self.hash_algorithm, cache=self.hash_cache
+            )
 
             chunk = Chunk(
                 ctype=CType.Root,
@@ -0,0 +1,243 @@
+"""Diff two versions of a chunk tree
+
+When a document is edited and parsed again, `diff` matches the chunks of the new
+tree to the chunks of the old tree, so that only the changed chunks have to be
+re-chunked, re-saved and re-embedded (see `BaseStore.apply_diff`).
+"""
+
+import hashlib
+import json
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+from chunking.base import Chunk
+
+
+@dataclass
+class TreeDiff:
+    """Difference between an old and a new version of a chunk tree
+
+    Attributes:
+        inserted: chunks of the new tree that don't exist in the old tree
+        deleted: chunks of the old tree that don't exist in the new tree
+        moved: matched chunks of the new tree that changed parent or order
+        modified: matched chunks of the new tree whose content, text, summary or
+            metadata changed
+        relinked: matched chunks of the new tree whose relations point to different
+            chunks, which must be saved again for the stored relations to be valid
+        matches: pairs of (old chunk, new chunk) that represent the same chunk
+    """
+
+    inserted: list[Chunk] = field(default_factory=list)
+    deleted: list[Chunk] = field(default_factory=list)
+    moved: list[Chunk] = field(default_factory=list)
+    modified: list[Chunk] = field(default_factory=list)
+    relinked: list[Chunk] = field(default_factory=list)
+    matches: list[tuple[Chunk, Chunk]] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.inserted or self.deleted or self.moved or self.modified)
+
+    @property
+    def changed(self) -> list[Chunk]:
+        """Chunks of the new tree whose content has to be processed again"""
+        return self.inserted + self.modified
+
+    def adopt_ids(self):
+        """Give the matched chunks of the new tree the id of their old chunk
+
+        The history of the old chunk is kept when the new chunk has none.
+        """
+        for old, new in self.matches:
+            new.id = old.id
+            if old._history and not new._history:
+                new.history = list(old._history)
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.blake2b("\0".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class _Tree:
+    """The structure and hashes of a chunk tree
+
+    The structure is read once from the traversal, as relations loaded from a store
+    are new objects on every access.
+    """
+
+    def __init__(self, root: Chunk):
+        self.nodes: list[Chunk] = []
+        self.parent: dict[Chunk, Chunk | None] = {root: None}
+        self.children: dict[Chunk, list[Chunk]] = {}
+        self.positions: dict[Chunk, int] = {root: 0}
+        ancestors: list[Chunk] = []
+        for depth, node in root.traverse():
+            self.nodes.append(node)
+            self.children[node] = []
+            del ancestors[depth:]
+            if ancestors:
+                siblings = self.children[ancestors[-1]]
+                self.parent[node] = ancestors[-1]
+                self.positions[node] = len(siblings)
+                siblings.append(node)
+            ancestors.append(node)
+
+        self.own: dict[Chunk, str] = {}
+        self.subtree: dict[Chunk, str] = {}
+        for node in reversed(self.nodes):
+            self.own[node] = _digest(
+                str(node.ctype), str(node.mimetype), node.content_hash()
+            )
+            self.subtree[node] = _digest(
+                self.own[node], *(self.subtree[ch] for ch in self.children[node])
+            )
+
+    def position(self, node: Chunk) -> int:
+        """Index of the chunk among the children of its parent"""
+        return self.positions[node]
+
+
+def _in_order(positions: list[int]) -> set[int]:
+    """Indices of a longest increasing subsequence of `positions`"""
+    tails: list[int] = []  # index of the smallest tail of each subsequence length
+    tail_positions: list[int] = []
+    prev: list[int] = []
+    for idx, position in enumerate(positions):
+        length = bisect_left(tail_positions, position)
+        prev.append(tails[length - 1] if length else -1)
+        if length == len(tails):
+            tails.append(idx)
+            tail_positions.append(position)
+        else:
+            tails[length] = idx
+            tail_positions[length] = position
+
+    result = set()
+    idx = tails[-1] if tails else -1
+    while idx != -1:
+        result.add(idx)
+        idx = prev[idx]
+    return result
+
+
+def _fields(chunk: Chunk) -> tuple:
+    return (
+        chunk.content_hash(),
+        chunk.text,
+        chunk.summary,
+        json.dumps(chunk._metadata or {}, sort_keys=True, default=repr),
+    )
+
+
+def diff(old_root: Chunk, new_root: Chunk) -> TreeDiff:
+    """Match the chunks of two versions of a chunk tree
+
+    Identical subtrees are matched by hash first, preferring the subtree under the
+    matched parent. The remaining chunks are matched by their own content, then by
+    their position among the children of their matched parent.
+
+    Args:
+        old_root: the previous version of the tree
+        new_root: the new version of the tree
+
+    Returns:
+        TreeDiff: the inserted, deleted, moved and modified chunks
+    """
+    old_tree, new_tree = _Tree(old_root), _Tree(new_root)
+
+    by_subtree: dict[str, list[Chunk]] = {}
+    by_own: dict[str, list[Chunk]] = {}
+    for node in old_tree.nodes:
+        by_subtree.setdefault(old_tree.subtree[node], []).append(node)
+        by_own.setdefault(old_tree.own[node], []).append(node)
+
+    new_to_old: dict[Chunk, Chunk] = {new_root: old_root}
+    old_to_new: dict[Chunk, Chunk] = {old_root: new_root}
+
+    def pick(candidates: list[Chunk], new: Chunk) -> Chunk | None:
+        expected_parent = new_to_old.get(new_tree.parent[new])
+        found = None
+        for old in candidates:
+            if old in old_to_new:
+                continue
+            if old_tree.parent[old] is expected_parent:
+                return old
+            if found is None:
+                found = old
+        return found
+
+    # identical subtrees
+    for new in new_tree.nodes:
+        if new in new_to_old:
+            continue
+        old = pick(by_subtree.get(new_tree.subtree[new], []), new)
+        if old is None:
+            continue
+
+        # same hash, so same shape
+        stack = [(old, new)]
+        while stack:
+            o, n = stack.pop()
+            new_to_old[n], old_to_new[o] = o, n
+            stack.extend(zip(old_tree.children[o], new_tree.children[n]))
+
+    # same content, or same position under the matched parent
+    for new in new_tree.nodes:
+        if new in new_to_old:
+            continue
+
+        old = pick(by_own.get(new_tree.own[new], []), new)
+        if old is None and new_tree.parent[new] in new_to_old:
+            old_siblings = old_tree.children[new_to_old[new_tree.parent[new]]]
+            position = new_tree.position(new)
+            if position < len(old_siblings):
+                old = old_siblings[position]
+                if old in old_to_new or old.ctype != new.ctype:
+                    old = None
+
+        if old is not None:
+            new_to_old[new], old_to_new[old] = old, new
+
+    def old_id(new: Chunk | None) -> str | None:
+        if new is None:
+            return None
+        return new_to_old[new].id if new in new_to_old else new.id
+
+    # chunks that kept their parent, but not their order among the siblings
+    reordered = set()
+    for parent, children in new_tree.children.items():
+        kept = [
+            child
+            for child in children
+            if child in new_to_old
+            and old_tree.parent[new_to_old[child]] is new_to_old.get(parent)
+        ]
+        in_order = _in_order([old_tree.position(new_to_old[ch]) for ch in kept])
+        reordered.update(ch for idx, ch in enumerate(kept) if idx not in in_order)
+
+    result = TreeDiff()
+    for new in new_tree.nodes:
+        if new not in new_to_old:
+            result.inserted.append(new)
+            continue
+
+        old = new_to_old[new]
+        result.matches.append((old, new))
+        if _fields(old) != _fields(new):
+            result.modified.append(new)
+
+        new_relations = (new._parent, new._child, new._next, new._prev)
+        new_ids = tuple(
+            old_id(rel) if isinstance(rel, Chunk) else rel for rel in new_relations
+        )
+        if new_ids != (old.parent_id, old.child_id, old.next_id, old.prev_id):
+            result.relinked.append(new)
+
+        if new is not new_root and (
+            new_to_old.get(new_tree.parent[new]) is not old_tree.parent[old]
+            or new in reordered
+        ):
+            result.moved.append(new)
+
+    result.deleted = [node for node in old_tree.nodes if node not in old_to_new]
+    return result
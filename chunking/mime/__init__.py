@@ -1,3 +1,17 @@
-from .base import MimeType, get_mime_manager, guess_mimetype, set_mime_manager
+from .base import (
+    MimeType,
+    clear_mimetype_cache,
+    get_mime_manager,
+    guess_mimetype,
+    guess_mimetypes,
+    set_mime_manager,
+)
 
-__all__ = ["MimeType", "guess_mimetype", "get_mime_manager", "set_mime_manager"]
+__all__ = [
+    "MimeType",
+    "clear_mimetype_cache",
+    "guess_mimetype",
+    "guess_mimetypes",
+    "get_mime_manager",
+    "set_mime_manager",
+]
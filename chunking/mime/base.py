@@ -1,6 +1,9 @@
 import io
 import mimetypes
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from stat import S_ISDIR
 
 try:
     from magika import Magika
@@ -22,7 +25,7 @@ else:
 
 
 def guess_mimetype(path, default: str = "application/octet-stream") -> str:
-    """Guess mimetype based on file path, prioritize magika > magic > mimetypes.
+    """Guess mimetype based on file path, see `guess_mimetypes`
 
     Args:
         path: the path to the file
@@ -31,32 +34,124 @@ def guess_mimetype(path, default: str = "application/octet-stream") -> str:
     Returns:
         The mimetype of the file.
     """
-    p = Path(path)
-    ext = p.suffix.lower()
-
-    if p.is_dir():
-        return MimeType.directory
-
-    if ext == ".ipynb":
-        # .ipynb is a JSON file that magic and magika usually mistake
-        return MimeType.ipynb
-    elif ext == ".rst":
-        # .rst is a text file that magic usually mistake
-        return MimeType.rst
-    elif ext == ".org":
-        # .org is usually mistaken as markdown and html...
-        return MimeType.org
+    return guess_mimetypes([path], default)[0]
 
-    if _m:
-        return _m.identify_path(path).output.mime_type
-    if magic:
-        return magic.from_file(path, mime=True)
 
-    guessed = _mimetypes_guess_file(path)[0]
-    if guessed:
-        return guessed
+def guess_mimetypes(paths, default: str = "application/octet-stream") -> list[str]:
+    """Guess the mimetypes of files, prioritize the unambiguous magic bytes and
+    extensions > magika > magic > mimetypes.
+
+    The magic bytes and extensions only need the first bytes of the file. The files
+    that they don't recognize are identified by magika in a single batch. The
+    results are cached until the size or modification time of the file change.
+
+    Args:
+        paths: the paths to the files
+        default: the mimetype to return if the mimetype cannot be guessed
 
-    return default
+    Returns:
+        The mimetypes of the files, in the same order.
+    """
+    results: list[str | None] = [None] * len(paths)
+    pending = []
+    for idx, path in enumerate(paths):
+        p = Path(path)
+        try:
+            stat = p.stat()
+        except OSError:
+            pending.append((idx, p, None))
+            continue
+        if S_ISDIR(stat.st_mode):
+            results[idx] = MimeType.directory
+            continue
+
+        key = (str(p.resolve()), stat.st_size, stat.st_mtime_ns)
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                results[idx] = _cache[key]
+                continue
+
+        mimetype = _guess_from_signature(p)
+        if mimetype is None:
+            pending.append((idx, p, key))
+        else:
+            results[idx] = mimetype
+            _cache_put(key, mimetype)
+
+    if pending:
+        fallback = _guess_fallback([p for _, p, _ in pending])
+        for (idx, _, key), mimetype in zip(pending, fallback):
+            results[idx] = mimetype
+            if key is not None and mimetype is not None:
+                _cache_put(key, mimetype)
+
+    return [mimetype or default for mimetype in results]
+
+
+def clear_mimetype_cache():
+    """Forget the cached mimetypes"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _cache_put(key: tuple, mimetype: str):
+    with _cache_lock:
+        _cache[key] = mimetype
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _guess_from_signature(path: Path) -> str | None:
+    """The mimetype from the magic bytes and the extension, None if ambiguous"""
+    ext = path.suffix.lower()
+    if ext in _FORCED_EXTENSIONS:
+        return _FORCED_EXTENSIONS[ext]
+
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER_SIZE)
+    except OSError:
+        return None
+
+    for offset, signature, mimetype in _SIGNATURES:
+        if header.startswith(signature, offset):
+            return mimetype
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return MimeType.wav
+    if header[4:8] == b"ftyp" and ext == ".mp4":
+        return MimeType.mp4
+    if header.startswith(b"PK\x03\x04"):
+        # office documents and epub are zip archives
+        return _ZIP_EXTENSIONS.get(ext)
+
+    if ext in _TEXT_EXTENSIONS and b"\x00" not in header:
+        return _TEXT_EXTENSIONS[ext]
+
+    return None
+
+
+def _guess_fallback(paths: list[Path]) -> list[str | None]:
+    results: list[str | None] = []
+    if _m:
+        for result in _m.identify_paths(paths):
+            try:
+                results.append(result.output.mime_type)
+            except ValueError:
+                # the file couldn't be read
+                results.append(None)
+        return results
+
+    for path in paths:
+        if magic:
+            try:
+                results.append(magic.from_file(str(path), mime=True))
+                continue
+            except OSError:
+                pass
+        results.append(_mimetypes_guess_file(str(path))[0])
+    return results
 
 
 class MimeType:
@@ -105,6 +200,56 @@ class MimeType:
     ipynb = "application/x-ipynb+json"
 
 
+# Bytes read from the start of a file to find its signature
+_HEADER_SIZE = 2048
+
+# Extensions that magic and magika usually mistake
+_FORCED_EXTENSIONS = {
+    ".ipynb": MimeType.ipynb,  # a JSON file
+    ".rst": MimeType.rst,  # a text file that magic usually mistake
+    ".org": MimeType.org,  # usually mistaken as markdown and html
+}
+
+# (offset, magic bytes, mimetype)
+_SIGNATURES = [
+    (0, b"%PDF-", MimeType.pdf),
+    (0, b"\x89PNG\r\n\x1a\n", MimeType.png),
+    (0, b"\xff\xd8\xff", MimeType.jpeg),
+    (0, b"II*\x00", MimeType.tiff),
+    (0, b"MM\x00*", MimeType.tiff),
+    (0, b"{\\rtf", MimeType.rtf),
+    (0, b"ID3", MimeType.mp3),
+]
+
+_ZIP_EXTENSIONS = {
+    ".docx": MimeType.docx,
+    ".pptx": MimeType.pptx,
+    ".xlsx": MimeType.xlsx,
+    ".odt": MimeType.odt,
+    ".epub": MimeType.epub,
+}
+
+# Extensions of text files, used when the file doesn't look binary
+_TEXT_EXTENSIONS = {
+    ".txt": MimeType.text,
+    ".md": MimeType.md,
+    ".markdown": MimeType.md,
+    ".html": MimeType.html,
+    ".htm": MimeType.html,
+    ".tex": MimeType.tex,
+    ".csv": MimeType.csv,
+    ".json": MimeType.json,
+    ".toml": MimeType.toml,
+    ".yaml": MimeType.yaml_x,
+    ".yml": MimeType.yaml_x,
+}
+
+# Mimetypes by (path, size, mtime), least recently used first
+_CACHE_SIZE = 1 << 16
+_cache: OrderedDict[tuple, str] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
 class MimeManager:
     """Helper to access and modify mime-specific behaviors"""
 
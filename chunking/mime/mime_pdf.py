@@ -13,6 +13,7 @@ from dataclasses import asdict, dataclass
 from pathlib import Path
 
 from chunking.base import Chunk, Origin
+from chunking.util.hashing import HashCache, hash_file
 
 
 @dataclass
@@ -29,11 +30,18 @@ class ChildMetadata:
         return d
 
 
-def as_root_chunk(path: str) -> Chunk:
-    """From a pdf file to a base chunk"""
+def as_root_chunk(
+    path: str, algorithm: str = "sha256", cache: HashCache | None = None
+) -> Chunk:
+    """From a pdf file to a base chunk
+
+    Args:
+        path: the pdf file
+        algorithm: the algorithm of the file hash
+        cache: reuse the hash of the file if it didn't change
+    """
     path = str(Path(path).resolve())
-    with open(path, "rb") as f:
-        file_hash = hashlib.sha256(f.read()).hexdigest()
+    file_hash = hash_file(path, algorithm=algorithm, cache=cache)
     chunk = Chunk(
         mimetype="application/pdf",
         origin=Origin(location=path),
@@ -2,7 +2,7 @@ import re
 import textwrap
 from typing import Callable, Optional
 
-from chunking.base import BaseOperation, Chunk, ChunkGroup, CType
+from chunking.base import BaseOperation, Chunk, ChunkGroup, CType, LazyChunkGroup
 from chunking.mime import MimeType
 
 from .utils import merge_splits, split_with_regex, word_len
@@ -257,6 +257,7 @@ def flatten_chunk_to_markdown(
             child = child.next
             continue
 
+        child_ids = child.get_ids()
         if child.ctype == "inline":
             s = " "
         elif child.ctype == "list":
@@ -268,7 +269,7 @@ def flatten_chunk_to_markdown(
         if length_fn(child_str + s + current_chunk.content) <= max_size:
             # Can add the child to the current chunk
             current_chunk.content += s + child_str
-            current_chunk.metadata["originals"].extend(child.get_ids())
+            current_chunk.metadata["originals"].extend(child_ids)
         else:
             # The resulting chunk will be too large, create a new chunk
             if current_chunk.content:
@@ -279,7 +280,7 @@ def flatten_chunk_to_markdown(
                 mimetype=MimeType.text,
                 ctype=CType.Div,
                 content="",
-                metadata={"originals": child.get_ids()},
+                metadata={"originals": list(child_ids)},
             )
             if length_fn(child_str) > max_size:
                 # Split the text recursively based on the separators
@@ -298,7 +299,7 @@ def flatten_chunk_to_markdown(
                             mimetype=MimeType.text,
                             ctype=CType.Div,
                             content=split,
-                            metadata={"originals": child.get_ids()},
+                            metadata={"originals": list(child_ids)},
                         )
                         for split in splitteds[:-1]
                     ]
@@ -363,20 +364,29 @@ class FlattenToMarkdown(BaseOperation):
         else:
             length = length_fn
 
-        output = ChunkGroup()
-        for root in chunks:
-            flattened_chunks = flatten_chunk_to_markdown(
-                root,
-                max_size,
-                length,
-                separators,
-                {},
-                **kwargs,
+        def _iter_output():
+            for root in chunks:
+                flattened_chunks = flatten_chunk_to_markdown(
+                    root,
+                    max_size,
+                    length,
+                    separators,
+                    {},
+                    **kwargs,
+                )
+                for idx, chunk in enumerate(flattened_chunks[1:]):
+                    chunk.prev = flattened_chunks[idx - 1]
+                    flattened_chunks[idx].next = chunk
+
+                yield flattened_chunks[0]
+
+        if isinstance(chunks, LazyChunkGroup):
+            return LazyChunkGroup(
+                _iter_output(), store=chunks.store, cache=chunks.cache
             )
-            for idx, chunk in enumerate(flattened_chunks[1:]):
-                chunk.prev = flattened_chunks[idx - 1]
-                flattened_chunks[idx].next = chunk
 
-            output.append(flattened_chunks[0])
+        output = ChunkGroup()
+        for chunk in _iter_output():
+            output.append(chunk)
 
         return output
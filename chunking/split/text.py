@@ -2,7 +2,7 @@ import copy
 import re
 from typing import Callable, Literal, Optional
 
-from chunking.base import BaseOperation, Chunk, ChunkGroup, CType
+from chunking.base import BaseOperation, Chunk, ChunkGroup, CType, LazyChunkGroup
 from chunking.mime import MimeType
 
 from .utils import merge_splits, split_with_regex, word_len
@@ -149,51 +149,61 @@ class ChunkByCharacters(BaseOperation):
 
             return final_chunks
 
-        output = ChunkGroup()
-        for ch in chunks:
-            if isinstance(ch.content, str) and not ch.content:
-                output.append(ch)
-                continue
-
-            if ch.ctype == CType.Root:
-                continue  # Skip root chunks
-
-            separators = separators or _default_separators(ch.text)
-            splitted_texts = _split_text(ch.content, separators)
-            if len(splitted_texts) == 1:
-                # nothing to split, skip
-                output.append(ch)
-                continue
-
-            # Record history
-            history = copy.deepcopy(ch.history)
-            history.append(
-                cls.name(
-                    chunk_size=chunk_size,
-                    chunk_overlap=chunk_overlap,
-                    keep_separator=keep_separator,
-                    is_separator_regex=is_separator_regex,
-                )
-            )
-
-            splitted_chunks = [
-                Chunk(
-                    mimetype=MimeType.text,
-                    content=text,
-                    origin=ch.origin,
-                    parent=ch,
-                    history=history,
+        def _iter_output():
+            nonlocal separators
+            for ch in chunks:
+                if isinstance(ch.content, str) and not ch.content:
+                    yield ch
+                    continue
+
+                if ch.ctype == CType.Root:
+                    continue  # Skip root chunks
+
+                separators = separators or _default_separators(ch.text)
+                splitted_texts = _split_text(ch.content, separators)
+                if len(splitted_texts) == 1:
+                    # nothing to split, skip
+                    yield ch
+                    continue
+
+                # Record history
+                history = copy.deepcopy(ch.history)
+                history.append(
+                    cls.name(
+                        chunk_size=chunk_size,
+                        chunk_overlap=chunk_overlap,
+                        keep_separator=keep_separator,
+                        is_separator_regex=is_separator_regex,
+                    )
                 )
-                for text in splitted_texts
-            ]
 
-            # Next and prev intra chunks
-            for idx, _c in enumerate(splitted_chunks[1:], start=1):
-                _c.prev = splitted_chunks[idx - 1]
-                splitted_chunks[idx - 1].next = _c
+                splitted_chunks = [
+                    Chunk(
+                        mimetype=MimeType.text,
+                        content=text,
+                        origin=ch.origin,
+                        parent=ch,
+                        history=history,
+                    )
+                    for text in splitted_texts
+                ]
+
+                # Next and prev intra chunks
+                for idx, _c in enumerate(splitted_chunks[1:], start=1):
+                    _c.prev = splitted_chunks[idx - 1]
+                    splitted_chunks[idx - 1].next = _c
+
+                # Return the first chunk
+                yield splitted_chunks[0]
+
+        if isinstance(chunks, LazyChunkGroup):
+            return LazyChunkGroup(
+                _iter_output(), store=chunks.store, cache=chunks.cache
+            )
 
-            # Return the first chunk
-            output.append(splitted_chunks[0])
+        output = ChunkGroup()
+        for ch in _iter_output():
+            output.append(ch)
 
         return output
 
@@ -0,0 +1,145 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from chunking.base import BaseStore, Chunk, ChunkGroup
+
+
+def _size(content: Any) -> int:
+    """The size of the content in bytes, UTF-8 encoded for str
+
+    Other objects are measured with `sys.getsizeof`, without the objects they refer
+    to, so their size is approximate.
+    """
+    if isinstance(content, (bytes, bytearray)):
+        return len(content)
+    if isinstance(content, str):
+        return len(content.encode())
+    return sys.getsizeof(content)
+
+
+class ContentCacheStore(BaseStore):
+    """Keep the recently used content of a store within a byte budget
+
+    Chunks loaded through this store don't keep their content: each access goes
+    through an LRU cache, and the least recently used content is evicted once the
+    cached content exceeds `max_bytes`. Walking a large stored corpus then only
+    keeps the hot content (e.g. page images) in memory.
+
+    Args:
+        store: the store to cache
+        max_bytes: the budget of the cached content. Bytes content counts its
+            length and str content its UTF-8 length, other content only counts
+            approximately, see `sys.getsizeof`
+    """
+
+    keep_content = False
+
+    def __init__(self, store: BaseStore, max_bytes: int = 256 * 1024 * 1024):
+        self._store = store
+        self._max_bytes = max_bytes
+        self._cache: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def store(self) -> BaseStore:
+        return self._store
+
+    @property
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters, and the size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+            }
+
+    def _invalidate(self, id: str):
+        with self._lock:
+            entry = self._cache.pop(id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        """Empty the cache, the counters are kept"""
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+
+    def __contains__(self, id):
+        return id in self._store
+
+    def get(self, id):
+        chunk = self._store.get(id)
+        chunk.store = self
+        return chunk
+
+    def get_many(self, ids: Iterable[str]) -> list[Chunk]:
+        chunks = self._store.get_many(ids)
+        for chunk in chunks:
+            chunk.store = self
+        return chunks
+
+    def fetch_content(self, chunk: Chunk):
+        id = chunk.id
+        with self._lock:
+            entry = self._cache.get(id)
+            if entry is not None:
+                self._cache.move_to_end(id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        content = self._store.fetch_content(chunk)
+        size = _size(content)
+        if content is None or size > self._max_bytes:
+            return content
+
+        with self._lock:
+            if id not in self._cache:
+                self._cache[id] = (content, size)
+                self._bytes += size
+            while self._bytes > self._max_bytes:
+                _, (_, evicted_size) = self._cache.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return content
+
+    def save(self, chunk: Chunk):
+        self._invalidate(chunk.id)
+        self._store.save(chunk)
+
+    def save_group(self, group: ChunkGroup):
+        for root, chunks in group.iter_groups():
+            if isinstance(root, Chunk):
+                self._invalidate(root.id)
+            for chunk in chunks:
+                self._invalidate(chunk.id)
+        self._store.save_group(group)
+
+    def ids(self) -> Iterable[str]:
+        return self._store.ids()
+
+    def _relations(self):
+        return self._store._relations()
+
+    def _descendant_ids(self, chunk: Chunk) -> list[str]:
+        return self._store._descendant_ids(chunk)
+
+    def _query(self, root_id, ctype, page, metadata):
+        return self._store._query(root_id, ctype, page, metadata)
+
+    def delete_many(self, ids: Iterable[str]):
+        ids = list(ids)
+        for id in ids:
+            self._invalidate(id)
+        self._store.delete_many(ids)
@@ -0,0 +1,173 @@
+import lzma
+import zlib
+from typing import Any, Callable
+
+from chunking.mime import MimeType
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Blob frame: magic, codec name length, codec name, content type, payload
+_MAGIC = b"\xffCZ"
+_STR, _BYTES = b"s", b"b"
+
+_CODECS: dict[str, tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "none": (bytes, bytes),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+if zstandard is not None:
+    _CODECS["zstd"] = (
+        zstandard.ZstdCompressor().compress,
+        zstandard.ZstdDecompressor().decompress,
+    )
+
+# Formats that are already compressed, compressing them again wastes time
+COMPRESSED_MIMETYPES = {
+    MimeType.png,
+    MimeType.jpeg,
+    MimeType.mp3,
+    MimeType.mp4,
+    MimeType.epub,
+    MimeType.docx,
+    MimeType.pptx,
+    MimeType.xlsx,
+    MimeType.odt,
+    "image/gif",
+    "image/webp",
+    "application/zip",
+    "application/gzip",
+}
+_COMPRESSED_MAGIC = (
+    b"\x89PNG",
+    b"\xff\xd8\xff",
+    b"GIF8",
+    b"PK\x03\x04",
+    b"\x1f\x8b",
+    b"\x28\xb5\x2f\xfd",
+    b"\xfd7zXZ",
+)
+
+
+def register_codec(
+    name: str, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]
+):
+    """Register a compression codec, to be selected by name in `Compression`"""
+    if not name or len(name.encode()) > 255:
+        raise ValueError(f"Invalid codec name: {name!r}")
+    _CODECS[name] = (compress, decompress)
+
+
+def available_codecs() -> list[str]:
+    """Names of the registered codecs"""
+    return list(_CODECS)
+
+
+class Compression:
+    """Compression policy of the stored content
+
+    Bytes content, and str content of at least `min_size` bytes, is compressed
+    with the codec selected for the chunk mimetype. Each blob is framed with the
+    name of its codec, so the policy can change without rewriting a store, and
+    blobs written without compression are read as is. Stores without compression
+    write bytes content with `frame_raw`, so that content starting like a frame
+    isn't mistaken for one.
+
+    Content that is already compressed, by mimetype or by magic bytes (PNG, JPEG,
+    ZIP...), is stored with the "none" codec.
+
+    Args:
+        codec: the default codec
+        mimetypes: codec per mimetype, overriding the default, None to skip the
+            compression of a mimetype
+        min_size: str content smaller than this is kept inline in the chunk JSON
+    """
+
+    def __init__(
+        self,
+        codec: str = "zlib",
+        mimetypes: dict[str, str | None] | None = None,
+        min_size: int = 512,
+    ):
+        for name in [codec, *(mimetypes or {}).values()]:
+            if name is not None and name not in _CODECS:
+                raise ValueError(
+                    f"Unknown codec {name!r}, available: {available_codecs()}"
+                )
+        self.codec = codec
+        self.mimetypes = dict(mimetypes or {})
+        self.min_size = min_size
+
+    def codec_for(self, mimetype: str | None) -> str:
+        """The codec used for content of `mimetype`"""
+        if mimetype in self.mimetypes:
+            return self.mimetypes[mimetype] or "none"
+        if mimetype in COMPRESSED_MIMETYPES:
+            return "none"
+        return self.codec
+
+    def pack(self, content: Any, mimetype: str | None = None) -> bytes | None:
+        """Frame and compress the content
+
+        Returns:
+            the blob, or None if the content should stay in the chunk JSON
+        """
+        if isinstance(content, str):
+            data = content.encode()
+            if len(data) < self.min_size:
+                return None
+            kind = _STR
+        elif isinstance(content, (bytes, bytearray, memoryview)):
+            data = bytes(content)
+            kind = _BYTES
+        else:
+            return None
+
+        name = self.codec_for(mimetype)
+        if name != "none" and data.startswith(_COMPRESSED_MAGIC):
+            name = "none"
+        payload = _CODECS[name][0](data)
+        if name != "none" and len(payload) >= len(data):
+            name, payload = "none", data
+
+        name_bytes = name.encode()
+        return b"".join([_MAGIC, bytes([len(name_bytes)]), name_bytes, kind, payload])
+
+
+def frame_raw(data: bytes) -> bytes:
+    """Bytes content as stored without compression
+
+    The content is kept as is, unless it starts like a frame: it is then framed
+    with the "none" codec, so that `unpack` returns it unchanged.
+    """
+    if not data.startswith(_MAGIC):
+        return data
+    name = b"none"
+    return b"".join([_MAGIC, bytes([len(name)]), name, _BYTES, data])
+
+
+def codec_of(blob: bytes) -> str | None:
+    """The codec of a blob, None if the blob isn't framed"""
+    if not blob.startswith(_MAGIC):
+        return None
+    size = blob[len(_MAGIC)]
+    return bytes(blob[len(_MAGIC) + 1 : len(_MAGIC) + 1 + size]).decode()
+
+
+def unpack(blob: bytes) -> bytes | str:
+    """Decompress a blob written by `Compression.pack`
+
+    Blobs that aren't framed are returned unchanged.
+    """
+    name = codec_of(blob)
+    if name is None:
+        return blob
+    if name not in _CODECS:
+        raise ValueError(f"Blob compressed with unknown codec {name!r}")
+
+    start = len(_MAGIC) + 1 + len(name.encode())
+    kind = blob[start : start + 1]
+    data = _CODECS[name][1](blob[start + 1 :])
+    return data.decode() if kind == _STR else data
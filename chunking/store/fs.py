@@ -1,16 +1,40 @@
 import builtins
+import hashlib
 import json
+import os
 from pathlib import Path
+from typing import Iterable
 
 from chunking.base import BaseStore, Chunk
+from chunking.store.codec import Compression, frame_raw, unpack
 
 
 class FileStore(BaseStore):
-    """File-backed chunk store"""
+    """File-backed chunk store
 
-    def __init__(self, path: str | Path):
+    With `dedup`, the content is stored once per distinct payload in the
+    content-addressed `blobs` directory, and the content file of each chunk is a
+    hard link to its blob: the link count of a blob is its reference count. A blob
+    is removed when the last chunk that links to it is deleted or overwritten.
+
+    Args:
+        path: the directory of the store
+        compression: compress the content files, and large str content that would
+            otherwise be stored in the JSON
+        dedup: store identical content once
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        compression: Compression | None = None,
+        dedup: bool = True,
+    ):
         self._path: Path = Path(path).resolve()
         self._path.mkdir(parents=True, exist_ok=True)
+        self._compression = compression
+        self._dedup = dedup
+        self._blob_dir = self._path / "blobs"
 
     def __contains__(self, id):
         return (self._path / f"{id}.json").exists()
@@ -38,34 +62,112 @@ class FileStore(BaseStore):
         if not content_path.exists():
             return None
         with open(content_path, "rb") as f:
-            return f.read()
+            return unpack(f.read())
 
     def save(self, chunk: Chunk):
         file_path = self._path / f"{chunk.id}.json"
         chunk_dict = chunk.asdict()
         content = None
-        if isinstance(chunk_dict["content"], builtins.bytes):
-            content = chunk_dict.pop("content")
+        if self._compression is not None:
+            content = self._compression.pack(chunk_dict["content"], chunk.mimetype)
+            if content is not None:
+                chunk_dict.pop("content")
+        elif isinstance(chunk_dict["content"], builtins.bytes):
+            content = frame_raw(chunk_dict.pop("content"))
 
         # dump the lightweight part
         with open(file_path, "w") as f:
             json.dump(chunk_dict, f)
 
         # dump the content if any
-        if content is not None:
-            content_path = self._path / f"{chunk.id}.content"
+        content_path = self._path / f"{chunk.id}.content"
+        if content is None:
+            self._release(content_path)
+        elif self._dedup:
+            self._link_blob(content_path, content)
+        else:
+            self._release(content_path)
             with open(content_path, "wb") as f:
                 f.write(content)
 
-    def delete(self, chunk: Chunk):
-        """Delete the chunk from the directory
+    def _blob_path(self, blob: bytes) -> Path:
+        digest = hashlib.blake2b(blob, digest_size=16).hexdigest()
+        return self._blob_dir / digest[:2] / digest
+
+    def _link_blob(self, content_path: Path, blob: bytes):
+        """Point the content file to the blob, writing the blob if it is new"""
+        blob_path = self._blob_path(blob)
+        if (
+            blob_path.exists()
+            and content_path.exists()
+            and os.path.samefile(blob_path, content_path)
+        ):
+            return
+
+        self._release(content_path)
+        if not blob_path.exists():
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob_path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, blob_path)
+
+        try:
+            os.link(blob_path, content_path)
+        except OSError:
+            # the filesystem doesn't support hard links, keep a copy
+            with open(content_path, "wb") as f:
+                f.write(blob)
+
+    def _release(self, content_path: Path):
+        """Remove the content file, and its blob if it was the last reference"""
+        try:
+            stat = content_path.stat()
+        except FileNotFoundError:
+            return
 
-        @TODO: delete the relations as well
+        blob_path = None
+        if stat.st_nlink == 2:
+            # linked to the blob only, the blob is found by hashing the content
+            with open(content_path, "rb") as f:
+                blob_path = self._blob_path(f.read())
+        content_path.unlink()
+
+        if blob_path is not None:
+            try:
+                blob_stat = blob_path.stat()
+            except FileNotFoundError:
+                return
+            if blob_stat.st_ino == stat.st_ino and blob_stat.st_nlink == 1:
+                blob_path.unlink()
+
+    def gc_blobs(self) -> int:
+        """Remove the blobs that no chunk links to, e.g. after an interrupted save
+
+        Returns:
+            the number of removed blobs
         """
-        file_path = self._path / f"{chunk.id}.json"
-        if file_path.exists():
-            file_path.unlink()
+        removed = 0
+        if not self._blob_dir.exists():
+            return removed
+        for blob_path in self._blob_dir.glob("*/*"):
+            if blob_path.suffix == ".tmp" or blob_path.stat().st_nlink == 1:
+                blob_path.unlink()
+                removed += 1
+        return removed
 
-        content_path = self._path / f"{chunk.id}.content"
-        if content_path.exists():
-            content_path.unlink()
+    def ids(self) -> Iterable[str]:
+        return [file_path.stem for file_path in self._path.glob("*.json")]
+
+    def delete_many(self, ids: Iterable[str]):
+        for id in ids:
+            file_path = self._path / f"{id}.json"
+            if file_path.exists():
+                file_path.unlink()
+            self._release(self._path / f"{id}.content")
+
+    def gc(self, roots: Iterable[str] = (), sweep: bool = False) -> list[str]:
+        """Remove the unreachable chunks, then the unreferenced blobs"""
+        removed = super().gc(roots, sweep)
+        self.gc_blobs()
+        return removed
@@ -1,15 +1,34 @@
+from collections import defaultdict
+from typing import Any, Iterable
+
 from chunking.base import BaseStore, Chunk
 
 
+def _indexable(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
 class MemoryStore(BaseStore):
     """Memory-backed chunk store
 
     Suitable to expose chunk store interface to a group of chunks.
+
+    The root, ctype, page and scalar metadata values of the chunks are indexed
+    when they are saved, so `query` doesn't scan the store. The chunks are kept as
+    is, a chunk changed after it is saved must be saved again to be re-indexed.
     """
 
     def __init__(self, chunks: dict | None = None):
         self._chunks = chunks or {}
 
+        # secondary indexes: index key -> ids, and id -> (save order, index keys)
+        self._index: defaultdict[tuple, set[str]] = defaultdict(set)
+        self._keys: dict[str, tuple[int, list[tuple]]] = {}
+        self._roots: dict[str, str] = {}
+        self._seq = 0
+        for chunk in self._chunks.values():
+            self._index_chunk(chunk)
+
     def __contains__(self, id):
         return id in self._chunks
 
@@ -17,14 +36,90 @@ class MemoryStore(BaseStore):
         return self._chunks[id]
 
     def fetch_content(self, chunk: Chunk):
-        return self._chunks[chunk.id].content
+        return self._chunks[chunk.id]._content
+
+    def _root_id(self, chunk: Chunk) -> str:
+        """The id of the root of the tree of `chunk`"""
+        node = chunk
+        while True:
+            parent = node._parent
+            if parent is None:
+                return node.id
+            parent_id = parent if isinstance(parent, str) else parent.id
+            if parent_id in self._roots:
+                return self._roots[parent_id]
+            if isinstance(parent, str):
+                return parent
+            node = parent
+
+    def _index_chunk(self, chunk: Chunk):
+        self._unindex_chunk(chunk.id)
+
+        root_id = self._roots[chunk.id] = self._root_id(chunk)
+        keys = [("root", root_id), ("ctype", chunk.ctype)]
+        page = chunk.page
+        if page is not None and _indexable(page):
+            keys.append(("page", page))
+        for key, value in (chunk._metadata or {}).items():
+            if _indexable(value):
+                keys.append(("metadata", key, value))
+
+        for key in keys:
+            self._index[key].add(chunk.id)
+        self._keys[chunk.id] = (self._seq, keys)
+        self._seq += 1
+
+    def _unindex_chunk(self, id: str):
+        _, keys = self._keys.pop(id, (None, []))
+        self._roots.pop(id, None)
+        for key in keys:
+            ids = self._index[key]
+            ids.discard(id)
+            if not ids:
+                del self._index[key]
 
     def save(self, chunk: Chunk):
         self._chunks[chunk.id] = chunk
+        self._index_chunk(chunk)
+
+    def ids(self) -> Iterable[str]:
+        return list(self._chunks)
+
+    def delete_many(self, ids: Iterable[str]):
+        for id in ids:
+            if self._chunks.pop(id, None) is not None:
+                self._unindex_chunk(id)
+
+    def _query(self, root_id, ctype, page, metadata):
+        keys = []
+        if root_id is not None:
+            keys.append(("root", root_id))
+        if ctype is not None:
+            keys.append(("ctype", ctype))
+        if page is not None and _indexable(page):
+            keys.append(("page", page))
+        for key, value in metadata.items():
+            if _indexable(value):
+                keys.append(("metadata", key, value))
+
+        if keys:
+            # intersect from the smallest set
+            sets = sorted((self._index.get(key, set()) for key in keys), key=len)
+            ids = sorted(sets[0].intersection(*sets[1:]), key=self._keys.__getitem__)
+        else:
+            ids = list(self._chunks)
 
-    def delete(self, chunk: Chunk):
-        """Delete the chunk from the directory
+        for id in ids:
+            chunk = self._chunks[id]
+            if self._matches(chunk, ctype, page, metadata):
+                yield chunk
 
-        @TODO: delete the relations as well
-        """
-        del self._chunks[chunk.id]
+    def apply_diff(self, diff):
+        # the stored chunks are linked objects, replace all of them with the new
+        # version so that navigating the relations doesn't reach stale chunks
+        diff.adopt_ids()
+        self.delete_many([chunk.id for chunk in diff.deleted])
+        for _, chunk in diff.matches:
+            self.save(chunk)
+        for chunk in diff.inserted:
+            self.save(chunk)
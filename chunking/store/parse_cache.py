@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version as package_version
+from pathlib import Path
+
+from chunking.arena import ChunkArena
+from chunking.base import Chunk, CType
+from chunking.store.codec import Compression, unpack
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _library_version() -> str:
+    try:
+        return package_version("chunking-ai")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class ParseCache:
+    """Persistent cache of parsed file trees
+
+    An entry is keyed by the hash of the file content (the id of the root chunk
+    from `Controller.as_root_chunk`), the parser class, the parser kwargs and the
+    library version, so that changing any of them parses the file again. The
+    entries are serialized with `ChunkArena` in a SQLite database, which can be
+    shared by the worker processes of `parse`.
+
+    The least recently used entries are evicted when the total size goes over
+    `max_size`. The hit, miss and eviction counts are kept in the database, so they
+    add up over the runs and the processes, see `stats`.
+
+    Args:
+        path: path to the database file
+        max_size: maximum total size of the entries in bytes, None for unbounded
+        compression: compress the serialized trees
+        version: the version part of the keys, defaults to the library version.
+            Change it to invalidate the entries, e.g. after updating a model
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_size: int | None = 1 << 30,
+        compression: Compression | None = None,
+        version: str | None = None,
+    ):
+        self._path = Path(path).resolve()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._compression = compression
+        self._version = version or _library_version()
+
+        self._lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            (self._path, self.max_size, self._compression, self._version),
+        )
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # a forked process opens its own connection
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(
+                self._path, timeout=60, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    def key(self, file_hash: str, parser) -> str:
+        """The key of the tree of a file parsed by a parser
+
+        Args:
+            file_hash: the hash of the file content
+            parser: the parser class, or instance. The kwargs of an instance are
+                the ones given to its constructor
+        """
+        cls = parser if isinstance(parser, type) else type(parser)
+        kwargs = {}
+        if not isinstance(parser, type):
+            kwargs = getattr(parser, "_default_params", None) or {}
+        parts = [
+            file_hash,
+            f"{cls.__module__}.{cls.__qualname__}",
+            kwargs,
+            self._version,
+        ]
+        data = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _count(self, name: str, value: int = 1):
+        self._db.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, value),
+        )
+
+    def get(self, key: str) -> Chunk | None:
+        """The cached tree of the key, None on a miss"""
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT data FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._count("hits")
+
+        return ChunkArena.from_bytes(unpack(row[0])).to_chunk()
+
+    def put(self, key: str, chunk: Chunk):
+        """Cache the tree of the chunk, then evict the least recently used entries
+        over `max_size`"""
+        try:
+            arena = ChunkArena.from_chunk(chunk, load_content=True, copy=False)
+            if chunk.ctype == CType.Root and chunk.origin is not None:
+                # loaded from the file again when needed
+                arena.contents[0] = None
+            data = arena.to_bytes()
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Cannot cache the tree of {chunk.id}: {e}")
+            return
+
+        if self._compression is not None:
+            data = self._compression.pack(data) or data
+        if self.max_size is not None and len(data) > self.max_size:
+            return
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, data, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            self.evict()
+
+    def evict(self, max_size: int | None = None) -> int:
+        """Remove the least recently used entries until the total size is at most
+        `max_size`, defaults to the cache `max_size`
+
+        Returns:
+            the number of removed entries
+        """
+        max_size = self.max_size if max_size is None else max_size
+        if max_size is None:
+            return 0
+
+        with self._lock, self._db:
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+            if total <= max_size:
+                return 0
+
+            keys = []
+            for key, size in self._db.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"
+            ):
+                if total <= max_size:
+                    break
+                keys.append((key,))
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE key = ?", keys)
+            self._count("evictions", len(keys))
+        return len(keys)
+
+    def stats(self) -> dict[str, int]:
+        """The hits, misses and evictions since the last `reset_stats`, and the
+        number and total size of the entries"""
+        with self._lock:
+            stats = {"hits": 0, "misses": 0, "evictions": 0}
+            stats.update(self._db.execute("SELECT name, value FROM stats"))
+            stats["entries"], stats["size"] = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return stats
+
+    def reset_stats(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM stats")
+
+    def clear(self):
+        """Remove all the entries"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,354 @@
+import builtins
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable
+
+from chunking.base import BaseStore, Chunk, ChunkGroup
+from chunking.store.codec import Compression, frame_raw, unpack
+
+logger = logging.getLogger(__name__)
+
+# Record: kind, id length, JSON length, blob length, then id, JSON and blob bytes
+_RECORD = struct.Struct("<BHIQ")
+_CHUNK, _TOMBSTONE = 1, 2
+
+
+class SegmentStore(BaseStore):
+    """Log-structured chunk store
+
+    Chunks are appended as records to large segment files. Each record holds the
+    chunk id, the JSON of the chunk (as in `FileStore`), and the bytes content as
+    a separate blob. An in-memory index maps each id to the location of its latest
+    record, so `__contains__` doesn't touch the filesystem, and reads go through
+    memory-mapped segments.
+
+    Deleting a chunk appends a tombstone record. Segments whose share of deleted
+    or overwritten records exceeds `compact_ratio` are rewritten by `compact`,
+    which runs in a background thread after deletes when `auto_compact` is True.
+
+    The index is persisted to `index.json` on `flush` and `close`. Records written
+    after the last persisted index are recovered by scanning the segments.
+
+    Args:
+        path: the directory of the segments
+        segment_size: start a new segment once the current one exceeds this size
+        compact_ratio: compact segments with more garbage than this ratio
+        auto_compact: compact in a background thread after deletes
+        compression: compress the blobs, and store large str content as blobs
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        segment_size: int = 64 * 1024 * 1024,
+        compact_ratio: float = 0.5,
+        auto_compact: bool = True,
+        compression: Compression | None = None,
+    ):
+        self._path: Path = Path(path).resolve()
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._segment_size = segment_size
+        self._compact_ratio = compact_ratio
+        self._auto_compact = auto_compact
+        self._compression = compression
+
+        self._lock = threading.RLock()
+        self._compactor: threading.Thread | None = None
+
+        # id -> (segment, offset of the record, JSON length, blob length)
+        self._index: dict[str, tuple[int, int, int, int]] = {}
+        # segment -> size covered by the index, and bytes of garbage records
+        self._sizes: dict[int, int] = {}
+        self._garbage: dict[int, int] = {}
+        self._maps: dict[int, mmap.mmap] = {}
+
+        self._load()
+        self._active = max(self._sizes, default=1)
+        self._sizes.setdefault(self._active, 0)
+        self._garbage.setdefault(self._active, 0)
+        self._writer = open(self._segment_path(self._active), "ab")
+        self._dirty = False
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._path / f"segment-{segment:06d}.log"
+
+    def _load(self):
+        """Load the persisted index, then recover the records written after it"""
+        index_path = self._path / "index.json"
+        if index_path.exists():
+            with open(index_path) as f:
+                data = json.load(f)
+            self._index = {id: tuple(loc) for id, loc in data["records"].items()}
+            self._sizes = {int(seg): size for seg, size in data["sizes"].items()}
+            self._garbage = {int(seg): size for seg, size in data["garbage"].items()}
+
+        # segments removed by a compaction that finished after the index was saved,
+        # their live records were copied to the end of the newer segments
+        removed = {seg for seg in self._sizes if not self._segment_path(seg).exists()}
+        if removed:
+            self._index = {
+                id: loc for id, loc in self._index.items() if loc[0] not in removed
+            }
+            for segment in removed:
+                self._sizes.pop(segment)
+                self._garbage.pop(segment, None)
+
+        for segment_path in sorted(self._path.glob("segment-*.log")):
+            segment = int(segment_path.stem.split("-")[1])
+            self._scan(segment, self._sizes.get(segment, 0))
+
+    def _scan(self, segment: int, offset: int):
+        """Index the records of `segment` from `offset`"""
+        segment_path = self._segment_path(segment)
+        size = segment_path.stat().st_size
+        self._garbage.setdefault(segment, 0)
+        with open(segment_path, "rb") as f:
+            f.seek(offset)
+            while offset + _RECORD.size <= size:
+                kind, id_len, json_len, blob_len = _RECORD.unpack(f.read(_RECORD.size))
+                end = offset + _RECORD.size + id_len + json_len + blob_len
+                if end > size:
+                    break
+                id = f.read(id_len).decode()
+                f.seek(json_len + blob_len, os.SEEK_CUR)
+                self._unindex(id)
+                if kind == _CHUNK:
+                    self._index[id] = (segment, offset, json_len, blob_len)
+                else:
+                    self._garbage[segment] += end - offset
+                offset = end
+
+        if offset < size:
+            logger.warning(f"Truncating incomplete record at the end of {segment_path}")
+            os.truncate(segment_path, offset)
+        self._sizes[segment] = offset
+
+    def _unindex(self, id: str):
+        """Remove `id` from the index, counting its record as garbage"""
+        loc = self._index.pop(id, None)
+        if loc is not None:
+            segment, _, json_len, blob_len = loc
+            self._garbage[segment] = self._garbage.get(segment, 0) + (
+                _RECORD.size + len(id.encode()) + json_len + blob_len
+            )
+
+    def _append(self, kind: int, id: str, data: bytes = b"", blob: bytes = b""):
+        if self._sizes[self._active] >= self._segment_size:
+            self._writer.close()
+            self._active += 1
+            self._sizes[self._active] = self._garbage[self._active] = 0
+            self._writer = open(self._segment_path(self._active), "ab")
+
+        id_bytes = id.encode()
+        offset = self._sizes[self._active]
+        self._writer.write(_RECORD.pack(kind, len(id_bytes), len(data), len(blob)))
+        self._writer.write(id_bytes)
+        self._writer.write(data)
+        self._writer.write(blob)
+        self._sizes[self._active] += (
+            _RECORD.size + len(id_bytes) + len(data) + len(blob)
+        )
+        self._dirty = True
+
+        self._unindex(id)
+        if kind == _CHUNK:
+            self._index[id] = (self._active, offset, len(data), len(blob))
+        else:
+            self._garbage[self._active] += self._sizes[self._active] - offset
+
+    def _view(self, segment: int, start: int, length: int) -> memoryview:
+        """Zero-copy view of a segment range"""
+        if self._dirty:
+            self._writer.flush()
+            self._dirty = False
+
+        mm = self._maps.get(segment)
+        if mm is None or len(mm) < start + length:
+            self._unmap(segment)
+            with open(self._segment_path(segment), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mm
+        return memoryview(mm)[start : start + length]
+
+    def _unmap(self, segment: int):
+        mm = self._maps.pop(segment, None)
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                # views returned by `fetch_content_view` are still alive, the map
+                # is released with them
+                pass
+
+    def __contains__(self, id):
+        return id in self._index
+
+    def get(self, id):
+        """Get a chunk by id"""
+        with self._lock:
+            segment, offset, json_len, _ = self._index[id]
+            start = offset + _RECORD.size + len(id.encode())
+            data = json.loads(bytes(self._view(segment, start, json_len)))
+
+        # internal attributes
+        _id = data.pop("id")
+        _history = data.pop("history", None)
+        chunk = Chunk(**data)
+
+        # fill the history
+        if _history:
+            chunk._history = _history
+        chunk.store = self
+        chunk.id = _id
+        return chunk
+
+    def fetch_content_view(self, chunk: Chunk) -> memoryview | None:
+        """Zero-copy view of the stored blob of the chunk
+
+        The view is only valid until the store is compacted or closed. With
+        compression, the blob is compressed, and without it, content starting like
+        a compressed blob is framed: use `fetch_content` instead.
+        """
+        with self._lock:
+            loc = self._index.get(chunk.id)
+            if loc is None or not loc[3]:
+                return None
+            segment, offset, json_len, blob_len = loc
+            start = offset + _RECORD.size + len(chunk.id.encode()) + json_len
+            return self._view(segment, start, blob_len)
+
+    def fetch_content(self, chunk: Chunk):
+        view = self.fetch_content_view(chunk)
+        return unpack(bytes(view)) if view is not None else None
+
+    def _save(self, chunk: Chunk):
+        chunk_dict = chunk.asdict()
+        blob = b""
+        if self._compression is not None:
+            packed = self._compression.pack(chunk_dict["content"], chunk.mimetype)
+            if packed is not None:
+                blob = packed
+                chunk_dict.pop("content")
+        elif isinstance(chunk_dict["content"], builtins.bytes):
+            blob = frame_raw(chunk_dict.pop("content"))
+        self._append(_CHUNK, chunk.id, json.dumps(chunk_dict).encode(), blob)
+
+    def save(self, chunk: Chunk):
+        with self._lock:
+            self._save(chunk)
+
+    def save_group(self, group: ChunkGroup):
+        """Save the group to the store"""
+        with self._lock:
+            for root, chunks in group.iter_groups():
+                if isinstance(root, Chunk):
+                    self._save(root)
+                for chunk in chunks:
+                    self._save(chunk)
+            self._writer.flush()
+            self._dirty = False
+
+    def ids(self) -> Iterable[str]:
+        with self._lock:
+            return list(self._index)
+
+    def delete_many(self, ids: Iterable[str]):
+        with self._lock:
+            for id in ids:
+                if id in self._index:
+                    self._append(_TOMBSTONE, id)
+            compact = self._auto_compact and bool(self._compactable())
+
+        if compact:
+            self.compact(background=True)
+
+    def _compactable(self) -> list[int]:
+        """Sealed segments with more garbage than the compaction ratio"""
+        return [
+            segment
+            for segment, size in self._sizes.items()
+            if segment != self._active
+            and size
+            and self._garbage.get(segment, 0) / size > self._compact_ratio
+        ]
+
+    def compact(self, background: bool = False):
+        """Rewrite the live records of the segments with too much garbage
+
+        Args:
+            background: run the compaction in a background thread
+        """
+        if background:
+            with self._lock:
+                if self._compactor is not None and self._compactor.is_alive():
+                    return
+                self._compactor = threading.Thread(target=self.compact, daemon=True)
+                self._compactor.start()
+            return
+
+        with self._lock:
+            for segment in self._compactable():
+                self._compact_segment(segment)
+            self._write_index()
+
+    def _compact_segment(self, segment: int):
+        """Copy the live records of `segment` to the active segment, and remove it"""
+        has_older = any(seg < segment for seg in self._sizes)
+        offset, size = 0, self._sizes[segment]
+        while offset < size:
+            header = self._view(segment, offset, _RECORD.size)
+            kind, id_len, json_len, blob_len = _RECORD.unpack(header)
+            start = offset + _RECORD.size
+            id = bytes(self._view(segment, start, id_len)).decode()
+            if kind == _CHUNK and self._index.get(id, (None, None))[:2] == (
+                segment,
+                offset,
+            ):
+                record = bytes(self._view(segment, start + id_len, json_len + blob_len))
+                self._append(_CHUNK, id, record[:json_len], record[json_len:])
+            elif kind == _TOMBSTONE and has_older and id not in self._index:
+                # the tombstone still hides a record in an older segment
+                self._append(_TOMBSTONE, id)
+            offset = start + id_len + json_len + blob_len
+
+        self._writer.flush()
+        self._dirty = False
+        self._unmap(segment)
+        self._segment_path(segment).unlink()
+        self._sizes.pop(segment)
+        self._garbage.pop(segment)
+
+    def _write_index(self):
+        index_path = self._path / "index.json"
+        tmp_path = self._path / "index.json.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "records": self._index,
+                    "sizes": self._sizes,
+                    "garbage": self._garbage,
+                },
+                f,
+            )
+        os.replace(tmp_path, index_path)
+
+    def flush(self):
+        """Flush the pending writes and persist the index"""
+        with self._lock:
+            self._writer.flush()
+            self._dirty = False
+            self._write_index()
+
+    def close(self):
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self.flush()
+            self._writer.close()
+            for segment in list(self._maps):
+                self._unmap(segment)
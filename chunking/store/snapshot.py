@@ -0,0 +1,211 @@
+import builtins
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable
+
+from chunking.base import BaseStore, Chunk
+
+# Header: magic, version, number of chunks, offset and number of slots of the table
+_MAGIC = b"CSNP"
+_VERSION = 1
+_HEADER = struct.Struct("<4sB3xQQQ")
+# Record: id length, JSON length, blob length, then id, JSON and blob bytes
+_RECORD = struct.Struct("<HIQ")
+# Slot of the hash table: hash of the id, offset of the record + 1 (0 is empty)
+_SLOT = struct.Struct("<QQ")
+
+
+def _hash(id: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(id.encode(), digest_size=8).digest(), "little"
+    )
+
+
+class SnapshotStore(BaseStore):
+    """Read-only chunk store backed by a memory-mapped snapshot file
+
+    The snapshot is written once with `SnapshotStore.export`, then any number of
+    processes can open it: the file is mapped read-only, so the pages are shared
+    by the processes through the OS page cache instead of being copied into each
+    of them. Opening only reads the header, the ids are looked up in an on-disk
+    hash table, so the time to open doesn't depend on the number of chunks.
+
+    `fetch_content_view` returns zero-copy views of the bytes content. Pickling the
+    store pickles its path, so it can be sent to worker processes.
+
+    Args:
+        path: the snapshot file
+    """
+
+    def __init__(self, path: str | Path):
+        self._path = Path(path).resolve()
+        with open(self._path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._n_chunks, self._table, self._n_slots = (
+            _HEADER.unpack_from(self._map, 0)
+        )
+        if magic != _MAGIC:
+            raise ValueError(f"Not a chunk snapshot: {self._path}")
+        if version != _VERSION:
+            raise ValueError(f"Unsupported snapshot version: {version}")
+        self._view = memoryview(self._map)
+
+    @classmethod
+    def export(
+        cls, path: str | Path, chunks: "BaseStore | Iterable[Chunk]"
+    ) -> "SnapshotStore":
+        """Write the chunks to a snapshot file, and open it
+
+        Args:
+            path: the snapshot file, replaced if it exists
+            chunks: the chunks to write, or a store to write all the chunks of
+        """
+        if isinstance(chunks, BaseStore):
+            chunks = chunks._iter_many(list(chunks.ids()))
+
+        path = Path(path).resolve()
+        tmp_path = path.with_name(path.name + ".tmp")
+        hashes, offsets = array("Q"), array("Q")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0, 0))
+            offset = _HEADER.size
+            for chunk in chunks:
+                chunk_dict = chunk.asdict()
+                blob = b""
+                if isinstance(chunk_dict["content"], builtins.bytes):
+                    blob = chunk_dict.pop("content")
+                id_bytes = chunk.id.encode()
+                data = json.dumps(chunk_dict).encode()
+                f.write(_RECORD.pack(len(id_bytes), len(data), len(blob)))
+                f.write(id_bytes)
+                f.write(data)
+                f.write(blob)
+
+                hashes.append(_hash(chunk.id))
+                offsets.append(offset)
+                offset += _RECORD.size + len(id_bytes) + len(data) + len(blob)
+
+            # open addressing with linear probing, at most half full
+            n_slots = 1
+            while n_slots < 2 * len(hashes):
+                n_slots *= 2
+            table = array("Q", bytes(_SLOT.size * n_slots))
+            mask = n_slots - 1
+            for h, record in zip(hashes, offsets):
+                slot = h & mask
+                while table[2 * slot + 1]:
+                    slot = (slot + 1) & mask
+                table[2 * slot] = h
+                table[2 * slot + 1] = record + 1
+
+            if sys.byteorder == "big":
+                table.byteswap()
+            f.write(table.tobytes())
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(hashes), offset, n_slots))
+
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def __reduce__(self):
+        return (self.__class__, (self._path,))
+
+    def __len__(self) -> int:
+        return self._n_chunks
+
+    def __bool__(self) -> bool:
+        # an empty snapshot is still a store
+        return True
+
+    def _find(self, id: str) -> int | None:
+        """The offset of the record of `id`, None if missing"""
+        h = _hash(id)
+        mask = self._n_slots - 1
+        slot = h & mask
+        id_bytes = id.encode()
+        while True:
+            slot_hash, record = _SLOT.unpack_from(
+                self._map, self._table + slot * _SLOT.size
+            )
+            if not record:
+                return None
+            if slot_hash == h:
+                offset = record - 1
+                id_len = _RECORD.unpack_from(self._map, offset)[0]
+                start = offset + _RECORD.size
+                if self._view[start : start + id_len] == id_bytes:
+                    return offset
+            slot = (slot + 1) & mask
+
+    def __contains__(self, id):
+        return self._find(id) is not None
+
+    def _load(self, offset: int) -> Chunk:
+        id_len, json_len, _ = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size + id_len
+        data = json.loads(self._view[start : start + json_len].tobytes())
+
+        # internal attributes
+        _id = data.pop("id")
+        _history = data.pop("history", None)
+        chunk = Chunk(**data)
+
+        # fill the history
+        if _history:
+            chunk._history = _history
+        chunk.store = self
+        chunk.id = _id
+        return chunk
+
+    def get(self, id):
+        """Get a chunk by id"""
+        offset = self._find(id)
+        if offset is None:
+            raise KeyError(id)
+        return self._load(offset)
+
+    def ids(self) -> Iterable[str]:
+        offset = _HEADER.size
+        while offset < self._table:
+            id_len, json_len, blob_len = _RECORD.unpack_from(self._map, offset)
+            start = offset + _RECORD.size
+            yield self._view[start : start + id_len].tobytes().decode()
+            offset = start + id_len + json_len + blob_len
+
+    def fetch_content_view(self, chunk: Chunk) -> memoryview | None:
+        """Zero-copy view of the bytes content of the chunk, valid until the store
+        is closed"""
+        offset = self._find(chunk.id)
+        if offset is None:
+            return None
+        id_len, json_len, blob_len = _RECORD.unpack_from(self._map, offset)
+        if not blob_len:
+            return None
+        start = offset + _RECORD.size + id_len + json_len
+        return self._view[start : start + blob_len]
+
+    def fetch_content(self, chunk: Chunk):
+        view = self.fetch_content_view(chunk)
+        return view.tobytes() if view is not None else None
+
+    def save(self, chunk: Chunk):
+        raise NotImplementedError("SnapshotStore is read-only")
+
+    def delete_many(self, ids: Iterable[str]):
+        raise NotImplementedError("SnapshotStore is read-only")
+
+    def close(self):
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            # views returned by `fetch_content_view` are still alive, the map is
+            # released with them
+            pass
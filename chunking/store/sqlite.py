@@ -0,0 +1,383 @@
+import builtins
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable
+
+from chunking.base import BaseStore, Chunk, ChunkGroup
+from chunking.store.codec import Compression, frame_raw, unpack
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    root TEXT,
+    parent TEXT,
+    child TEXT,
+    next TEXT,
+    prev TEXT,
+    mimetype TEXT,
+    ctype TEXT,
+    page,
+    content TEXT,
+    blob TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_root_ctype ON chunks(root, ctype);
+CREATE INDEX IF NOT EXISTS chunks_parent ON chunks(parent);
+CREATE INDEX IF NOT EXISTS chunks_ctype ON chunks(ctype);
+CREATE INDEX IF NOT EXISTS chunks_mimetype ON chunks(mimetype);
+CREATE INDEX IF NOT EXISTS chunks_page ON chunks(page);
+CREATE INDEX IF NOT EXISTS chunks_blob ON chunks(blob);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    content BLOB NOT NULL
+);
+"""
+
+_COLUMNS = (
+    "id, root, parent, child, next, prev, mimetype, ctype, page, content, blob, data"
+)
+
+# SQLite limits the number of host parameters in a statement
+_BATCH = 500
+
+
+def _indexable(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class SQLiteStore(BaseStore):
+    """SQLite-backed chunk store
+
+    The relations, mimetype, ctype, page and root of each chunk are indexed
+    columns, the other fields are stored as JSON, and bytes content is kept in a
+    separate blob table that is only read by `fetch_content`. `save_group` writes
+    the whole group in a single transaction. `query` is answered from the indexes,
+    metadata filters are checked on the JSON of the rows selected by the others.
+
+    Blobs are content-addressed: identical content is stored once, and each chunk
+    row holds the hash of its blob. The indexed `blob` column counts the references
+    of each blob, and a blob is removed with the last chunk that refers to it.
+
+    Args:
+        path: path to the database file, or ":memory:"
+        compression: compress the blobs, and store large str content as blobs
+    """
+
+    def __init__(self, path: str | Path, compression: Compression | None = None):
+        self._path = str(path) if str(path) == ":memory:" else str(Path(path).resolve())
+        if self._path != ":memory:":
+            Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._compression = compression
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __contains__(self, id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM chunks WHERE id = ?", (id,)
+            ).fetchone()
+        return row is not None
+
+    def _to_chunk(self, row: tuple) -> Chunk:
+        id, _, parent, child, next, prev, mimetype, ctype, _, content, _, data = row
+        data = json.loads(data)
+        _history = data.pop("history", None)
+        chunk = Chunk(
+            mimetype=mimetype,
+            ctype=ctype,
+            content=json.loads(content) if content is not None else None,
+            parent=parent,
+            child=child,
+            next=next,
+            prev=prev,
+            **data,
+        )
+
+        # fill the history
+        if _history:
+            chunk._history = _history
+        chunk.store = self
+        chunk.id = id
+        return chunk
+
+    def get(self, id):
+        """Get a chunk by id"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM chunks WHERE id = ?", (id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(id)
+        return self._to_chunk(row)
+
+    def get_many(self, ids: Iterable[str]) -> list[Chunk]:
+        """Get the chunks of `ids` in as few queries as possible
+
+        Returns:
+            the chunks in the order of `ids`, missing ids are skipped
+        """
+        ids = list(ids)
+        rows = {}
+        with self._lock:
+            for start in range(0, len(ids), _BATCH):
+                batch = ids[start : start + _BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for row in self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM chunks WHERE id IN ({placeholders})",
+                    batch,
+                ):
+                    rows[row[0]] = row
+        return [self._to_chunk(rows[id]) for id in ids if id in rows]
+
+    def _children(self, parent_ids: list[str]) -> list[Chunk]:
+        """The chunks whose parent is in `parent_ids`"""
+        rows = []
+        with self._lock:
+            for start in range(0, len(parent_ids), _BATCH):
+                batch = parent_ids[start : start + _BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(
+                    self._conn.execute(
+                        f"SELECT {_COLUMNS} FROM chunks "
+                        f"WHERE parent IN ({placeholders})",
+                        batch,
+                    )
+                )
+        return [self._to_chunk(row) for row in rows]
+
+    def prefetch(
+        self, id: str, depth: int = 1, breadth: int | None = None
+    ) -> dict[str, Chunk]:
+        """Load a chunk with its descendants and next siblings in bulk
+
+        When all the siblings are requested (`breadth` is None), each level is
+        loaded with a single query on the parent index.
+        """
+        if breadth is not None:
+            return super().prefetch(id, depth, breadth)
+
+        chunks = self.get_many([id])
+        if not chunks:
+            raise KeyError(id)
+        chunk = chunks[0]
+        if chunk.parent_id is not None:
+            chunks = self._children([chunk.parent_id])
+        loaded = {chunk.id: chunk for chunk in chunks}
+        for _ in range(depth):
+            chunks = self._children([chunk.id for chunk in chunks])
+            if not chunks:
+                break
+            loaded.update((chunk.id, chunk) for chunk in chunks)
+
+        self._link(loaded)
+        return loaded
+
+    def fetch_content(self, chunk: Chunk):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blobs.content FROM chunks "
+                "JOIN blobs ON blobs.hash = chunks.blob WHERE chunks.id = ?",
+                (chunk.id,),
+            ).fetchone()
+        return unpack(row[0]) if row is not None else None
+
+    def _root_id(self, chunk: Chunk, roots: dict) -> str | None:
+        """The id of the root of the tree of `chunk`, without loading its ancestors"""
+        path = []
+        node = chunk
+        while isinstance(node, Chunk):
+            if node.id in roots:
+                root_id = roots[node.id]
+                break
+            path.append(node.id)
+            parent = node._parent
+            if isinstance(parent, str):
+                with self._lock:
+                    row = self._conn.execute(
+                        "SELECT root FROM chunks WHERE id = ?", (parent,)
+                    ).fetchone()
+                root_id = row[0] if row is not None and row[0] else parent
+                break
+            if parent is None:
+                root_id = node.id
+                break
+            node = parent
+
+        for id in path:
+            roots[id] = root_id
+        return root_id
+
+    def _rows(self, chunks: Iterable[Chunk], roots: dict) -> tuple[list, dict]:
+        """Convert the chunks to rows of the chunks table
+
+        Returns:
+            the rows of the chunks table, and the blobs by hash
+        """
+        chunk_rows, blobs = [], {}
+        for chunk in chunks:
+            d = chunk.asdict()
+            content = d.pop("content")
+            blob = None
+            if self._compression is not None:
+                blob = self._compression.pack(content, d["mimetype"])
+            elif isinstance(content, builtins.bytes):
+                blob = frame_raw(content)
+
+            blob_hash = None
+            if blob is not None:
+                blob_hash = hashlib.blake2b(blob, digest_size=16).hexdigest()
+                blobs[blob_hash] = blob
+                content = None
+            elif content is not None:
+                content = json.dumps(content)
+
+            chunk_rows.append(
+                (
+                    d.pop("id"),
+                    self._root_id(chunk, roots),
+                    d.pop("parent"),
+                    d.pop("child"),
+                    d.pop("next"),
+                    d.pop("prev"),
+                    d.pop("mimetype"),
+                    d.pop("ctype"),
+                    page if _indexable(page := chunk.page) else None,
+                    content,
+                    blob_hash,
+                    json.dumps(d),
+                )
+            )
+        return chunk_rows, blobs
+
+    def _blob_hashes(self, ids: list[str]) -> set[str]:
+        """The hashes of the blobs referred to by `ids`"""
+        hashes = set()
+        for start in range(0, len(ids), _BATCH):
+            batch = ids[start : start + _BATCH]
+            placeholders = ",".join("?" * len(batch))
+            for (blob_hash,) in self._conn.execute(
+                f"SELECT blob FROM chunks WHERE id IN ({placeholders}) "
+                "AND blob IS NOT NULL",
+                batch,
+            ):
+                hashes.add(blob_hash)
+        return hashes
+
+    def _release_blobs(self, hashes: Iterable[str]):
+        """Remove the blobs that are no longer referred to"""
+        self._conn.executemany(
+            "DELETE FROM blobs WHERE hash = ? "
+            "AND NOT EXISTS (SELECT 1 FROM chunks WHERE blob = ?)",
+            [(blob_hash, blob_hash) for blob_hash in hashes],
+        )
+
+    def _write(self, chunks: Iterable[Chunk], roots: dict | None = None):
+        chunk_rows, blobs = self._rows(chunks, roots or {})
+        with self._lock, self._conn:
+            previous = self._blob_hashes([row[0] for row in chunk_rows])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO blobs (hash, content) VALUES (?, ?)",
+                blobs.items(),
+            )
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO chunks ({_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                chunk_rows,
+            )
+            self._release_blobs(previous - blobs.keys())
+
+    def save(self, chunk: Chunk):
+        self._write([chunk])
+
+    def save_group(self, group: ChunkGroup):
+        """Save the group to the store in a single transaction"""
+        chunks, roots = [], {}
+        for root, group_chunks in group.iter_groups():
+            if isinstance(root, Chunk):
+                chunks.append(root)
+                roots[root.id] = root.id
+            chunks.extend(group_chunks)
+        self._write(chunks, roots)
+
+    def ids(self) -> Iterable[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM chunks")]
+
+    def delete_many(self, ids: Iterable[str]):
+        ids = list(ids)
+        with self._lock, self._conn:
+            previous = self._blob_hashes(ids)
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?", [(id,) for id in ids]
+            )
+            self._release_blobs(previous)
+
+    def _descendant_ids(self, chunk: Chunk) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "WITH RECURSIVE subtree(id) AS ("
+                "SELECT id FROM chunks WHERE parent = ? "
+                "UNION SELECT chunks.id FROM chunks "
+                "JOIN subtree ON chunks.parent = subtree.id"
+                ") SELECT id FROM subtree",
+                (chunk.id,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _query(self, root_id, ctype, page, metadata):
+        clauses, params = [], []
+        # a page that can't be stored in the page column is stored as NULL, the
+        # chunks are then matched on their page once loaded
+        indexed_page = page if _indexable(page) else None
+        for column, value in (
+            ("root", root_id),
+            ("ctype", ctype),
+            ("page", indexed_page),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        for key, value in metadata.items():
+            path = '$.metadata."' + key.replace('"', '\\"') + '"'
+            if value is None:
+                clauses.append("json_type(data, ?) = 'null'")
+                params.append(path)
+            elif isinstance(value, (list, dict)):
+                clauses.append("json_extract(data, ?) = json(?)")
+                params.extend([path, json.dumps(value)])
+            else:
+                clauses.append("json_extract(data, ?) = ?")
+                params.extend([path, value])
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            ids = [
+                row[0]
+                for row in self._conn.execute(
+                    f"SELECT id FROM chunks{where} ORDER BY rowid", params
+                )
+            ]
+        if page is not None and indexed_page is None:
+            return (
+                chunk
+                for chunk in self._iter_many(ids)
+                if self._matches(chunk, None, page, {})
+            )
+        return self._iter_many(ids)
+
+    def _relations(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, parent, child, next FROM chunks"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
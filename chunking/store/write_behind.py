@@ -0,0 +1,204 @@
+import logging
+import threading
+from typing import Iterable
+
+from chunking.base import BaseStore, Chunk, ChunkGroup
+
+logger = logging.getLogger(__name__)
+
+_SAVE, _DELETE = "save", "delete"
+
+
+class WriteBehindStore(BaseStore):
+    """Queue the writes to a store, and apply them in a background thread
+
+    Repeated writes of the same id are coalesced, so only the latest state of a
+    chunk is written. Queued saves keep a reference to the chunk, so changes made
+    to the chunk before it is flushed are written as well. Reads see the queued
+    writes.
+
+    `flush` waits until every queued write is applied, and `close` flushes then
+    stops the thread. An error raised by the wrapped store in the background is
+    raised again by the next `save`, `delete` or `flush`.
+
+    Args:
+        store: the store to write to
+        max_pending: maximum number of queued writes, `save` blocks when the queue
+            is full
+        batch_size: maximum number of writes applied at once, saves are applied
+            with `store.save_group`
+    """
+
+    def __init__(
+        self, store: BaseStore, max_pending: int = 10000, batch_size: int = 500
+    ):
+        self._store = store
+        self._max_pending = max_pending
+        self._batch_size = batch_size
+
+        # id -> (operation, chunk), in insertion order, deletes have no chunk
+        self._pending: dict[str, tuple[str, Chunk | None]] = {}
+        self._inflight: dict[str, tuple[str, Chunk | None]] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._error: BaseException | None = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def store(self) -> BaseStore:
+        return self._store
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _queued(self, id: str) -> tuple[str, Chunk | None] | None:
+        """The latest queued write of `id`, if any"""
+        with self._cond:
+            return self._pending.get(id) or self._inflight.get(id)
+
+    def _enqueue(self, operation: str, id: str, chunk: Chunk | None = None):
+        with self._cond:
+            if self._closed:
+                raise ValueError("Cannot write to a closed WriteBehindStore")
+            self._raise_error()
+
+            while id not in self._pending and len(self._pending) >= self._max_pending:
+                # back-pressure, wait for the thread to apply the queued writes
+                self._cond.wait()
+                self._raise_error()
+
+            self._pending[id] = (operation, chunk)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+
+                for id in list(self._pending)[: self._batch_size]:
+                    self._inflight[id] = self._pending.pop(id)
+                batch = list(self._inflight.items())
+                self._cond.notify_all()
+
+            try:
+                saves = [chunk for _, (op, chunk) in batch if op == _SAVE]
+                if saves:
+                    self._store.save_group(ChunkGroup(saves))
+                deletes = [id for id, (op, _) in batch if op == _DELETE]
+                if deletes:
+                    self._store.delete_many(deletes)
+            except BaseException as e:
+                logger.error(f"Failed to write {len(batch)} chunks: {e}")
+                with self._cond:
+                    self._error = e
+
+            with self._cond:
+                self._inflight.clear()
+                self._cond.notify_all()
+
+    def __contains__(self, id):
+        queued = self._queued(id)
+        if queued is not None:
+            return queued[0] == _SAVE
+        return id in self._store
+
+    def get(self, id):
+        queued = self._queued(id)
+        if queued is None:
+            chunk = self._store.get(id)
+            # load the relations through the queue
+            chunk.store = self
+            return chunk
+        if queued[0] == _DELETE:
+            raise KeyError(id)
+        return queued[1]
+
+    def get_many(self, ids: Iterable[str]) -> list[Chunk]:
+        ids = list(ids)
+        queued = {id: self._queued(id) for id in ids}
+        stored = {
+            chunk.id: chunk
+            for chunk in self._store.get_many([id for id in ids if queued[id] is None])
+        }
+
+        result = []
+        for id in ids:
+            if queued[id] is None:
+                if id in stored:
+                    stored[id].store = self
+                    result.append(stored[id])
+            elif queued[id][0] == _SAVE:
+                result.append(queued[id][1])
+        return result
+
+    def fetch_content(self, chunk: Chunk):
+        queued = self._queued(chunk.id)
+        if queued is not None and queued[0] == _SAVE and queued[1] is not chunk:
+            return queued[1].content
+        return self._store.fetch_content(chunk)
+
+    def save(self, chunk: Chunk):
+        self._enqueue(_SAVE, chunk.id, chunk)
+
+    def save_group(self, group: ChunkGroup):
+        for root, chunks in group.iter_groups():
+            if isinstance(root, Chunk):
+                self._enqueue(_SAVE, root.id, root)
+            for chunk in chunks:
+                self._enqueue(_SAVE, chunk.id, chunk)
+
+    def ids(self) -> Iterable[str]:
+        self.flush()
+        return self._store.ids()
+
+    def delete_many(self, ids: Iterable[str]):
+        for id in ids:
+            self._enqueue(_DELETE, id)
+
+    def _query(self, root_id, ctype, page, metadata):
+        self.flush()
+        return self._store._query(root_id, ctype, page, metadata)
+
+    def gc(self, roots: Iterable[str] = (), sweep: bool = False) -> list[str]:
+        self.flush()
+        return self._store.gc(roots, sweep)
+
+    def flush(self):
+        """Wait until all the queued writes are applied to the store"""
+        with self._cond:
+            while self._pending or self._inflight:
+                if not self._thread.is_alive():
+                    break
+                self._cond.wait()
+            self._raise_error()
+
+        if hasattr(self._store, "flush"):
+            self._store.flush()
+
+    def close(self):
+        """Flush the queued writes, stop the background thread and close the store"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+        with self._cond:
+            self._raise_error()
+
+        if hasattr(self._store, "close"):
+            self._store.close()
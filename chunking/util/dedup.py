@@ -0,0 +1,47 @@
+from typing import Iterable
+
+from chunking.base import Chunk, CType
+
+
+def dedup_content(
+    roots: Chunk | Iterable[Chunk], seen: dict[str, str] | None = None
+) -> dict[str, str]:
+    """Collapse chunks with identical content across documents
+
+    The first chunk with a given content is kept as the canonical chunk. Each later
+    chunk with the same content shares the content object of the canonical chunk,
+    and is marked with `metadata["duplicate_of"]` set to the canonical chunk id, so
+    that downstream work (e.g. embedding) can skip it.
+
+    Args:
+        roots: the chunk trees to deduplicate
+        seen: mapping of content hash to canonical chunk id from previous runs, it
+            is updated in place so that it can be persisted and reused
+
+    Returns:
+        the mapping of content hash to canonical chunk id
+    """
+    if isinstance(roots, Chunk):
+        roots = [roots]
+    if seen is None:
+        seen = {}
+
+    contents = {}
+    for root in roots:
+        for _, chunk in root.walk(include_siblings=False):
+            if chunk.ctype == CType.Root or not chunk.content:
+                continue
+
+            digest = chunk.content_hash()
+            canonical_id = seen.setdefault(digest, chunk.id)
+            if canonical_id == chunk.id:
+                contents.setdefault(digest, chunk.content)
+                continue
+
+            if digest in contents:
+                chunk.content = contents[digest]
+            else:
+                contents[digest] = chunk.content
+            chunk.metadata["duplicate_of"] = canonical_id
+
+    return seen
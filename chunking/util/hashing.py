@@ -0,0 +1,191 @@
+"""Hash files in blocks, and skip the files that didn't change since last time
+
+The digest of a file is computed from fixed size blocks, so the memory doesn't
+depend on the file size. A `HashCache` remembers the digests by path, keyed by the
+inode, size and modification time of the file, so an unchanged file is hashed once
+across runs.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# A file modified less than this many nanoseconds before it is hashed might still
+# be modified within the same mtime tick, so its digest isn't cached
+_RACY_NS = 2_000_000_000
+
+_HASHERS: dict[str, Callable] = {}
+if blake3 is not None:
+    _HASHERS["blake3"] = blake3.blake3
+if xxhash is not None:
+    _HASHERS["xxh3_128"] = xxhash.xxh3_128
+    _HASHERS["xxh64"] = xxhash.xxh64
+
+
+def register_hasher(name: str, factory: Callable):
+    """Register a hash algorithm
+
+    Args:
+        name: the name of the algorithm
+        factory: returns a new hash object, with the `update` and `hexdigest`
+            methods of `hashlib` objects
+    """
+    _HASHERS[name] = factory
+
+
+def available_hashers() -> list[str]:
+    """The names of the algorithms that can be used to hash files"""
+    return sorted(set(_HASHERS) | hashlib.algorithms_available)
+
+
+def _new_hasher(algorithm: str):
+    if algorithm in _HASHERS:
+        return _HASHERS[algorithm]()
+    try:
+        return hashlib.new(algorithm)
+    except ValueError:
+        raise ValueError(
+            f"Unknown hash algorithm: {algorithm}. Available: {available_hashers()}"
+        ) from None
+
+
+class HashCache:
+    """Digests of files, valid while the inode, size and mtime of the file are the
+    same
+
+    Args:
+        path: the SQLite database to keep the digests across runs, None to keep
+            them in memory
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self._path = Path(path).resolve() if path is not None else None
+        if self._path is not None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._entries: dict[tuple[str, str], tuple[int, int, int, str]] = {}
+        self._lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def __reduce__(self):
+        return (self.__class__, (self._path,))
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # a forked process opens its own connection
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(
+                self._path, timeout=60, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes (path TEXT, algorithm TEXT, "
+                "inode INTEGER, size INTEGER, mtime INTEGER, digest TEXT, "
+                "PRIMARY KEY (path, algorithm))"
+            )
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, path: str, algorithm: str, stat: os.stat_result) -> str | None:
+        """The cached digest of the file, None if missing or outdated"""
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if self._path is None:
+                entry = self._entries.get((path, algorithm))
+            else:
+                entry = self._db.execute(
+                    "SELECT inode, size, mtime, digest FROM hashes "
+                    "WHERE path = ? AND algorithm = ?",
+                    (path, algorithm),
+                ).fetchone()
+        if entry is None or tuple(entry[:3]) != signature:
+            return None
+        return entry[3]
+
+    def put(self, path: str, algorithm: str, stat: os.stat_result, digest: str):
+        if time.time_ns() - stat.st_mtime_ns < _RACY_NS:
+            return
+        entry = (stat.st_ino, stat.st_size, stat.st_mtime_ns, digest)
+        with self._lock:
+            if self._path is None:
+                self._entries[(path, algorithm)] = entry
+                return
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, algorithm, *entry),
+                )
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._path is None:
+                return len(self._entries)
+            return self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._path is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM hashes")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+def hash_file(
+    path: str | Path,
+    algorithm: str = "sha256",
+    block_size: int = 1 << 20,
+    cache: HashCache | None = None,
+) -> str:
+    """The hex digest of the file content
+
+    Args:
+        path: the file
+        algorithm: a `hashlib` algorithm, or one of `available_hashers`
+        block_size: the number of bytes read at a time
+        cache: reuse the digest of the file if it didn't change
+    """
+    path = str(Path(path).resolve())
+    stat = os.stat(path)
+    if cache is not None:
+        digest = cache.get(path, algorithm, stat)
+        if digest is not None:
+            return digest
+
+    hasher = _new_hasher(algorithm)
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while n := f.readinto(buffer):
+            hasher.update(view[:n])
+        after = os.fstat(f.fileno())
+    digest = hasher.hexdigest()
+
+    unchanged = (after.st_ino, after.st_size, after.st_mtime_ns) == (
+        stat.st_ino,
+        stat.st_size,
+        stat.st_mtime_ns,
+    )
+    if cache is not None and unchanged:
+        cache.put(path, algorithm, stat, digest)
+    return digest
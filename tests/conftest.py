@@ -0,0 +1,32 @@
+import pytest
+
+from chunking.base import Chunk, CType
+from chunking.mime import MimeType
+
+
+def _build_tree(
+    *contents: str, image: bool = False, footer: str | None = "Footer"
+) -> Chunk:
+    """root -> [header -> [a paragraph per content, image], footer]"""
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    header = Chunk(mimetype=MimeType.text, ctype=CType.Header, content="Title")
+    children = [
+        Chunk(mimetype=MimeType.text, ctype=CType.Para, content=content)
+        for content in contents or ("Para 1", "Para 2")
+    ]
+    if image:
+        children.append(
+            Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=b"\x89PNG")
+        )
+    header.add_children(children)
+    sections = [header]
+    if footer is not None:
+        sections.append(Chunk(mimetype=MimeType.text, ctype=CType.Para, content=footer))
+    root.add_children(sections)
+    return root
+
+
+@pytest.fixture
+def build_tree():
+    """Build a small document tree, see `_build_tree`"""
+    return _build_tree
@@ -0,0 +1,88 @@
+from chunking.arena import NIL, ChunkArena
+from chunking.base import Chunk, CType
+from chunking.mime import MimeType
+
+
+def test_from_chunk(build_tree):
+    root = build_tree()
+    arena = ChunkArena.from_chunk(root)
+
+    assert len(arena) == 5
+    assert arena.ids == root.get_ids()
+    assert list(arena.parent) == [NIL, 0, 1, 1, 0]
+    assert list(arena.child) == [1, 2, NIL, NIL, NIL]
+    assert list(arena.next) == [NIL, 4, 3, NIL, NIL]
+    assert list(arena.prev) == [NIL, NIL, NIL, 2, 1]
+    assert [depth for depth, _ in arena.walk()] == [0, 1, 2, 2, 1]
+
+
+def test_to_chunk_roundtrip(build_tree):
+    root = build_tree()
+    restored = ChunkArena.from_chunk(root).to_chunk()
+
+    assert restored.get_ids() == root.get_ids()
+    assert restored.render() == root.render()
+    assert restored.child.child.next.parent is restored.child
+
+
+def test_bytes_roundtrip(build_tree):
+    root = build_tree()
+    image = Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=b"\x89PNG\0")
+    root.child.next.add_children(image)
+    root.child.metadata["page"] = 1
+
+    restored = Chunk.from_bytes(root.to_bytes())
+
+    assert restored.get_ids() == root.get_ids()
+    assert restored.render() == root.render()
+    assert restored.child.metadata == {"page": 1}
+    assert restored.find(id=image.id).content == b"\x89PNG\0"
+    assert restored.child.child.next.parent is restored.child
+
+
+def test_pickle_keeps_tree(build_tree):
+    import pickle
+
+    root = build_tree()
+    para2 = root.child.child.next
+
+    restored = pickle.loads(pickle.dumps(para2))
+
+    assert restored.id == para2.id
+    assert restored.prev.content == "Para 1"
+    assert restored.parent.parent.get_ids() == root.get_ids()
+
+
+def test_pickle_shares_tree():
+    import pickle
+
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    paras = [
+        Chunk(ctype=CType.Para, content=f"Para {i}", metadata={"page": i})
+        for i in range(1000)
+    ]
+    root.add_children(paras)
+
+    data = pickle.dumps(paras)
+    restored = pickle.loads(data)
+
+    # the tree is written once, not once per chunk
+    assert len(data) < 2 * len(root.to_bytes())
+    assert restored[0].parent is restored[1].parent
+    assert restored[0].next is restored[1]
+    assert restored[5].metadata == {"page": 5}
+    assert not any(para._shared for para in paras)
+
+
+def test_copy_is_shallow(build_tree):
+    import copy
+
+    root = build_tree()
+    para1 = root.child.child
+
+    copied = copy.copy(para1)
+
+    assert copied is not para1
+    assert copied.id == para1.id
+    assert copied.parent is root.child
+    assert copied.next is para1.next
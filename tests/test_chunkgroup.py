@@ -1,6 +1,6 @@
 import pytest
 
-from chunking.base import Chunk, ChunkGroup
+from chunking.base import Chunk, ChunkGroup, LazyChunkGroup
 from chunking.mime import MimeType
 
 
@@ -117,3 +117,83 @@ def test_iter():
     group = ChunkGroup(chunks)
     for idx, chunk in enumerate(group):
         assert chunk.id == chunks[idx].id
+
+
+def test_index_and_slice_across_groups():
+    root1 = Chunk(mimetype=MimeType.text, text="root1")
+    root2 = Chunk(mimetype=MimeType.text, text="root2")
+    chunks = [Chunk(mimetype=MimeType.text, text=str(i)) for i in range(5)]
+
+    group = ChunkGroup(chunks[:2], root=root1)
+    group.add_group(ChunkGroup(root=root2))
+    group.groups[root2.id].extend(chunks[2:])
+
+    assert len(group) == 5
+    assert [group[i].text for i in range(5)] == ["0", "1", "2", "3", "4"]
+    assert group[-1] is chunks[4]
+    with pytest.raises(IndexError):
+        group[5]
+
+    sliced = group[1:4]
+    assert [ch.text for ch in sliced] == ["1", "2", "3"]
+    assert [(root.id, len(chs)) for root, chs in sliced.iter_groups()] == [
+        (root1.id, 1),
+        (root2.id, 2),
+    ]
+    assert [ch.text for ch in group[::-2]] == ["4", "2", "0"]
+
+
+def test_lazy_group_pulls_on_demand():
+    pulled = []
+
+    def source():
+        for i in range(3):
+            pulled.append(i)
+            yield Chunk(mimetype=MimeType.text, text=str(i))
+
+    group = LazyChunkGroup(source())
+    assert group[1].text == "1"
+    assert pulled == [0, 1]
+    assert [ch.text for ch in group] == ["0", "1", "2"]
+    assert len(group) == 3 and group.exhausted
+
+    stream = LazyChunkGroup(source(), cache=False)
+    assert [ch.text for ch in stream] == ["0", "1", "2"]
+    assert list(stream) == []
+    with pytest.raises(TypeError):
+        len(stream)
+
+
+def test_pickle_group():
+    import pickle
+
+    root = Chunk(mimetype=MimeType.text, text="root")
+    chunks = [Chunk(mimetype=MimeType.text, text=str(i)) for i in range(3)]
+    root.add_children(chunks)
+    group = ChunkGroup(chunks[:2], root=root)
+    group.append(Chunk(mimetype=MimeType.text, text="other"))
+
+    restored = pickle.loads(pickle.dumps(group))
+
+    assert [ch.text for ch in restored] == ["0", "1", "other"]
+    assert restored[0].parent is restored[1].parent
+    restored.append(Chunk(mimetype=MimeType.text, text="new"))
+    assert restored[-1].text == "new" and len(restored) == 4
+    assert pickle.loads(pickle.dumps(ChunkGroup([Chunk()])))[0] is not None
+
+
+def test_pickle_lazy_group():
+    import pickle
+
+    def source():
+        for i in range(3):
+            yield Chunk(mimetype=MimeType.text, text=str(i))
+
+    group = LazyChunkGroup(source())
+    assert group[0].text == "0"
+
+    restored = pickle.loads(pickle.dumps(group))
+
+    assert not restored.exhausted
+    assert [ch.text for ch in restored] == ["0", "1", "2"]
+    assert [ch.text for ch in group] == ["0", "1", "2"]
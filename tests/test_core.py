@@ -1,3 +1,7 @@
+import sys
+
+import pytest
+
 from chunking.base import Chunk, CType
 from chunking.mime import MimeType
 
@@ -282,3 +286,352 @@ class TestChunkCleanUnwrapSingleChild:
         # Since keys are the same, only the last value will be preserved
         assert great_grandparent.metadata == {"level": "child"}
         assert great_grandparent.child is None
+
+
+class TestChunkCompact:
+    """Test the compact representation of Chunk"""
+
+    def test_no_instance_dict(self):
+        chunk = Chunk(mimetype=MimeType.text, content="hello")
+        assert not hasattr(chunk, "__dict__")
+
+    def test_lazy_metadata_and_history(self):
+        chunk = Chunk(mimetype=MimeType.text, content="hello")
+        assert chunk._metadata is None
+        assert chunk._history is None
+        assert chunk.asdict()["metadata"] == {}
+
+        chunk.metadata["key"] = "value"
+        chunk.history.append("op")
+        assert chunk.metadata == {"key": "value"}
+        assert chunk.history == ["op"]
+
+    def test_interned_strings(self):
+        chunk1 = Chunk(mimetype="".join(["text/", "csv"]), ctype="".join(["pa", "ra"]))
+        chunk2 = Chunk(mimetype="".join(["text/", "csv"]), ctype="".join(["pa", "ra"]))
+        assert chunk1.mimetype is chunk2.mimetype
+        assert chunk1.ctype is chunk2.ctype
+
+
+def _nodes(root):
+    """root, header, para1, para2 and footer of `build_tree()`"""
+    header = root.child
+    return root, header, header.child, header.child.next, header.next
+
+
+class TestChunkTraverse:
+    """Test the iterative traversal of the chunk tree"""
+
+    def test_pre_order(self, build_tree):
+        root, header, para1, para2, footer = _nodes(build_tree())
+        assert list(root.traverse()) == [
+            (0, root),
+            (1, header),
+            (2, para1),
+            (2, para2),
+            (1, footer),
+        ]
+
+    def test_post_order(self, build_tree):
+        root, header, para1, para2, footer = _nodes(build_tree())
+        assert list(root.traverse(order="post")) == [
+            (2, para1),
+            (2, para2),
+            (1, header),
+            (1, footer),
+            (0, root),
+        ]
+
+    def test_include_siblings(self, build_tree):
+        _, header, para1, para2, footer = _nodes(build_tree())
+        assert [ch for _, ch in header.traverse()] == [header, para1, para2]
+        assert [ch for _, ch in header.walk()] == [header, para1, para2, footer]
+
+    def test_ctype_filter(self, build_tree):
+        root, _, para1, para2, footer = _nodes(build_tree())
+        assert root.find_all(ctype=CType.Para) == [para1, para2, footer]
+        assert root.find(ctype=CType.Para) is para1
+        assert [ch for _, ch in root.traverse(ctype=[CType.Root, CType.Header])] == [
+            root,
+            root.child,
+        ]
+
+    def test_deep_tree(self):
+        root = node = Chunk(mimetype=MimeType.text)
+        for _ in range(5000):
+            child = Chunk(mimetype=MimeType.text)
+            node.add_children(child)
+            node = child
+        node.content = "leaf"
+
+        assert len(root.get_ids()) == 5001
+        assert root.find(id=node.id) is node
+
+        # Each empty chunk has a single child, so the whole chain is unwrapped
+        root.clean()
+        assert root.content == "leaf"
+        assert root.child is None
+
+
+class TestChunkRenderCache:
+    """Test the render cache and its invalidation"""
+
+    def test_cached(self, build_tree):
+        root, header, *_ = _nodes(build_tree())
+        rendered = root.render(format="markdown")
+        assert rendered == "# Title\n\nPara 1\n\nPara 2\n\nFooter"
+        assert root.render(format="markdown") is rendered
+        assert header.render(format="markdown") == "# Title\n\nPara 1\n\nPara 2"
+        assert root.render() == "Title\n\nPara 1\n\nPara 2\n\nFooter"
+
+    def test_invalidate_on_content_change(self, build_tree):
+        root, _, _, para2, _ = _nodes(build_tree())
+        root.render()
+        para2.content = "Changed"
+        assert root.render() == "Title\n\nPara 1\n\nChanged\n\nFooter"
+        para2.text = "Text"
+        assert root.render() == "Title\n\nPara 1\n\nText\n\nFooter"
+
+    def test_invalidate_on_relation_change(self, build_tree):
+        root, header, para1, para2, footer = _nodes(build_tree())
+        root.render()
+        para1.add_children(Chunk(mimetype=MimeType.text, content="inline"))
+        assert root.render() == "Title\n\nPara 1 inline\n\nPara 2\n\nFooter"
+
+        para2.next = Chunk(mimetype=MimeType.text, ctype=CType.Para, content="Extra")
+        assert root.render() == ("Title\n\nPara 1 inline\n\nPara 2\n\nExtra\n\nFooter")
+
+        header.next = None
+        assert root.render() == "Title\n\nPara 1 inline\n\nPara 2\n\nExtra"
+
+    def test_deep_tree(self):
+        root = node = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+        for idx in range(sys.getrecursionlimit() + 100):
+            child = Chunk(mimetype=MimeType.text, ctype=CType.Para, content=str(idx))
+            node.add_children(child)
+            node = child
+
+        assert root.render().endswith(f"\n\n{node.content}")
+        assert root.render(format="markdown") == root.render()
+        assert root.render(format="multi") == [root.render()]
+
+        node.content = "leaf"
+        assert root.render().endswith("\n\nleaf")
+
+
+class TestChunkRenderIter:
+    """Test the streaming render"""
+
+    def test_same_as_render(self, build_tree):
+        root, header, para1, _, _ = _nodes(build_tree())
+        para1.add_children(
+            [
+                Chunk(mimetype=MimeType.text, ctype=CType.List, content="item 1"),
+                Chunk(mimetype=MimeType.text, ctype=CType.List, content="item 2"),
+            ]
+        )
+        header.next.add_children(
+            Chunk(mimetype=MimeType.text, ctype=CType.Code, content="  print()  ")
+        )
+
+        for format in ["plain", "markdown"]:
+            fragments = list(root.render_iter(format=format))
+            assert len(fragments) > 1
+            assert "".join(fragments) == root.render(format=format)
+
+        assert list(root.render_iter(format="multi")) == [
+            "Title",
+            "\n\n",
+            "Para 1",
+            "\n",
+            "item 1",
+            "\n",
+            "item 2",
+            "\n\n",
+            "Para 2",
+            "Footer",
+            "\n\n",
+            "  print()  ",
+        ]
+
+    def test_deep_tree(self):
+        root = node = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+        for idx in range(sys.getrecursionlimit() + 100):
+            ctype = CType.Header if idx % 100 == 0 else CType.Para
+            child = Chunk(mimetype=MimeType.text, ctype=ctype, content=f"{idx} ")
+            node.add_children(child)
+            node = child
+
+        for format in ["plain", "markdown"]:
+            fragments = list(root.render_iter(format=format))
+            assert len(fragments) > 1
+            assert "".join(fragments) == root.render(format=format)
+        assert "".join(root.render_iter(format="multi")) == "".join(
+            root.render(format="multi")
+        )
+
+    def test_early_exit(self, build_tree):
+        root, *_ = _nodes(build_tree())
+        fragments = root.render_iter(format="markdown")
+        assert next(fragments) == "# Title"
+        fragments.close()
+
+
+class TestChunkAggregates:
+    """Test the subtree sums maintained on each chunk"""
+
+    def test_aggregates(self, build_tree):
+        root, header, para1, para2, footer = _nodes(build_tree())
+        footer.add_children(Chunk(mimetype=MimeType.png, content=b"\x89PNG"))
+
+        assert root.content_length == len("TitlePara 1Para 2Footer")
+        assert root.content_bytes == 4
+        assert root.node_count == 6
+        assert root.token_count() == 6
+        assert header.token_count(len) == len("TitlePara 1Para 2")
+
+    def test_updated_on_change(self, build_tree):
+        root, header, para1, para2, footer = _nodes(build_tree())
+        assert root.content_length == 23
+        assert root.node_count == 5
+
+        para2.content = "Paragraph 2"
+        assert root.content_length == 28
+        assert header.content_length == 22
+
+        para2.add_children(Chunk(mimetype=MimeType.text, content="Inline"))
+        assert root.content_length == 34
+        assert root.node_count == 6
+
+        header.next = None
+        assert root.content_length == 28
+        assert root.node_count == 5
+
+
+class TestChunkClone:
+    """Test the copy-on-write clone"""
+
+    def test_shallow_clone(self, build_tree):
+        root, header, *_ = _nodes(build_tree())
+        header.metadata["level"] = 1
+        cloned = header.clone(text="Cloned")
+
+        assert cloned.id != header.id
+        assert cloned.text == "Cloned"
+        assert cloned.content == header.content
+        assert cloned.child is header.child
+        assert cloned.next is header.next
+        assert cloned._metadata is header._metadata
+
+        cloned.metadata["level"] = 2
+        assert header.metadata == {"level": 1}
+        assert cloned.metadata == {"level": 2}
+
+    def test_mutate_after_clone(self, build_tree):
+        root, header, para1, *_ = _nodes(build_tree())
+        header.render()
+        cloned = header.clone()
+        assert cloned.render() == "Title\n\nPara 1\n\nPara 2"
+        assert cloned.content_length == len("TitlePara 1Para 2")
+
+        para1.content = "Changed"
+        assert header.render() == "Title\n\nChanged\n\nPara 2"
+        assert cloned.render() == "Title\n\nChanged\n\nPara 2"
+        assert cloned.render(format="markdown") == "# Title\n\nChanged\n\nPara 2"
+        assert cloned.content_length == len("TitleChangedPara 2")
+
+        # the clone in a tree, its parent doesn't cache what depends on it
+        wrapper = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+        wrapper.add_children(cloned)
+        cloned.next = None
+        assert wrapper.render() == "Title\n\nChanged\n\nPara 2"
+        assert wrapper.node_count == 4
+        para1.content = "Again"
+        assert wrapper.render() == "Title\n\nAgain\n\nPara 2"
+        assert wrapper.content_length == len("TitleAgainPara 2")
+
+    def test_clone_origin(self):
+        chunk = Chunk(
+            mimetype=MimeType.text,
+            content="hello",
+            origin={"location": {"page": 1, "bbox": [0, 0, 1, 1]}, "metadata": {}},
+        )
+        cloned = chunk.clone()
+        cloned.origin.location["bbox"][0] = 0.5
+        cloned.origin.metadata["key"] = "value"
+        assert chunk.origin.location == {"page": 1, "bbox": [0, 0, 1, 1]}
+        assert chunk.origin.metadata == {}
+
+    def test_reads_keep_sharing(self):
+        from chunking.store.memory import MemoryStore
+
+        chunk = Chunk(mimetype=MimeType.text, content="hello", metadata={"page": 2})
+        cloned = chunk.clone()
+        store = MemoryStore()
+        cloned.store = store
+        cloned.save()
+        assert cloned.page == 2
+        assert [ch.id for ch in store.query(page=2)] == [cloned.id]
+        assert cloned._metadata is chunk._metadata
+
+    def test_no_relation(self, build_tree):
+        _, header, *_ = _nodes(build_tree())
+        cloned = header.clone(no_relation=True)
+        assert cloned.parent is None
+        assert cloned.child is None
+        assert cloned.next is None
+        assert cloned.render() == "Title"
+
+    def test_deep_clone(self, build_tree):
+        root, header, para1, *_ = _nodes(build_tree())
+        cloned = root.clone(deep=True)
+
+        assert cloned.render(format="markdown") == root.render(format="markdown")
+        assert len(cloned.get_ids()) == 5
+        assert not set(cloned.get_ids()) & set(root.get_ids())
+        assert cloned.child.child.next.prev is cloned.child.child
+        assert cloned.child.child.next.parent is cloned.child
+
+        cloned.child.child.content = "Changed"
+        assert para1.content == "Para 1"
+
+    def test_invalid_key(self):
+        chunk = Chunk(mimetype=MimeType.text, content="hello")
+        with pytest.raises(ValueError):
+            chunk.clone(id="abc")
+
+
+class TestChunkContentIds:
+    def test_deterministic(self, build_tree):
+        trees = [build_tree(), build_tree()]
+        for root in trees:
+            root.id = "file-hash"
+            root.assign_content_ids()
+
+        assert trees[0].get_ids() == trees[1].get_ids()
+        assert trees[0].id == "file-hash"
+        assert len(set(trees[0].get_ids())) == 5
+
+    def test_depends_on_content_and_position(self, build_tree):
+        root, header, para1, para2, _ = _nodes(build_tree())
+        root.id = "file-hash"
+        para2.content = "Para 1"
+        root.assign_content_ids()
+        assert para1.id != para2.id
+
+        ids = root.get_ids()
+        para1.content = "Changed"
+        root.assign_content_ids()
+        assert root.get_ids() == ids[:2] + [para1.id] + ids[3:]
+
+    def test_dedup_content(self, build_tree):
+        from chunking.util.dedup import dedup_content
+
+        root1, _, para1, *_ = _nodes(build_tree())
+        root2, _, other, *_ = _nodes(build_tree())
+
+        seen = dedup_content([root1, root2])
+
+        assert other.metadata["duplicate_of"] == para1.id
+        assert "duplicate_of" not in para1.metadata
+        assert seen[para1.content_hash()] == para1.id
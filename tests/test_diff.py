@@ -0,0 +1,63 @@
+from chunking.base import Chunk, CType
+from chunking.diff import diff
+from chunking.mime import MimeType
+from chunking.store.memory import MemoryStore
+
+
+def test_identical_trees(build_tree):
+    old, new = build_tree("A", "B"), build_tree("A", "B")
+    result = diff(old, new)
+
+    assert not result
+    assert len(result.matches) == 5
+    assert not result.relinked
+
+
+def test_changes(build_tree):
+    old = build_tree("A", "B", "C", "D")
+    new = build_tree("B", "A", "C2", "E")
+    result = diff(old, new)
+
+    contents = lambda chunks: sorted(ch.content for ch in chunks)  # noqa: E731
+    assert contents(result.modified) == ["C2", "E"]  # matched by position
+    assert contents(result.moved) in (["A"], ["B"])
+    assert not result.inserted and not result.deleted
+
+    new.child.child.next.add_children(
+        Chunk(mimetype=MimeType.text, ctype=CType.Para, content="New")
+    )
+    result = diff(old, new)
+    assert contents(result.inserted) == ["New"]
+
+
+def test_apply_diff(build_tree):
+    old = build_tree("A", "B", "C")
+    store = MemoryStore()
+    for _, chunk in old.walk():
+        store.save(chunk)
+
+    new = build_tree("A", "B2")
+    result = diff(old, new)
+    assert [ch.content for ch in result.deleted] == ["C"]
+
+    store.apply_diff(result)
+    assert new.get_ids()[:3] == old.get_ids()[:3]
+    assert set(store._chunks) == set(new.get_ids())
+    assert store.get(new.child.id).child.next.content == "B2"
+    assert store.get(old.child.child.next.id).content == "B2"
+
+
+def test_apply_diff_file_store(tmp_path, build_tree):
+    from chunking.store.fs import FileStore
+
+    old = build_tree("A", "B", "C")
+    store = FileStore(tmp_path)
+    for _, chunk in old.walk():
+        store.save(chunk)
+
+    new = build_tree("A", "B2", "D")
+    result = diff(store.get(old.id), new)
+    store.apply_diff(result)
+
+    assert len(list(tmp_path.glob("*.json"))) == 6
+    assert store.get(old.id).render() == new.render()
@@ -0,0 +1,43 @@
+import hashlib
+import os
+import pickle
+
+import pytest
+
+from chunking.util.hashing import HashCache, hash_file
+
+
+class TestHashFile:
+    def test_streaming_digest(self, tmp_path):
+        path = tmp_path / "data.bin"
+        data = bytes(range(256)) * 5000
+        path.write_bytes(data)
+
+        assert hash_file(path, block_size=1000) == hashlib.sha256(data).hexdigest()
+        assert hash_file(path, "blake2b") == hashlib.blake2b(data).hexdigest()
+        with pytest.raises(ValueError):
+            hash_file(path, "unknown")
+
+    @pytest.mark.parametrize("persistent", [False, True])
+    def test_cache(self, tmp_path, persistent):
+        path = tmp_path / "data.txt"
+        path.write_text("content")
+        os.utime(path, ns=(10**18, 10**18))
+        cache = HashCache(tmp_path / "hashes.db" if persistent else None)
+
+        digest = hash_file(path, cache=cache)
+        assert len(cache) == 1
+        assert hash_file(path, "blake2b", cache=cache) != digest
+        if persistent:
+            cache = pickle.loads(pickle.dumps(cache))
+            assert len(cache) == 2
+
+        # an unchanged file is not read again
+        stat = os.stat(path)
+        cache.put(str(path.resolve()), "sha256", stat, "cached")
+        assert hash_file(path, cache=cache) == "cached"
+
+        # a modified file is hashed again, recent changes are not cached
+        path.write_text("changed")
+        assert hash_file(path, cache=cache) not in ("cached", digest)
+        assert cache.get(str(path.resolve()), "sha256", os.stat(path)) is None
@@ -0,0 +1,51 @@
+import chunking.mime.base as mime_base
+from chunking.mime import MimeType, guess_mimetype, guess_mimetypes
+
+
+class TestGuessMimetypes:
+    def test_signatures_and_extensions(self, tmp_path):
+        files = {
+            "doc.pdf": b"%PDF-1.7\n",
+            "no_extension": b"%PDF-1.7\n",
+            "image.png": b"\x89PNG\r\n\x1a\n\0\0",
+            "slides.pptx": b"PK\x03\x04\0\0",
+            "notes.md": b"# Title\n",
+            "data.csv": b"a,b\n1,2\n",
+            "notebook.ipynb": b"{}",
+        }
+        for name, content in files.items():
+            (tmp_path / name).write_bytes(content)
+
+        paths = [tmp_path / name for name in files] + [tmp_path]
+        assert guess_mimetypes(paths) == [
+            MimeType.pdf,
+            MimeType.pdf,
+            MimeType.png,
+            MimeType.pptx,
+            MimeType.md,
+            MimeType.csv,
+            MimeType.ipynb,
+            MimeType.directory,
+        ]
+        assert guess_mimetype(tmp_path / "notes.md") == MimeType.md
+
+    def test_cache(self, tmp_path, monkeypatch):
+        path = tmp_path / "file.txt"
+        path.write_text("text")
+        mime_base.clear_mimetype_cache()
+        assert mime_base.guess_mimetype(path) == MimeType.text
+
+        # cached by path, size and mtime
+        calls = []
+        signature = mime_base._guess_from_signature
+        monkeypatch.setattr(
+            mime_base,
+            "_guess_from_signature",
+            lambda p: calls.append(p) or signature(p),
+        )
+        assert mime_base.guess_mimetype(path) == MimeType.text
+        assert calls == []
+
+        path.write_bytes(b"%PDF-1.7\n")
+        assert mime_base.guess_mimetype(path) == MimeType.pdf
+        assert calls == [path]
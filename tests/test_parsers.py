@@ -1,19 +1,29 @@
 from pathlib import Path
 
-from chunking.base import Chunk, ChunkGroup
-from chunking.controller import Controller
-from chunking.parser.audio import AudioWhisperParser
-from chunking.parser.csv import CsvParser
-from chunking.parser.dict_list import JsonParser, TomlParser, YamlParser
-from chunking.parser.html import PandocHtmlParser
-from chunking.parser.image import RapidOCRImageText
-from chunking.parser.md import Markdown
-from chunking.parser.pandoc_engine import PandocEngine
-from chunking.parser.pdf import DoclingPDF, FastPDF, SycamorePDF, UnstructuredPDF
-from chunking.parser.pptx import PptxParser
-from chunking.parser.text import TextParser
-from chunking.parser.video import VideoWhisperParser
-from chunking.parser.xlsx import XlsxOpenpyxlParser
+import pytest
+
+# the Controller parsers need the optional chunking_contrib package
+pytest.importorskip("chunking_contrib")
+
+from chunking.base import Chunk, ChunkGroup  # noqa: E402
+from chunking.controller import Controller  # noqa: E402
+from chunking.parser.audio import AudioWhisperParser  # noqa: E402
+from chunking.parser.csv import CsvParser  # noqa: E402
+from chunking.parser.dict_list import JsonParser, TomlParser, YamlParser  # noqa: E402
+from chunking.parser.html import PandocHtmlParser  # noqa: E402
+from chunking.parser.image import RapidOCRImageText  # noqa: E402
+from chunking.parser.md import Markdown  # noqa: E402
+from chunking.parser.pandoc_engine import PandocEngine  # noqa: E402
+from chunking.parser.pdf import (  # noqa: E402
+    DoclingPDF,
+    FastPDF,
+    SycamorePDF,
+    UnstructuredPDF,
+)
+from chunking.parser.pptx import PptxParser  # noqa: E402
+from chunking.parser.text import TextParser  # noqa: E402
+from chunking.parser.video import VideoWhisperParser  # noqa: E402
+from chunking.parser.xlsx import XlsxOpenpyxlParser  # noqa: E402
 
 asset_folder = Path(__file__).parent / "assets"
 
@@ -244,3 +254,39 @@ def test_mp4():
     chunks = VideoWhisperParser.run(root, include_segments=True)
     chunk = chunks[0]
     assert isinstance(chunk, Chunk)
+
+
+def test_parse_directory_with_workers(tmp_path):
+    from chunking.auto import parse
+
+    for idx in range(6):
+        (tmp_path / f"file_{idx}.txt").write_text(f"Content of file {idx}")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "nested.md").write_text("# Title\n\nNested")
+
+    sequential = parse(tmp_path)
+    parallel = parse(tmp_path, workers=2, max_in_flight=2)
+    assert [ch.origin.location for ch in parallel] == [
+        ch.origin.location for ch in sequential
+    ]
+    assert [ch.render() for ch in parallel] == [ch.render() for ch in sequential]
+
+
+def test_iter_parse(tmp_path):
+    from chunking.auto import iter_parse, parse
+
+    for idx in range(6):
+        (tmp_path / f"file_{idx}.txt").write_text(f"Content of file {idx}")
+    (tmp_path / "missing.txt").symlink_to(tmp_path / "does_not_exist")
+
+    expected = [ch.origin.location for ch in parse(tmp_path)]
+    assert [ch.origin.location for ch in iter_parse(tmp_path)] == expected
+
+    records = list(iter_parse(tmp_path, workers=2, ordered=False, records=True))
+    assert len(records) == 7
+    failed = [record for record in records if record.chunk is None]
+    assert [record.path for record in failed] == [str(tmp_path / "missing.txt")]
+    assert isinstance(failed[0].error, OSError)
+    assert sorted(
+        record.chunk.origin.location for record in records if record.chunk
+    ) == sorted(expected)
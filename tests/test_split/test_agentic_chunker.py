@@ -1,10 +1,15 @@
 from pathlib import Path
 
-from chunking.base import Chunk
-from chunking.controller import Controller
-from chunking.parser.pandoc_engine import PandocEngine
-from chunking.split.agentic_chunker import AgenticChunker
-from chunking.split.split import FlattenToMarkdown
+import pytest
+
+# the Controller parsers need the optional chunking_contrib package
+pytest.importorskip("chunking_contrib")
+
+from chunking.base import Chunk  # noqa: E402
+from chunking.controller import Controller  # noqa: E402
+from chunking.parser.pandoc_engine import PandocEngine  # noqa: E402
+from chunking.split.agentic_chunker import AgenticChunker  # noqa: E402
+from chunking.split.split import FlattenToMarkdown  # noqa: E402
 
 docx_path = str(Path(__file__).parent.parent / "assets" / "with_image.docx")
 
@@ -1,7 +1,12 @@
 from pathlib import Path
 
-from chunking.controller import Controller
-from chunking.split.md import MarkdownSplitByHeading
+import pytest
+
+# the Controller parsers need the optional chunking_contrib package
+pytest.importorskip("chunking_contrib")
+
+from chunking.controller import Controller  # noqa: E402
+from chunking.split.md import MarkdownSplitByHeading  # noqa: E402
 
 md_path1 = str(Path(__file__).parent.parent / "assets" / "lz.md")
 
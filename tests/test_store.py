@@ -0,0 +1,591 @@
+import pytest
+
+from chunking.base import Chunk, ChunkGroup, CType
+from chunking.mime import MimeType
+from chunking.store.sqlite import SQLiteStore
+
+
+def test_sqlite_roundtrip(tmp_path, build_tree):
+    root = build_tree("Para", image=True, footer=None)
+    store = SQLiteStore(tmp_path / "chunks.db")
+    root.store = store
+    root.save()
+
+    loaded = store.get(root.id)
+    assert loaded.get_ids() == root.get_ids()
+    assert loaded.child.child.next._content is None  # blob is loaded lazily
+    assert loaded.child.child.next.content == b"\x89PNG"
+    assert loaded.render() == root.render()
+
+    rows = store._conn.execute("SELECT DISTINCT root FROM chunks").fetchall()
+    assert rows == [(root.id,)]
+
+
+def test_sqlite_save_group_and_get_many(tmp_path, build_tree):
+    root = build_tree("Para", image=True, footer=None)
+    chunks = [ch for _, ch in root.walk()][1:]
+    store = SQLiteStore(tmp_path / "chunks.db")
+    store.save_group(ChunkGroup(chunks, root=root))
+
+    ids = [chunks[2].id, "missing", chunks[0].id]
+    assert [ch.id for ch in store.get_many(ids)] == [chunks[2].id, chunks[0].id]
+
+    store.delete(chunks[2])
+    assert chunks[2].id not in store
+    assert store.fetch_content(chunks[2]) is None
+
+
+def test_segment_store(tmp_path, build_tree):
+    from chunking.store.segment import SegmentStore
+
+    root = build_tree("Para", image=True, footer=None)
+    store = SegmentStore(tmp_path, segment_size=300, auto_compact=False)
+    root.store = store
+    root.save()
+
+    image = root.child.child.next
+    loaded = store.get(root.id)
+    assert loaded.get_ids() == root.get_ids()
+    assert bytes(store.fetch_content_view(image)) == b"\x89PNG"
+    assert store.get(image.id).content == b"\x89PNG"
+    assert len(list(tmp_path.glob("segment-*.log"))) > 1
+
+    for _, chunk in root.walk():
+        if chunk is not root:
+            store.delete(chunk)
+    store.compact()
+    assert len(list(tmp_path.glob("segment-*.log"))) <= 2
+    store.close()
+
+    store = SegmentStore(tmp_path)
+    assert root.id in store and image.id not in store
+
+    # records written after the persisted index are recovered from the segments
+    store.save(image)
+    store._writer.flush()
+    assert SegmentStore(tmp_path).get(image.id).content == b"\x89PNG"
+
+
+def test_write_behind_store(build_tree):
+    from chunking.store.memory import MemoryStore
+    from chunking.store.write_behind import WriteBehindStore
+
+    root = build_tree("Para", image=True, footer=None)
+    inner = MemoryStore()
+    store = WriteBehindStore(inner, max_pending=2, batch_size=2)
+    root.store = store
+    root.save()
+    root.child.content = "New title"
+    store.save(root.child)
+
+    assert root.child.id in store
+    assert store.get(root.child.id).content == "New title"
+
+    para, image = root.child.child, root.child.child.next
+    store.delete(para)
+    store.flush()
+    assert set(inner._chunks) == set(root.get_ids())
+    assert para.id not in inner._chunks
+    assert root.child.child is image and image.prev is None  # re-linked
+    assert inner.get(root.child.id).content == "New title"
+
+    store.close()
+    with pytest.raises(ValueError):
+        store.save(root)
+
+
+def test_content_cache_store(tmp_path):
+    from chunking.store.cache import ContentCacheStore
+    from chunking.store.fs import FileStore
+
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    images = [
+        Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=bytes([i]) * 100)
+        for i in range(3)
+    ]
+    root.add_children(images)
+    store = ContentCacheStore(FileStore(tmp_path), max_bytes=250)
+    root.store = store
+    root.save()
+    store.misses = 0  # the root content was fetched on save
+
+    loaded = [store.get(image.id) for image in images]
+    assert loaded[0].content == images[0].content
+    assert loaded[0]._content is None  # not kept on the chunk
+    loaded[0].content
+    loaded[1].content
+    loaded[2].content  # evicts the first image
+    loaded[0].content
+
+    assert store.stats == {
+        "hits": 1,
+        "misses": 4,
+        "evictions": 2,
+        "entries": 2,
+        "bytes": 200,
+    }
+
+
+def test_content_cache_counts_bytes(tmp_path):
+    from chunking.store.cache import ContentCacheStore
+    from chunking.store.codec import Compression
+    from chunking.store.fs import FileStore
+
+    # the str content is stored as a blob, and fetched through the cache
+    chunk = Chunk(mimetype=MimeType.text, ctype=CType.Para, content="é" * 100)
+    inner = FileStore(tmp_path, compression=Compression(min_size=0))
+    store = ContentCacheStore(inner, max_bytes=250)
+    chunk.store = store
+    chunk.save()
+
+    assert store.get(chunk.id).content == chunk.content
+    assert store.stats["bytes"] == 200
+
+
+def test_compression_codecs():
+    from chunking.store.codec import Compression, codec_of, unpack
+
+    compression = Compression(codec="lzma", mimetypes={MimeType.csv: "zlib"})
+    text = "Some repeated text. " * 100
+
+    blob = compression.pack(text, MimeType.text)
+    assert codec_of(blob) == "lzma" and len(blob) < len(text)
+    assert unpack(blob) == text
+    assert codec_of(compression.pack(text.encode(), MimeType.csv)) == "zlib"
+    assert compression.pack("short", MimeType.text) is None
+
+    # already compressed content is stored as is
+    png = b"\x89PNG" + bytes(1000)
+    assert codec_of(compression.pack(png, MimeType.png)) == "none"
+    assert codec_of(compression.pack(png, "application/octet-stream")) == "none"
+    assert unpack(compression.pack(png, MimeType.png)) == png
+
+    # blobs written without compression are read unchanged
+    assert unpack(b"raw") == b"raw"
+    with pytest.raises(ValueError):
+        Compression(codec="unknown")
+
+
+@pytest.mark.parametrize("store_type", ["file", "sqlite", "segment"])
+def test_store_compression(tmp_path, store_type, build_tree):
+    from chunking.store.codec import Compression
+    from chunking.store.fs import FileStore
+    from chunking.store.segment import SegmentStore
+
+    compression = Compression(min_size=64)
+    if store_type == "file":
+        store = FileStore(tmp_path, compression=compression)
+    elif store_type == "sqlite":
+        store = SQLiteStore(tmp_path / "chunks.db", compression=compression)
+    else:
+        store = SegmentStore(tmp_path, compression=compression)
+
+    root = build_tree("Para", image=True, footer=None)
+    para = root.child.child
+    para.content = "Long paragraph. " * 50
+    root.store = store
+    root.save()
+
+    loaded = store.get(para.id)
+    assert loaded._content is None  # compressed text is loaded lazily
+    assert loaded.content == para.content
+    assert store.get(para.next.id).content == b"\x89PNG"
+    assert store.get(root.id).render() == root.render()
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+@pytest.mark.parametrize("store_type", ["file", "sqlite", "segment"])
+def test_store_frame_like_content(tmp_path, store_type, compressed):
+    from chunking.store.codec import Compression
+    from chunking.store.fs import FileStore
+    from chunking.store.segment import SegmentStore
+
+    if store_type == "file":
+        store = FileStore(tmp_path)
+    elif store_type == "sqlite":
+        store = SQLiteStore(tmp_path / "chunks.db")
+    else:
+        store = SegmentStore(tmp_path)
+
+    # raw content that starts like a compressed blob
+    contents = [b"\xffCZ\x04zlib" + bytes(100), b"\xffCZ\x09", b"\xffCZ"]
+    chunks = [
+        Chunk(mimetype="application/octet-stream", ctype=CType.Figure, content=c)
+        for c in contents
+    ]
+    for chunk in chunks:
+        store.save(chunk)
+    if compressed:
+        # the blobs were written before the compression was turned on
+        store._compression = Compression()
+
+    for chunk in chunks:
+        assert store.get(chunk.id).content == chunk.content
+
+
+def test_file_store_dedup_blobs(tmp_path):
+    from chunking.store.fs import FileStore
+
+    store = FileStore(tmp_path)
+    logos = [
+        Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=b"\x89PNG logo")
+        for _ in range(3)
+    ]
+    for logo in logos:
+        store.save(logo)
+
+    blobs = list((tmp_path / "blobs").glob("*/*"))
+    assert len(blobs) == 1
+    assert blobs[0].stat().st_nlink == 4  # the blob and its 3 references
+    assert store.get(logos[0].id).content == b"\x89PNG logo"
+
+    # overwriting or deleting a reference releases it
+    logos[0].content = b"\x89PNG other"
+    store.save(logos[0])
+    store.delete(logos[1])
+    assert blobs[0].stat().st_nlink == 2
+    assert len(list((tmp_path / "blobs").glob("*/*"))) == 2
+
+    store.delete(logos[2])
+    assert not blobs[0].exists()
+    assert store.gc_blobs() == 0
+
+
+def test_sqlite_dedup_blobs(tmp_path):
+    store = SQLiteStore(tmp_path / "chunks.db")
+    logos = [
+        Chunk(mimetype=MimeType.png, ctype=CType.Figure, content=b"\x89PNG logo")
+        for _ in range(3)
+    ]
+    store.save_group(ChunkGroup(logos))
+
+    def n_blobs():
+        return store._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+    assert n_blobs() == 1
+    assert store.fetch_content(logos[2]) == b"\x89PNG logo"
+
+    logos[0].content = b"\x89PNG other"
+    store.save(logos[0])
+    store.delete(logos[1])
+    assert n_blobs() == 2
+    store.delete(logos[2])
+    assert n_blobs() == 1
+    assert store.fetch_content(logos[0]) == b"\x89PNG other"
+
+
+def _make_store(store_type, tmp_path):
+    from chunking.store.fs import FileStore
+    from chunking.store.memory import MemoryStore
+    from chunking.store.segment import SegmentStore
+
+    if store_type == "memory":
+        return MemoryStore()
+    if store_type == "file":
+        return FileStore(tmp_path)
+    if store_type == "sqlite":
+        return SQLiteStore(tmp_path / "chunks.db")
+    return SegmentStore(tmp_path)
+
+
+@pytest.mark.parametrize("store_type", ["memory", "file", "sqlite", "segment"])
+def test_edit_loaded_tree(tmp_path, store_type):
+    store = _make_store(store_type, tmp_path)
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    first = Chunk(mimetype=MimeType.text, ctype=CType.Para, content="First")
+    second = Chunk(mimetype=MimeType.text, ctype=CType.Para, content="Second")
+    root.add_children([first, second])
+    root.store = store
+    root.save()
+
+    loaded = store.get(root.id)
+    assert loaded.render() == "First\n\nSecond"
+    loaded.child.content = "Changed"
+    assert loaded.render() == "Changed\n\nSecond"
+    loaded.child.next.content = "Last"
+    assert loaded.render() == "Changed\n\nLast"
+    assert loaded.child.next.parent is loaded
+
+
+@pytest.mark.parametrize("store_type", ["memory", "file", "sqlite", "segment"])
+def test_aggregates_of_loaded_tree(tmp_path, store_type, build_tree):
+    store = _make_store(store_type, tmp_path)
+    root = build_tree("Para", image=True, footer=None)
+    root.store = store
+    root.save()
+
+    loaded = store.get(root.id)
+    assert (loaded.content_length, loaded.node_count) == (9, 4)
+    header = loaded.child
+    header.child.content = "Paragraph"
+    assert loaded.content_length == 14
+    header.child.next.add_children(
+        Chunk(mimetype=MimeType.text, ctype=CType.Inline, content="Caption")
+    )
+    assert (loaded.content_length, loaded.node_count) == (21, 5)
+    assert header.content_length == 21
+
+
+@pytest.mark.parametrize("store_type", ["memory", "file", "sqlite", "segment"])
+def test_delete_recursive_and_gc(tmp_path, store_type, build_tree):
+    store = _make_store(store_type, tmp_path)
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    header = build_tree("Para", image=True, footer=None).child
+    footer = Chunk(mimetype=MimeType.text, ctype=CType.Para, content="Footer")
+    root.add_children([header, footer])
+    root.store = store
+    root.save()
+
+    store.delete(header, recursive=True)
+    assert set(store.ids()) == {root.id, footer.id}
+    loaded = store.get(root.id)
+    assert loaded.child.id == footer.id and loaded.child.prev is None
+    assert loaded.render() == "Footer"
+
+    # a non-recursive delete leaves the descendants to the garbage collection
+    other = build_tree("Para", image=True, footer=None)
+    other.store = store
+    other.save()
+    orphans = {other.child.child.id, other.child.child.next.id}
+    store.delete(other.child)
+    assert orphans <= set(store.ids())
+    assert store.gc() == []
+    assert set(store.gc(sweep=True)) == orphans
+    assert set(store.ids()) == {root.id, footer.id, other.id}
+    assert store.gc() == []
+
+
+@pytest.mark.parametrize("store_type", ["memory", "file", "sqlite", "segment"])
+def test_gc_keeps_subtree_roots(tmp_path, store_type, build_tree):
+    store = _make_store(store_type, tmp_path)
+    root = build_tree("Para", image=True, footer=None)
+    root.store = store
+    root.save()
+
+    # a subtree saved without its parent
+    other = build_tree("Para", image=True, footer=None)
+    subtree = other.child
+    subtree.store = store
+    subtree.save()
+    kept = set(subtree.get_ids())
+    assert subtree.parent_id not in store
+
+    assert store.gc() == []
+    assert store.gc(roots=[subtree.id], sweep=True) == []
+    assert set(store.ids()) == set(root.get_ids()) | kept
+
+    store.delete(subtree)
+    assert store.gc() == []
+    assert set(store.gc(sweep=True)) == kept - {subtree.id}
+    assert set(store.ids()) == set(root.get_ids())
+
+
+@pytest.mark.parametrize("store_type", ["memory", "file", "sqlite", "segment"])
+def test_query(tmp_path, store_type):
+    from chunking.base import LazyChunkGroup, Origin
+
+    store = _make_store(store_type, tmp_path)
+    docs = []
+    for _ in range(2):
+        root = Chunk(mimetype=MimeType.pdf, ctype=CType.Root)
+        pages = []
+        for page in range(1, 4):
+            table = Chunk(
+                mimetype=MimeType.text,
+                ctype=CType.Table,
+                content=f"Table {page}",
+                origin=Origin(location={"page": page}),
+                metadata={"lang": "en" if page < 3 else "fr"},
+            )
+            para = Chunk(
+                mimetype=MimeType.text,
+                ctype=CType.Para,
+                content=f"Para {page}",
+                metadata={"page": page},
+            )
+            pages.extend([table, para])
+        root.add_children(pages)
+        root.store = store
+        root.save()
+        docs.append(root)
+
+    tables = store.query(root_id=docs[0].id, ctype=CType.Table)
+    assert isinstance(tables, LazyChunkGroup)
+    assert [t.content for t in tables] == ["Table 1", "Table 2", "Table 3"]
+
+    on_page = store.query(root_id=docs[1].id, page=2)
+    assert sorted(ch.content for ch in on_page) == ["Para 2", "Table 2"]
+    assert [ch.content for ch in store.query(ctype=CType.Table, lang="fr")] == [
+        "Table 3",
+        "Table 3",
+    ]
+    assert len(store.query(root_id=docs[0].id)) == 7
+    assert not store.query(ctype=CType.Header)
+
+
+@pytest.mark.parametrize("store_type", ["memory", "file", "sqlite", "segment"])
+def test_query_non_scalar_page(tmp_path, store_type):
+    store = _make_store(store_type, tmp_path)
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    spread = Chunk(mimetype=MimeType.text, content="Spread", metadata={"page": [1, 2]})
+    single = Chunk(mimetype=MimeType.text, content="Single", metadata={"page": 1})
+    root.add_children([spread, single])
+    root.store = store
+    root.save()
+
+    assert [ch.content for ch in store.query(page=[1, 2])] == ["Spread"]
+    assert [ch.content for ch in store.query(page=1)] == ["Single"]
+
+
+@pytest.mark.parametrize("wrapper", ["write_behind", "content_cache"])
+def test_wrapper_query_uses_wrapped_store(tmp_path, wrapper):
+    from chunking.store.cache import ContentCacheStore
+    from chunking.store.write_behind import WriteBehindStore
+
+    inner = SQLiteStore(tmp_path / "chunks.db")
+    if wrapper == "write_behind":
+        store = WriteBehindStore(inner)
+    else:
+        store = ContentCacheStore(inner)
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    root.add_children(
+        [
+            Chunk(mimetype=MimeType.text, ctype=CType.Para, content="Para"),
+            Chunk(mimetype=MimeType.text, ctype=CType.Table, content="Table"),
+        ]
+    )
+    root.store = store
+    root.save()
+
+    calls = []
+    query = inner._query
+    inner._query = lambda *args: calls.append(args) or query(*args)
+    tables = list(store.query(root_id=root.id, ctype=CType.Table))
+    assert [ch.content for ch in tables] == ["Table"]
+    assert all(ch.store is store for ch in tables)
+    assert len(calls) == 1
+    if hasattr(store, "close"):
+        store.close()
+
+
+@pytest.mark.parametrize("store_type", ["file", "sqlite"])
+def test_prefetch_relations(tmp_path, store_type):
+    store = _make_store(store_type, tmp_path)
+    root = Chunk(mimetype=MimeType.text, ctype=CType.Root)
+    sections = [Chunk(mimetype=MimeType.text, ctype=CType.Div) for _ in range(5)]
+    for section in sections:
+        section.add_children(
+            [Chunk(mimetype=MimeType.text, content=f"Para {i}") for i in range(10)]
+        )
+    root.add_children(sections)
+    root.store = store
+    root.save()
+
+    calls = {"get": 0, "get_many": 0, "in_get_many": False}
+    get, get_many = store.get, store.get_many
+
+    def counting_get(id):
+        calls["get"] += not calls["in_get_many"]
+        return get(id)
+
+    def counting_get_many(ids):
+        calls["get_many"] += 1
+        calls["in_get_many"] = True
+        try:
+            return get_many(ids)
+        finally:
+            calls["in_get_many"] = False
+
+    loaded = store.get(root.id)
+    store.get, store.get_many = counting_get, counting_get_many
+    store.prefetch_depth, store.prefetch_breadth = 2, None
+
+    queries = []
+    if store_type == "sqlite":
+        store._conn.set_trace_callback(queries.append)
+    assert loaded.get_ids() == root.get_ids()
+    assert calls["get"] == 0
+    # one bulk read per round instead of one read per chunk
+    assert calls["get_many"] <= 16
+    if store_type == "sqlite":
+        assert len(queries) <= 4
+    assert loaded.child.child.parent is loaded.child
+
+
+def test_snapshot_store(tmp_path, build_tree):
+    import pickle
+
+    from chunking.store.memory import MemoryStore
+    from chunking.store.snapshot import SnapshotStore
+
+    root = build_tree("Para", image=True, footer=None)
+    source = MemoryStore()
+    root.store = source
+    root.save()
+
+    store = SnapshotStore.export(tmp_path / "corpus.snap", source)
+    assert len(store) == 4 and set(store.ids()) == set(root.get_ids())
+    assert "missing" not in store
+
+    loaded = store.get(root.id)
+    assert loaded.get_ids() == root.get_ids()
+    assert loaded.render() == root.render()
+    image = loaded.child.child.next
+    view = store.fetch_content_view(image)
+    assert isinstance(view, memoryview) and view == b"\x89PNG"
+    assert image.content == b"\x89PNG"
+    assert [ch.content for ch in store.query(ctype=CType.Para)] == ["Para"]
+
+    with pytest.raises(NotImplementedError):
+        store.save(root)
+    reopened = pickle.loads(pickle.dumps(store))
+    assert reopened.get(image.id).content == b"\x89PNG"
+
+    # an empty snapshot is still a store
+    empty = SnapshotStore.export(tmp_path / "empty.snap", [])
+    assert empty and len(empty) == 0 and root.id not in empty
+
+
+def test_parse_cache(tmp_path, build_tree):
+    import pickle
+
+    from chunking.base import BaseOperation
+    from chunking.store.codec import Compression
+    from chunking.store.parse_cache import ParseCache
+
+    class Parser(BaseOperation):
+        pass
+
+    cache = ParseCache(tmp_path / "cache.db", compression=Compression())
+    root = build_tree("Para", image=True, footer=None)
+    key = cache.key(root.id, Parser)
+    assert key == cache.key(root.id, Parser())
+    assert key != cache.key(root.id, Parser(ocr=True))
+    assert key != cache.key("other", Parser)
+    assert key != ParseCache(tmp_path / "cache.db", version="2").key(root.id, Parser)
+
+    assert cache.get(key) is None
+    cache.put(key, root)
+    cached = cache.get(key)
+    assert cached.get_ids() == root.get_ids()
+    assert cached.render() == root.render()
+    assert cached.child.child.next.content == b"\x89PNG"
+
+    # the stats are shared by the processes
+    reopened = pickle.loads(pickle.dumps(cache))
+    assert reopened.get(key) is not None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+    # the least recently used entries are evicted over max_size
+    cache.put("other", root)
+    size = cache.stats()["size"]
+    cache.get(key)
+    cache.max_size = size
+    cache.put("new", root)
+    assert cache.get("other") is None and cache.get(key) is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+
+    cache.reset_stats()
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()["hits"] == 0